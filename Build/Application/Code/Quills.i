@@ -462,6 +462,26 @@ CallPythonVoidReturnVoid	(void*	inPythonFunctionObject)
 	_Quills_PropagateExceptions(pythonResult, PyEval_GetFuncName(pythonDef), PyEval_GetFuncDesc(pythonDef));
 	Py_XDECREF(pythonResult); pythonResult = nullptr;
 }
+
+// like CallPythonVoidReturnVoid() but also releases the function,
+// for callbacks that are only invoked once
+static void
+CallPythonVoidReturnVoidOnce	(void*	inPythonFunctionObject)
+{
+	PyObject*	pythonDef = reinterpret_cast< PyObject* >(inPythonFunctionObject);
+	
+	
+	try
+	{
+		CallPythonVoidReturnVoid(inPythonFunctionObject);
+	}
+	catch (...)
+	{
+		Py_DECREF(pythonDef);
+		throw;
+	}
+	Py_DECREF(pythonDef);
+}
 %}
 #endif
 
@@ -34,6 +34,15 @@
 #include "QuillsEvents.h"
 #include <UniversalDefines.h>
 
+// standard-C++ includes
+#include <stdexcept>
+
+// Mac includes
+#include <dispatch/dispatch.h>
+
+// library includes
+#include <Console.h>
+
 // application includes
 #include "EventLoop.h"
 
@@ -47,6 +56,13 @@ void*									gEventsEndLoopPythonCallback = nullptr;
 
 } // anonymous namespace
 
+#pragma mark Internal Method Prototypes
+namespace {
+
+void	callReportingExceptions		(Quills::FunctionReturnVoidArg1VoidPtr, void*);
+
+} // anonymous namespace
+
 
 
 #pragma mark Public Methods
@@ -65,6 +81,45 @@ Events::run_loop ()
 }// run_loop
 
 
+/*!
+See header or "pydoc" for Python docstrings.
+
+(4.0)
+*/
+void
+Events::_call_after_py	(double							inDelayInSeconds,
+						 FunctionReturnVoidArg1VoidPtr	inRoutine,
+						 void*							inPythonFunctionObject)
+{
+	// (the comparison is false for NaN, which is treated as no delay)
+	int64_t const	kDelayInNanoseconds = (inDelayInSeconds > 0)
+											? STATIC_CAST(inDelayInSeconds * NSEC_PER_SEC, int64_t)
+											: 0;
+	
+	
+	dispatch_after(dispatch_time(DISPATCH_TIME_NOW, kDelayInNanoseconds), dispatch_get_main_queue(),
+	^{
+		callReportingExceptions(inRoutine, inPythonFunctionObject);
+	});
+}// _call_after_py
+
+
+/*!
+See header or "pydoc" for Python docstrings.
+
+(2020.10)
+*/
+void
+Events::_call_soon_py	(FunctionReturnVoidArg1VoidPtr	inRoutine,
+						 void*							inPythonFunctionObject)
+{
+	dispatch_async(dispatch_get_main_queue(),
+	^{
+		callReportingExceptions(inRoutine, inPythonFunctionObject);
+	});
+}// _call_soon_py
+
+
 /*!
 See header or "pydoc" for Python docstrings.
 
@@ -93,4 +148,45 @@ Events::_on_endloop_call_py		(FunctionReturnVoidArg1VoidPtr	inRoutine,
 
 } // namespace Quills
 
+
+#pragma mark Internal Methods
+namespace {
+
+/*!
+Invokes a function scheduled by Events.call_soon() or
+Events.call_after(), and reports any exception the same way
+as exceptions from file handlers (for instance, a preferences
+import that fails late), since there is no caller to give it to.
+
+(4.0)
+*/
+void
+callReportingExceptions		(Quills::FunctionReturnVoidArg1VoidPtr	inRoutine,
+							 void*									inPythonFunctionObject)
+{
+	try
+	{
+		(*inRoutine)(inPythonFunctionObject);
+	}
+	catch (std::exception const&	inException)
+	{
+		CFStringRef		titleCFString = CFSTR("Exception in scheduled script"); // LOCALIZE THIS
+		CFStringRef		messageCFString = CFStringCreateWithCString
+											(kCFAllocatorDefault, inException.what(), kCFStringEncodingUTF8); // LOCALIZE THIS?
+		
+		
+		if (nullptr == messageCFString)
+		{
+			Console_Warning(Console_WriteValueCString, "exception in function called by event loop", inException.what());
+		}
+		else
+		{
+			Console_WriteScriptError(titleCFString, messageCFString);
+			CFRelease(messageCFString), messageCFString = nullptr;
+		}
+	}
+}// callReportingExceptions
+
+} // anonymous namespace
+
 // BELOW IS REQUIRED NEWLINE TO END FILE
@@ -80,6 +80,12 @@ IMPORTANT: This call blocks until the user asks to quit.\n\
 	QUILLS_CATCH_ALL
 }
 #endif
+	// only intended for direct use by the SWIG wrapper
+	static void _call_after_py (double, Quills::FunctionReturnVoidArg1VoidPtr, void*);
+	
+	// only intended for direct use by the SWIG wrapper
+	static void _call_soon_py (Quills::FunctionReturnVoidArg1VoidPtr, void*);
+	
 	// only intended for direct use by the application delegate in Cocoa
 	static void _handle_endloop ();
 	
@@ -95,6 +101,45 @@ private:
 %extend Events {
 %feature("docstring",
 "Register a Python function to be called (with no arguments)\n\
+once, on the main thread, after at least the given number of\n\
+seconds.\n\
+\n\
+Since the interpreter lock is not released while events are\n\
+handled, Python threads make little progress while the user\n\
+interface is idle; a function can call this again to do work\n\
+periodically on the main thread instead (such as checking for\n\
+changed files).  If the function raises an exception, it is\n\
+shown to the user as an error.\n\
+") call_after;
+	// NOTE: "PyObject* inPythonFunction" is typemapped in Quills.i;
+	// "CallPythonVoidReturnVoidOnce" is defined in Quills.i
+	static void
+	call_after	(double		inDelayInSeconds,
+				 PyObject*	inPythonFunction)
+	{
+		Py_INCREF(inPythonFunction);
+		Quills::Events::_call_after_py(inDelayInSeconds, CallPythonVoidReturnVoidOnce, reinterpret_cast< void* >(inPythonFunction));
+	}
+%feature("docstring",
+"Register a Python function to be called (with no arguments)\n\
+once, on the main thread, after the main event loop finishes\n\
+handling any events that are already waiting.\n\
+\n\
+This allows long tasks to be divided into small steps that do\n\
+not prevent the user interface from responding; a step can\n\
+call this again to schedule the next step.  If the function\n\
+raises an exception, it is shown to the user as an error.\n\
+") call_soon;
+	// NOTE: "PyObject* inPythonFunction" is typemapped in Quills.i;
+	// "CallPythonVoidReturnVoidOnce" is defined in Quills.i
+	static void
+	call_soon	(PyObject*	inPythonFunction)
+	{
+		Py_INCREF(inPythonFunction);
+		Quills::Events::_call_soon_py(CallPythonVoidReturnVoidOnce, reinterpret_cast< void* >(inPythonFunction));
+	}
+%feature("docstring",
+"Register a Python function to be called (with no arguments)\n\
 immediately after the main event loop terminates.\n\
 \n\
 This is the only way for Python code to continue running after\n\
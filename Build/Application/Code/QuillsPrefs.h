@@ -103,7 +103,8 @@ through this interface.\n\
 "Add or modify a macro in this collection.\n\
 \n\
 The index is at least 1, and specifies which macro in the set\n\
-to change.\n\
+to change.  Raise ValueError if the set cannot hold a macro\n\
+with the given index.\n\
 \n\
 The keyword arguments are optional; any that are given will be\n\
 assigned as attributes of the macro.  Currently, not all\n\
@@ -112,6 +113,17 @@ possible attributes can be set from scripts.\n\
 Any given strings must use UTF-8 encoding.\n\
 ") define_macro;
 %feature("kwargs") define_macro;
+
+// report bad indexes (std::invalid_argument) as ValueError
+%exception define_macro
+{
+	try
+	{
+		$action
+	}
+	SWIG_CATCH_STDEXCEPT // catch various std::exception derivatives
+	QUILLS_CATCH_ALL
+}
 #endif
 	void define_macro	(unsigned int		index_in_set,
 						 std::string		name = "",
@@ -70,6 +70,33 @@ Terminal::set_dumb_string_for_char	(unsigned short		unicode,
 }
 
 
+/*!
+See header or "pydoc" for Python docstrings.
+
+(2020.10)
+*/
+void
+Terminal::set_dumb_strings_for_chars	(std::vector< std::string > const&	renderings_utf8,
+										 unsigned short						first_char)
+{
+	UInt32		characterCode = first_char;
+	
+	
+	for (auto const& renderingUTF8 : renderings_utf8)
+	{
+		if (characterCode > 0xFFFF)
+		{
+			break;
+		}
+		if (false == renderingUTF8.empty())
+		{
+			Terminal_SetDumbTerminalRendering(STATIC_CAST(characterCode, UniChar), renderingUTF8.c_str());
+		}
+		++characterCode;
+	}
+}// set_dumb_strings_for_chars
+
+
 /*!
 See header or "pydoc" for Python docstrings.
 
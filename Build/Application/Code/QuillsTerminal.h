@@ -74,6 +74,22 @@ just prints the numerical value in angle brackets.\n\
 	static void set_dumb_string_for_char	(unsigned short		unicode,
 											 std::string		rendering_utf8);
 	
+#if SWIG
+%feature("docstring",
+"Like set_dumb_string_for_char(), but specifies renderings for\n\
+many consecutive character codes in a single call; this is much\n\
+more efficient when the entire Basic Multilingual Plane is set.\n\
+\n\
+The first string is the rendering of \"first_char\" (by default,\n\
+code 0), the second string is for the next code, and so on.  Any\n\
+empty string is skipped, leaving the current rendering of that\n\
+character in effect.  Strings beyond code 0xFFFF are ignored.\n\
+") set_dumb_strings_for_chars;
+%feature("kwargs") set_dumb_strings_for_chars;
+#endif
+	static void set_dumb_strings_for_chars	(std::vector< std::string > const&	renderings_utf8,
+											 unsigned short						first_char = 0);
+	
 #if SWIG
 %feature("docstring",
 "Return a pair of integers as a tuple, that locates a word in\n\
@@ -146,6 +146,53 @@ if __name__ == "__main__":
     #         return ws
     #
     # --------------------------------------------------------------------------
+    # OTHER CUSTOMIZATIONS
+    #
+    # Since your module is imported before the event loop starts, it may also
+    # call "pymacterm" configuration routines directly.  For instance, double-
+    # clicks normally select everything between whitespace; the following
+    # would also stop word selections at dots, slashes and any dash character:
+    #
+    # EXAMPLE
+    #     import pymacterm.term_text
+    #     pymacterm.term_text.set_word_breaks('./', categories=['Pd'])
+    #
+    # Similarly, the following would reload a macro set as soon as the file is
+    # saved by any editor (without polling the disk):
+    #
+    # EXAMPLE
+    #     import pymacterm.file_watch
+    #     pymacterm.file_watch.watch_macros('/Users/me/My.macros')
+    #
+    # Files can also be opened in new ways, by file name extension or by the
+    # interpreter in a "#!" line (all handlers are registered in one batch
+    # after your module is imported):
+    #
+    # EXAMPLE
+    #     import pymacterm.file_open
+    #     pymacterm.file_open.register_handlers(
+    #         extensions={'rb': pymacterm.file_open.script},
+    #         interpreters={'ruby': pymacterm.file_open.script})
+    #
+    # Preferences files are imported all at once.  If you import very large
+    # files with many collections, the following would import them in steps
+    # instead (so that the user interface can respond in between):
+    #
+    # EXAMPLE
+    #     import pymacterm.file_open
+    #     pymacterm.file_open.register_handlers(
+    #         extensions={'plist': pymacterm.file_open.prefs_async,
+    #                     'xml': pymacterm.file_open.prefs_async})
+    #
+    # Sessions opened from "ssh://" and "sftp://" URLs can share one connection
+    # per server, so that only the first one has to wait to log in (the others
+    # start almost immediately, even after the first one ends):
+    #
+    # EXAMPLE
+    #     import pymacterm.ssh_mux
+    #     pymacterm.ssh_mux.enable(persist='30m')
+    #
+    # --------------------------------------------------------------------------
     if "MACTERM_SKIP_CUSTOM_LIBS" in os.environ:
         warn("MacTerm: Ignoring any 'customize_macterm' module",
              "(environment setting).")
@@ -215,23 +262,27 @@ if __name__ == "__main__":
         import pymacterm
         pymacterm.run_all_tests()
 
+    # files that are expensive to recreate are saved in the user's
+    # Caches folder, so that they can be reused on the next launch
+    try:
+        cache_dir = os.path.expanduser("~/Library/Caches/net.macterm.MacTerm")
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+    except Exception as _:
+        warn("Warning, unable to create cache folder:", _)
+        cache_dir = None
+    if cache_dir is not None:
+        try:
+            pymacterm.file_open.set_compiled_file_dir(
+                os.path.join(cache_dir, "CompiledFiles"))
+        except Exception as _:
+            warn("Warning, unable to create folder for compiled files:", _)
+
     # register MacTerm features that are actually implemented in Python!
-    Session.on_urlopen_call(pymacterm.url_open.file, 'file')
-    Session.on_urlopen_call(pymacterm.url_open.sftp, 'sftp')
-    Session.on_urlopen_call(pymacterm.url_open.ssh, 'ssh')
-    Session.on_urlopen_call(pymacterm.url_open.x_man_page, 'x-man-page')
-    Session.on_fileopen_call(pymacterm.file_open.script, 'bash')
-    Session.on_fileopen_call(pymacterm.file_open.script, 'command')
-    Session.on_fileopen_call(pymacterm.file_open.script, 'csh')
-    Session.on_fileopen_call(pymacterm.file_open.script, 'pl')
-    Session.on_fileopen_call(pymacterm.file_open.prefs, 'plist')
-    Session.on_fileopen_call(pymacterm.file_open.script, 'py')
-    Session.on_fileopen_call(pymacterm.file_open.script, 'sh')
-    Session.on_fileopen_call(pymacterm.file_open.script, 'tcl')
-    Session.on_fileopen_call(pymacterm.file_open.script, 'tcsh')
-    Session.on_fileopen_call(pymacterm.file_open.script, 'tool')
-    Session.on_fileopen_call(pymacterm.file_open.prefs, 'xml')
-    Session.on_fileopen_call(pymacterm.file_open.script, 'zsh')
+    # (one function handles every URL scheme; see url_open.open())
+    pymacterm.url_open.install_handlers()
+    # (file types are registered all at once; see file_open.register_handlers())
+    pymacterm.file_open.install_handlers()
 
     def pids_cwds(pids_tuple):
         """A callback, invoked by MacTerm, whenever the current working
@@ -275,18 +326,27 @@ if __name__ == "__main__":
     # if desired, override what string is sent after keep-alive timers expire
     #Session.set_keep_alive_transmission(".")
 
+    # double-clicks select words between whitespace (with some punctuation
+    # stripped); to instead keep URLs, file paths, IP addresses, "host:port"
+    # pairs and hashes whole, register "find_smart_word" in place of
+    # "find_word" below
     try:
         Terminal.on_seekword_call(pymacterm.term_text.find_word)
     except Exception as _:
         warn("Warning, exception while trying to register word finder for",
              "double clicks:", _)
 
-    for i in range(0, 256):
-        try:
-            rendering = pymacterm.term_text.get_dumb_rendering(i)
-            Terminal.set_dumb_string_for_char(i, rendering)
-        except Exception as _:
-            warn("Warning, exception while setting character code %i:" % i, _)
+    # install renderings for the entire Basic Multilingual Plane in
+    # one call; the table is saved in the Caches folder (see above)
+    # so that it does not have to be recomputed on every launch
+    cache_file = None
+    if cache_dir is not None:
+        cache_file = os.path.join(cache_dir, "DumbTerminalRenderings.marshal")
+    try:
+        renderings = pymacterm.term_text.dumb_rendering_table(cache_file)
+        Terminal.set_dumb_strings_for_chars(renderings)
+    except Exception as _:
+        warn("Warning, exception while setting dumb terminal renderings:", _)
 
     # banner
     print("MacTerm: Full initialization complete.")
@@ -27,15 +27,31 @@ def run_module_tests(mod):
 def run_all_tests():
     """Run tests in every module that has tests.
     """
+    from . import benchmarks
     from . import file_kvp
     from . import file_open
+    from . import file_watch
+    from . import host_cache
+    from . import prefs_import
+    from . import quills_stub
+    from . import shell_words
+    from . import ssh_mux
     from . import term_text
+    from . import url_authority
     from . import url_open
     from . import url_parse
     from . import utilities
+    run_module_tests(benchmarks)
     run_module_tests(file_kvp)
     run_module_tests(file_open)
+    run_module_tests(file_watch)
+    run_module_tests(host_cache)
+    run_module_tests(prefs_import)
+    run_module_tests(quills_stub)
+    run_module_tests(shell_words)
+    run_module_tests(ssh_mux)
     run_module_tests(term_text)
+    run_module_tests(url_authority)
     run_module_tests(url_open)
     run_module_tests(url_parse)
     run_module_tests(utilities)
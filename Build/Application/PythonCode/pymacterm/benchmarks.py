@@ -0,0 +1,1096 @@
+#!/usr/bin/python
+# vim: set fileencoding=UTF-8 :
+
+"""Routines to measure the speed of performance-critical code.
+
+Most benchmarks import modules that depend on Quills; if Quills cannot be
+imported then the "quills_stub" module is used in its place, so benchmarks
+can be run anywhere with "python -m pymacterm.benchmarks".  Each benchmark
+prints one line per measurement.  Benchmarks of code that calls Quills
+always use "quills_stub" (see its "latency" setting), and report how many
+times each Quills method is called.
+
+file_kvp -- compare key-value-pair parsers on a large ".session" file
+find_smart_word -- time smart selections on long lines of log-like text
+find_word -- compare word-finding engines on lines of increasing length
+find_word_repeated -- time repeated clicks on the same line (cached index)
+host_warmup -- compare parallel host lookups with one lookup per session
+macros_reload -- time loading and reloading ".macros" files of growing size
+prefs_roundtrip -- time exporting and importing bundles of many collections
+render_dumb -- compare batch and per-character dumb-terminal rendering
+session_batch -- compare file_open.sessions() with one session() at a time
+session_launch -- compare parsed and compiled ".session" files
+session_sizes -- time file_open.session() for ".session" files of growing size
+shell_words -- compare shell_words.split() with shlex.split()
+url_authority -- compare url_authority.parse() with the older split-based code
+url_dispatch -- compare URL parsers, and time url_open.open() for many URLs
+run_all -- run every benchmark in this module
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__author__ = 'Kevin Grant <kmg@mac.com>'
+__date__ = '18 October 2026'
+__version__ = '4.0.0'
+
+import os
+import random
+import shutil
+import string
+import tempfile
+import time
+from timeit import default_timer as _timer
+import urlparse
+#import urllib.parse as urlparse # for Python 3.0
+
+from . import quills_stub
+from .utilities import \
+    slash_free_path as _slash_free_path
+quills_stub.install()
+
+def _best_time(func, args, repeat=5):
+    """_best_time(func, args, repeat=5) -> float
+
+    Call the given function with the given tuple of arguments
+    several times, and return the shortest time in seconds.
+
+    """
+    result = None
+    for ignored in range(repeat):
+        start = _timer()
+        func(*args)
+        elapsed = _timer() - start
+        if result is None or elapsed < result:
+            result = elapsed
+    return result
+
+def _find_word_per_char(text_utf8, pos):
+    """_find_word_per_char(text_utf8, pos) -> (pos, count)
+
+    The original implementation of term_text.find_word(), which
+    examines one character at a time; it is kept as a baseline
+    for the benchmarks, and to verify that find_word() returns
+    the same results.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> from pymacterm.term_text import find_word
+    >>> s = 'x = f("a, b") + [1] (see `man ls`.) ...(y) "z.'
+    >>> [i for i in range(len(s))
+    ...  if find_word(s, i) != _find_word_per_char(s, i)]
+    []
+
+    """
+    result = [pos, 1]
+    if pos < 0:
+        raise ValueError("word-seeking callback expected nonnegative offset")
+    try:
+        ustr = unicode(text_utf8, "utf-8", "ignore")
+        len_ustr = len(ustr)
+        if pos >= len_ustr:
+            raise ValueError("word-seeking callback expected offset to",
+                             "fall within range of characters")
+        nonword_chars = str(string.whitespace)
+        # an easy way to customize this is to add characters to
+        # the string variable "nonword_chars", e.g. the following
+        # would consider dots (.) to be word-breaking characters:
+        #     nonword_chars = nonword_chars + '.'
+        invert = False
+        if ustr[pos] in nonword_chars:
+            # special case; when starting on non-word characters, look for all
+            # non-word characters
+            invert = True
+        i = pos
+        j = pos
+        while i >= 0:
+            if (invert and ustr[i] not in nonword_chars) or \
+               (not invert and ustr[i] in nonword_chars):
+                i = i + 1
+                break
+            i = i - 1
+        if i < 0:
+            i = 0
+        while j < len_ustr:
+            if (invert and ustr[j] not in nonword_chars) or \
+               (not invert and ustr[j] in nonword_chars):
+                j = j - 1
+                break
+            j = j + 1
+        if j >= len_ustr:
+            j = len_ustr - 1
+        result[0] = i
+        result[1] = j - i + 1
+        # strip certain trailing punctuation marks to make word selections more
+        # sensible
+        if result[1] > 0:
+            # WARNING: variable helpers are synchronized "as needed", not
+            # "always"; be careful when adding new code to make sure the
+            # variables are actually up-to-date before depending on them
+            first = ustr[result[0]]
+            last = ustr[result[0] + result[1] - 1]
+            # strip basic punctuation off the end (this is repeated below)
+            if (last == ".") or (last == ",") or (last == ";") or (last == ":"):
+                result[1] = result[1] - 1
+                last = ustr[result[0] + result[1] - 1] # synchronize variable
+            if result[1] > 1:
+                open_paren_count = 0
+                close_paren_count = 0
+                double_quote_count = 0
+                single_quote_count = 0
+                # study the word's characters; note that due to GNU's broken
+                # behavior of treating a backquote like an open-quote, this
+                # algorithm assumes that "`" is a type of single quotation mark
+                for i in range(result[0], result[0] + result[1]):
+                    if ustr[i] == '"':
+                        double_quote_count = double_quote_count + 1
+                    elif ustr[i] == "'" or ustr[i] == "`":
+                        single_quote_count = single_quote_count + 1
+                    elif ustr[i] == "(":
+                        open_paren_count = open_paren_count + 1
+                    elif ustr[i] == ")":
+                        close_paren_count = close_paren_count + 1
+                # strip trailing punctuation as long as the word doesn't
+                # contain balanced brackets (e.g. keep "xyz()" but change
+                # "xyz)" to "xyz")
+                tail_ok = False
+                while not tail_ok and result[1] > 0:
+                    if last == ")":
+                        if close_paren_count > open_paren_count:
+                            close_paren_count = close_paren_count - 1
+                            result[1] = result[1] - 1
+                        else:
+                            tail_ok = True
+                    elif last == '"':
+                        if (double_quote_count % 2) != 0:
+                            double_quote_count = double_quote_count - 1
+                            result[1] = result[1] - 1
+                        else:
+                            tail_ok = True
+                    elif last == "'" or last == "`":
+                        if (single_quote_count % 2) != 0:
+                            single_quote_count = single_quote_count - 1
+                            result[1] = result[1] - 1
+                        else:
+                            tail_ok = True
+                    else:
+                        tail_ok = True
+                    last = ustr[result[0] + result[1] - 1] # sync. variable
+                # strip leading punctuation as long as the word doesn't contain
+                # balanced brackets (e.g. keep "(xyz)", change "(xyz" to "xyz")
+                head_ok = False
+                while not head_ok and result[1] > 0:
+                    if first == "(":
+                        if open_paren_count > close_paren_count:
+                            open_paren_count = open_paren_count - 1
+                            result[0] = result[0] + 1
+                            result[1] = result[1] - 1
+                        else:
+                            head_ok = True
+                    elif first == '"':
+                        if (double_quote_count % 2) != 0:
+                            double_quote_count = double_quote_count - 1
+                            result[0] = result[0] + 1
+                            result[1] = result[1] - 1
+                        else:
+                            head_ok = True
+                    elif first == "'" or first == "`":
+                        if (single_quote_count % 2) != 0:
+                            single_quote_count = single_quote_count - 1
+                            result[0] = result[0] + 1
+                            result[1] = result[1] - 1
+                        else:
+                            head_ok = True
+                    else:
+                        head_ok = True
+                    first = ustr[result[0]] # synchronize variable
+                    last = ustr[result[0] + result[1] - 1] # sync. variable
+            # repeat this rule, as punctuation sometimes appears inside brackets
+            if (last == ".") or (last == ",") or (last == ";") or (last == ":"):
+                result[1] = result[1] - 1
+                last = ustr[result[0] + result[1] - 1] # synchronize variable
+        # strip any brackets that appear balanced at both ends
+        if result[1] > 1:
+            first = ustr[result[0]]
+            last = ustr[result[0] + result[1] - 1]
+            end_caps_ok = False
+            while not end_caps_ok and result[1] > 0:
+                if (first == '"' and last == '"') or \
+                   (first == "'" and last == "'") or \
+                   (first == "`" and last == "`") or \
+                   (first == "`" and last == "'") or \
+                   (first == '<' and last == '>') or \
+                   (first == '(' and last == ')') or \
+                   (first == '[' and last == ']') or \
+                   (first == '{' and last == '}'):
+                    # strip brackets
+                    result[0] = result[0] + 1
+                    result[1] = result[1] - 2
+                    first = ustr[result[0]] # synchronize variable
+                    last = ustr[result[0] + result[1] - 1] # sync. variable
+                else:
+                    end_caps_ok = True
+    except Exception as _:
+        print("warning, exception while trying to find words:", _)
+    return (result[0], result[1])
+
+def _host_port(netloc):
+    """_host_port(netloc) -> (host, port)
+
+    Return a tuple of the host and port elements of a net
+    location component in a URL.  Either of the elements may be
+    None if it is not present in the original URL.  This is part
+    of the original url_parse code that url_authority.parse()
+    replaced; it is kept as a baseline for the benchmarks.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> _host_port("nowhere.com")
+    ('nowhere.com', None)
+
+    >>> _host_port("nowhere.com:123")
+    ('nowhere.com', 123)
+
+    >>> _host_port(":")
+    (None, None)
+
+    """
+    elements = netloc.split(':')
+    host = None
+    port = None
+    if len(elements) > 2 or len(elements) == 0:
+        print("MacTerm: unexpected number of host:port elements in URL")
+    else:
+        host = elements[0]
+        if len(host) == 0:
+            host = None
+        try:
+            port = int(elements[1])
+        except IndexError:
+            pass # no port - fine
+        except ValueError:
+            port = None # e.g. if port = "string"
+    return (host, port)
+
+def _iter_pairs_by_split(lines):
+    """_iter_pairs_by_split(lines) -> iterator
+
+    The original implementation of file_kvp.Parser.iter_pairs(),
+    which splits strings at every "=" or "," without regard to
+    any quotes; it is kept as a baseline for the benchmarks.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> from pymacterm.file_kvp import Parser
+    >>> lines = ['a = "x"\\n', 'b = {1, 2, "y"}\\n']
+    >>> list(_iter_pairs_by_split(lines)) == list(Parser.iter_pairs(lines))
+    True
+
+    """
+    def parse_any_value(value):
+        result = value.strip(" \t\n")
+        result = result.strip("\"\'")
+        try:
+            result = int(result)
+        except ValueError:
+            pass
+        return result
+    i = 1
+    for line in lines:
+        try:
+            key, value = str(line).split('=')
+            key = key.strip()
+            value = value.strip(" \t\n\"\'")
+            if len(value) > 0:
+                if value[0] == '{':
+                    value = value.lstrip("{")
+                    value = value.rstrip("}")
+                    value = tuple([parse_any_value(x)
+                                   for x in value.split(",")])
+        except ValueError as _:
+            raise SyntaxError("session file line %d: %s" % (i, str(_)))
+        yield (key, value)
+        i = i + 1
+
+def _report(name, detail, seconds, baseline=None):
+    """_report(name, detail, seconds, baseline=None) -> None
+
+    Print a single measurement, and the speedup relative to
+    the given baseline time (if any).
+
+    """
+    if baseline is None:
+        print("MacTerm: benchmark %s: %s: %.6f s" % (name, detail, seconds))
+    else:
+        print("MacTerm: benchmark %s: %s: %.6f s (%.1fx)" %
+              (name, detail, seconds, baseline / max(seconds, 1e-9)))
+
+def _report_calls(name, detail, per_count):
+    """_report_calls(name, detail, per_count) -> None
+
+    Print the average number of calls to each method of the
+    "quills_stub" module, per operation (given the number of
+    operations since the calls were last reset), and forget
+    the calls.
+
+    """
+    stats = quills_stub.call_stats()
+    counts = " ".join(["%s=%g" % (x, stats[x][0] / per_count)
+                       for x in sorted(stats)])
+    print("MacTerm: benchmark %s: %s: Quills calls per operation: %s" %
+          (name, detail, counts or "none"))
+    quills_stub.reset_calls()
+
+def _report_rate(name, detail, seconds, count, unit):
+    """_report_rate(name, detail, seconds, count, unit) -> None
+
+    Print a single measurement of the time for the given number
+    of things (such as "files"), and the throughput.
+
+    """
+    print("MacTerm: benchmark %s: %s: %.6f s (%.1f %s/s)" %
+          (name, detail, seconds, count / max(seconds, 1e-9), unit))
+
+def _url_dict_by_scheme(url):
+    """_url_dict_by_scheme(url) -> dict
+
+    The original url_parse functions for each scheme (file(),
+    sftp(), ssh() and x_man_page()), which use "urlparse" or
+    split strings (see _user_host_port()) and return a
+    dictionary; they are kept as a baseline for the benchmarks.
+    The ssh() and sftp() results have no 'options'.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> from pymacterm import url_parse
+    >>> for url in ('ssh://me@host:22', 'sftp://host/', 'file:///tmp/x',
+    ...             'x-man-page://3/printf', 'x-man-page://ls'):
+    ...     new = url_parse.parse(url).as_dict()
+    ...     ignored = new.pop('options', None)
+    ...     print(_url_dict_by_scheme(url) == new)
+    True
+    True
+    True
+    True
+    True
+
+    """
+    result = dict()
+    scheme = url.partition(':')[0]
+    if scheme in ('sftp', 'ssh'):
+        # the Python parsing module does not support these because they
+        # are not fully specified; so, parse manually
+        if not url.startswith(scheme + '://'):
+            raise ValueError("not an %s URL" % scheme)
+        netloc = _slash_free_path(url.replace(scheme + ':', '', 1))
+        (user, host, port) = _user_host_port(netloc)
+        result['user'] = user
+        result['host'] = host
+        result['port'] = port
+    elif scheme in ('file', 'x-man-page'):
+        allow_pound_notation = False
+        (ignored, netloc, path, params, query, fragment) = \
+            urlparse.urlparse(url, scheme, allow_pound_notation)
+        if scheme == 'file':
+            if path == '':
+                path = '/'
+            result['path'] = path
+        elif len(path) > 0:
+            result['section'] = netloc
+            result['cmd'] = _slash_free_path(path)
+        else:
+            result['section'] = None
+            result['cmd'] = netloc
+    else:
+        raise ValueError("unsupported URL scheme: %s" % scheme)
+    return result
+
+def _user_host_port(netloc):
+    """_user_host_port(netloc) -> (user, host, port)
+
+    Return a tuple of the user, host and port elements of a net
+    location component in a URL.  Any of the elements may be None
+    if it is not present in the original URL.  This is the
+    original parser that url_authority.parse() replaced; it is
+    kept as a baseline for the benchmarks.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> _user_host_port("nowhere.com")
+    (None, 'nowhere.com', None)
+
+    >>> _user_host_port("me@nowhere.com")
+    ('me', 'nowhere.com', None)
+
+    >>> _user_host_port("me@nowhere.com:123")
+    ('me', 'nowhere.com', 123)
+
+    >>> _user_host_port("@")
+    (None, None, None)
+
+    >>> _user_host_port("nowhere.com:123")
+    (None, 'nowhere.com', 123)
+
+    >>> _user_host_port(":")
+    (None, None, None)
+
+    >>> _user_host_port("@:")
+    (None, None, None)
+
+    """
+    elements = netloc.split('@')
+    user = None
+    host = None
+    port = None
+    if len(elements) > 2 or len(elements) == 0:
+        print("MacTerm: unexpected number of @ elements in URL")
+    else:
+        if len(elements) == 2:
+            user = elements[0]
+            if len(user) == 0:
+                user = None
+            remainder = elements[1]
+        else:
+            remainder = elements[0]
+        (host, port) = _host_port(remainder)
+    return (user, host, port)
+
+def _write_session_files(dir_pathname, count, line_count):
+    """_write_session_files(dir_pathname, count, line_count) -> list
+
+    Create the given number of ".session" files in the given
+    directory, each with a different command and the given
+    total number of lines, and return their pathnames.
+
+    """
+    result = list()
+    for i in range(count):
+        pathname = os.path.join(dir_pathname, "%d.session" % i)
+        with open(pathname, 'w') as ofh:
+            ofh.write('command = "/usr/bin/ssh -p %d user@host%d"\n' % (i, i))
+            for j in range(line_count - 1):
+                ofh.write('key%d = {"one", "two", %d}\n' % (j, j))
+        result.append(pathname)
+    return result
+
+def _sample_line(length, words=True):
+    """_sample_line(length, words=True) -> string
+
+    Return a reproducible line of text with the given number
+    of characters.  If "words" is False, the line contains no
+    whitespace at all (similar to minified JSON).
+
+    """
+    rng = random.Random(length)
+    parts = []
+    size = 0
+    while size < length:
+        if words:
+            part = "%s%s " % (rng.choice(('', '"', '(')),
+                              "x" * rng.randint(1, 12))
+        else:
+            part = '{"k%d":[%d,"v"]},' % (rng.randint(0, 999), size)
+        parts.append(part)
+        size = size + len(part)
+    return "".join(parts)[:length]
+
+def file_kvp(line_count=100000):
+    """file_kvp(line_count) -> None
+
+    Time file_kvp.Parser.iter_pairs() against the original
+    string-splitting parser, for the given number of lines
+    with a mixture of quoted strings, lists of numbers and
+    lists of quoted strings.  (No value contains quoted "="
+    or "," characters, since the original parser fails on
+    those.)
+
+    """
+    from . import file_kvp
+    templates = ('name%d = "Session number %d"\n',
+                 'command%d = "/usr/bin/ssh -p 22 user@host%d"\n',
+                 'ports%d = {%d, 2, 3, 4, 5, 6, 7, 8}\n',
+                 'names%d = {"one", "two", "three", "x%d"}\n',
+                 'encoding%d = UTF-%d\n')
+    lines = [templates[i % len(templates)] % (i, i)
+             for i in range(line_count)]
+    def parse(iter_pairs):
+        for ignored in iter_pairs(lines):
+            pass
+    detail = "%d lines" % line_count
+    old = _best_time(parse, (_iter_pairs_by_split,))
+    _report("file_kvp (split)", detail, old)
+    _report("file_kvp", detail,
+            _best_time(parse, (file_kvp.Parser.iter_pairs,)), old)
+
+def find_smart_word(lengths=(80, 1000, 10000, 100000), clicks=50):
+    """find_smart_word(lengths, clicks) -> None
+
+    Time term_text.find_smart_word() for clicks at several
+    offsets of log-like lines (containing URLs, paths, IP
+    addresses and hashes) of each given length, reporting the
+    average and worst time per click; for a line of 10,000
+    characters, each click should take well under a
+    millisecond.  Lines with no whitespace are also measured.
+
+    """
+    from . import term_text
+    rng = random.Random(0)
+    samples = ('GET', 'https://www.macterm.net/help/index.html?q=1',
+               '/usr/local/var/log/system.log', '10.0.0.254:8080',
+               '[fe80::1%en0]:22', 'kevin@build.example.com:2222',
+               '4fb76cc2e1a9', 'status=200', '"(quoted)",')
+    for words in (True, False):
+        for length in lengths:
+            if words:
+                parts = []
+                while sum([len(x) + 1 for x in parts]) < length:
+                    parts.append(rng.choice(samples))
+                line = " ".join(parts)[:length]
+            else:
+                line = _sample_line(length, words=False)
+            offsets = [(length * i) // clicks for i in range(clicks)]
+            worst = 0.0
+            total = 0.0
+            for pos in offsets:
+                term_text.clear_word_cache()
+                elapsed = _best_time(term_text.find_smart_word, (line, pos))
+                total = total + elapsed
+                worst = max(worst, elapsed)
+            detail = "%s line of %d chars" % \
+                     (("log" if words else "no-space"), length)
+            _report("find_smart_word (average)", detail, total / clicks)
+            _report("find_smart_word (worst)", detail, worst)
+    term_text.clear_word_cache()
+
+def find_word(lengths=(80, 1000, 10000, 100000, 1000000)):
+    """find_word(lengths) -> None
+
+    Time term_text.find_word() against the original character-
+    by-character implementation, for a click in the middle of
+    lines of each given length.  Lines of words and lines with
+    no whitespace (one huge word) are both measured.
+
+    """
+    from . import term_text
+    for words in (True, False):
+        for length in lengths:
+            line = _sample_line(length, words)
+            args = (line, length // 2)
+            detail = "%s line of %d chars" % \
+                     (("words" if words else "no-space"), length)
+            old = _best_time(_find_word_per_char, args)
+            _report("find_word (per-char)", detail, old)
+            _report("find_word", detail,
+                    _best_time(term_text.find_word, args), old)
+
+def find_word_repeated(lengths=(1000, 100000, 1000000), clicks=100):
+    """find_word_repeated(lengths, clicks) -> None
+
+    Time a series of clicks at different offsets of the same
+    line of words, which is how double- and triple-clicks on
+    scrollback behave, with and without the line cache of
+    term_text.find_word().
+
+    """
+    from . import term_text
+    for length in lengths:
+        line = _sample_line(length)
+        offsets = [(length * i) // clicks for i in range(clicks)]
+        detail = "%d clicks on line of %d chars" % (clicks, length)
+        def uncached():
+            for pos in offsets:
+                term_text.clear_word_cache()
+                term_text.find_word(line, pos)
+        def cached():
+            term_text.clear_word_cache()
+            for pos in offsets:
+                term_text.find_word(line, pos)
+        old = _best_time(uncached, ())
+        _report("find_word (uncached)", detail, old)
+        _report("find_word (cached)", detail, _best_time(cached, ()), old)
+    term_text.clear_word_cache()
+
+def host_warmup(counts=(10, 50, 200), delay=0.02, slow_delay=0.5):
+    """host_warmup(counts, delay, slow_delay) -> None
+
+    Time the lookup of each given number of different hosts,
+    by a resolver that takes "delay" seconds for every host
+    except one (which takes "slow_delay" seconds, as if it used
+    a slow DNS server): first one at a time (as when each "ssh"
+    looks up its own host), and then in parallel by
+    host_cache.HostCache.warm() (as url_open.open_many() does).
+
+    """
+    from . import host_cache
+    slow_host = 'host0.example.com'
+    def resolver(host):
+        time.sleep(slow_delay if host == slow_host else delay)
+        return ['10.0.0.1']
+    for count in counts:
+        hosts = ["host%d.example.com" % i for i in range(count)]
+        detail = "%d hosts" % count
+        def serial():
+            cache = host_cache.HostCache(resolver=resolver)
+            for host in hosts:
+                cache.resolve(host)
+        def parallel():
+            cache = host_cache.HostCache(resolver=resolver)
+            try:
+                cache.warm(hosts, wait=60.0)
+            finally:
+                cache.close()
+        old = _best_time(serial, (), repeat=1)
+        _report("host_warmup (one at a time)", detail, old)
+        new = _best_time(parallel, (), repeat=1)
+        _report("host_warmup (warm)", detail, new, old)
+
+def macros_reload(sizes=(10, 100, 1000, 10000), count=100):
+    """macros_reload(sizes, count) -> None
+
+    Time file_open.macros() for ".macros" files defining all 12
+    macros, with contents of each of the given sizes (in
+    characters): when every file is different from the current
+    macro set (as when switching sets), when the same file is
+    opened again, and when one macro in the file is changed (as
+    when a file is edited and reloaded).  Each is done "count"
+    times.  Quills calls are simulated by "quills_stub".
+
+    """
+    from . import file_open
+    old_quills = file_open.quills
+    temp_dir = tempfile.mkdtemp()
+    try:
+        file_open.quills = quills_stub
+        for size in sizes:
+            pathnames = list()
+            for i in range(2):
+                pathname = os.path.join(temp_dir, "%d-%d.macros" % (size, i))
+                with open(pathname, 'w') as ofh:
+                    for key in range(1, 13):
+                        contents = ("echo %d %d " % (i, key) +
+                                    "x" * size)[:size]
+                        ofh.write('f%d = "%s"\n' % (key, contents))
+                pathnames.append(pathname)
+            edited = os.path.join(temp_dir, "%d-edited.macros" % size)
+            with open(pathnames[0]) as ifh:
+                lines = ifh.readlines()
+            versions = (''.join(lines), 'f1 = "edited"\n' + ''.join(lines[1:]))
+            def load(sequence):
+                for i in range(count):
+                    file_open.macros(sequence[i % len(sequence)])
+            def load_edits(sequence):
+                # (the same file is saved with each version in turn)
+                for i in range(count):
+                    with open(edited, 'w') as ofh:
+                        ofh.write(sequence[i % len(sequence)])
+                    file_open.macros(edited)
+            detail = "12 macros of %d characters, %d loads" % (size, count)
+            for (label, loader, sequence) in (("switch", load, pathnames),
+                                              ("same", load, pathnames[:1]),
+                                              ("edit", load_edits, versions)):
+                loader(sequence[-1:]) # start from a known macro set
+                quills_stub.reset_calls()
+                seconds = _best_time(loader, (sequence,), repeat=1)
+                _report_rate("macros_reload (%s)" % label, detail, seconds,
+                             count, "files")
+                _report_calls("macros_reload (%s)" % label, detail, count)
+    finally:
+        file_open.quills = old_quills
+        file_open._macro_set = None
+        file_open._macro_defs = dict()
+        file_open._macro_source = None
+        file_open.clear_file_cache()
+        quills_stub.reset_calls()
+        shutil.rmtree(temp_dir)
+
+def prefs_roundtrip(sizes=(10, 100, 1000), key_count=50,
+                    import_latency=0.0005):
+    """prefs_roundtrip(sizes, key_count, import_latency) -> None
+
+    For each of the given numbers of collections (each with the
+    given number of settings), time the export of all of them to
+    one bundle file; the import of a separate file for each one
+    with file_open.prefs() (on the main thread); and the import
+    of the bundle with "prefs_import" (reading on a background
+    thread, and importing in steps).  The longest step is also
+    reported, since it is the longest time that the user
+    interface would be unable to respond.  Each simulated import
+    by Quills takes the given number of seconds.
+
+    """
+    from . import file_open
+    from . import prefs_import
+    old_quills = (file_open.quills, prefs_import.quills)
+    old_latency = dict(quills_stub.latency)
+    temp_dir = tempfile.mkdtemp()
+    try:
+        file_open.quills = prefs_import.quills = quills_stub
+        quills_stub.latency['Prefs.import_from_file'] = import_latency
+        for size in sizes:
+            collections = list()
+            for i in range(size):
+                collection = {'name-string': "Collection %d" % i}
+                for key in range(key_count):
+                    collection["terminal-setting-%d-rgb" % key] = \
+                        [key / 100.0, i / 100.0, 0.5]
+                collections.append(collection)
+            bundle = os.path.join(temp_dir, "%d.plist" % size)
+            detail = "%d collections of %d settings" % (size, key_count)
+            seconds = _best_time(prefs_import._write_plist,
+                                 (collections, bundle), repeat=1)
+            _report_rate("prefs_roundtrip (export)", detail, seconds, size,
+                         "collections")
+            singles = list()
+            for (i, collection) in enumerate(collections):
+                pathname = os.path.join(temp_dir, "%d-%d.plist" % (size, i))
+                prefs_import._write_plist(collection, pathname)
+                singles.append(pathname)
+            def import_singles():
+                for pathname in singles:
+                    file_open.prefs(pathname)
+            quills_stub.reset_calls()
+            seconds = _best_time(import_singles, (), repeat=1)
+            _report_rate("prefs_roundtrip (prefs)", detail, seconds, size,
+                         "collections")
+            _report_calls("prefs_roundtrip (prefs)", detail, size)
+            step_times = list()
+            def timed(function):
+                def step():
+                    start = _timer()
+                    function()
+                    step_times.append(_timer() - start)
+                return step
+            def import_bundle():
+                job = prefs_import.import_file(
+                    bundle, batch_size=8,
+                    call_soon=lambda f: quills_stub.Events.call_soon(timed(f)))
+                quills_stub.Events.run_loop()
+                if job.error is not None:
+                    raise job.error
+            quills_stub.reset_calls()
+            seconds = _best_time(import_bundle, (), repeat=1)
+            _report_rate("prefs_roundtrip (prefs_import)", detail, seconds,
+                         size, "collections")
+            _report("prefs_roundtrip (prefs_import, longest step)", detail,
+                    max(step_times))
+            _report_calls("prefs_roundtrip (prefs_import)", detail, size)
+            del quills_stub.Prefs.imported[:]
+    finally:
+        (file_open.quills, prefs_import.quills) = old_quills
+        quills_stub.latency.clear()
+        quills_stub.latency.update(old_latency)
+        quills_stub.reset_calls()
+        shutil.rmtree(temp_dir)
+
+def render_dumb(sizes=(1000000, 100000000)):
+    """render_dumb(sizes) -> None
+
+    Time term_text.render_dumb() against a loop that calls
+    term_text.get_dumb_rendering() for each character, on
+    buffers of random bytes (binary noise) of each given
+    size, decoded as Latin-1 so that every byte is a single
+    character.  Since the per-character loop is very slow for
+    large buffers, each engine only runs once per size.
+
+    """
+    from . import term_text
+    term_text.render_dumb('') # build the table in advance
+    def per_char(buf):
+        render = term_text.get_dumb_rendering
+        return "".join([render(ord(x)) for x in buf.decode('latin-1')])
+    rng = random.Random(0)
+    chunk = bytes(bytearray([rng.randint(0, 255) for x in range(65536)]))
+    for size in sizes:
+        buf = (chunk * (size // len(chunk) + 1))[:size]
+        detail = "%d bytes" % size
+        old = _best_time(per_char, (buf,), repeat=1)
+        _report("render_dumb (per-char)", detail, old)
+        _report("render_dumb", detail,
+                _best_time(term_text.render_dumb, (buf, 'latin-1'), repeat=1),
+                old)
+
+def session_batch(counts=(10, 50, 200), line_count=400, window_delay=0.001):
+    """session_batch(counts, line_count, window_delay) -> None
+
+    Time how long it takes until every Session exists, when
+    the given numbers of ".session" files (each with the given
+    number of lines) are opened one at a time by calling
+    file_open.session() and all at once by file_open.sessions().
+    Sessions are created by the "quills_stub" module, and each
+    one takes the given number of seconds to "open a window".
+    Nothing is cached between runs.
+
+    """
+    from . import file_open
+    old_quills = file_open.quills
+    old_compiled_dir = file_open._compiled_dir
+    old_delay = quills_stub.Session.delay
+    temp_dir = tempfile.mkdtemp()
+    try:
+        file_open.quills = quills_stub
+        file_open.set_compiled_file_dir(None)
+        quills_stub.Session.delay = window_delay
+        for count in counts:
+            pathnames = _write_session_files(temp_dir, count, line_count)
+            def sequential():
+                file_open.clear_file_cache()
+                for pathname in pathnames:
+                    file_open.session(pathname)
+            def batch():
+                file_open.clear_file_cache()
+                file_open.sessions(pathnames)
+            detail = "%d files of %d lines" % (count, line_count)
+            old = _best_time(sequential, (), repeat=3)
+            _report("session_batch (sequential)", detail, old)
+            _report("session_batch", detail, _best_time(batch, (), repeat=3),
+                    old)
+    finally:
+        file_open.quills = old_quills
+        file_open.set_compiled_file_dir(old_compiled_dir)
+        file_open.clear_file_cache()
+        quills_stub.Session.delay = old_delay
+        del quills_stub.Session.created[:]
+        shutil.rmtree(temp_dir)
+
+def session_launch(count=1000, line_count=40):
+    """session_launch(count, line_count) -> None
+
+    Time the preparation of the given number of sessions from
+    different ".session" files (each with the given number of
+    lines), as if each was opened for the first time by a new
+    MacTerm process: first by parsing every file, and then by
+    loading the compiled files from file_open.read_kvp_file().
+    No Session is actually created.
+
+    """
+    from . import file_open
+    old_compiled_dir = file_open._compiled_dir
+    temp_dir = tempfile.mkdtemp()
+    try:
+        pathnames = _write_session_files(temp_dir, count, line_count)
+        def launch_all():
+            file_open.clear_file_cache()
+            for pathname in pathnames:
+                file_open._session_args(file_open.read_kvp_file(pathname))
+        detail = "%d files of %d lines" % (count, line_count)
+        file_open.set_compiled_file_dir(None)
+        old = _best_time(launch_all, ())
+        _report("session_launch (parsed)", detail, old)
+        file_open.set_compiled_file_dir(os.path.join(temp_dir, "compiled"))
+        launch_all() # create compiled files
+        _report("session_launch (compiled)", detail,
+                _best_time(launch_all, ()), old)
+    finally:
+        file_open.set_compiled_file_dir(old_compiled_dir)
+        file_open.clear_file_cache()
+        shutil.rmtree(temp_dir)
+
+def session_sizes(line_counts=(10, 100, 1000, 10000), count=100):
+    """session_sizes(line_counts, count) -> None
+
+    Time file_open.session() for the given number of different
+    ".session" files of each given size (in lines), opening
+    each file once without any cached or compiled results, and
+    then opening all of them again (when their parsed contents
+    are cached).  Sessions are created by "quills_stub".
+
+    """
+    from . import file_open
+    old_quills = file_open.quills
+    old_compiled_dir = file_open._compiled_dir
+    old_capacity = file_open.file_cache_stats()['capacity']
+    temp_dir = tempfile.mkdtemp()
+    try:
+        file_open.quills = quills_stub
+        file_open.set_compiled_file_dir(None)
+        file_open.set_file_cache_capacity(count)
+        for line_count in line_counts:
+            files_dir = os.path.join(temp_dir, str(line_count))
+            os.mkdir(files_dir)
+            pathnames = _write_session_files(files_dir, count, line_count)
+            def open_all():
+                for pathname in pathnames:
+                    file_open.session(pathname)
+            detail = "%d files of %d lines" % (count, line_count)
+            file_open.clear_file_cache()
+            quills_stub.reset_calls()
+            seconds = _best_time(open_all, (), repeat=1)
+            _report_rate("session_sizes (first)", detail, seconds, count,
+                         "sessions")
+            _report_calls("session_sizes (first)", detail, count)
+            seconds = _best_time(open_all, (), repeat=1)
+            _report_rate("session_sizes (cached)", detail, seconds, count,
+                         "sessions")
+            del quills_stub.Session.created[:]
+    finally:
+        file_open.quills = old_quills
+        file_open.set_compiled_file_dir(old_compiled_dir)
+        file_open.set_file_cache_capacity(old_capacity)
+        file_open.clear_file_cache()
+        quills_stub.reset_calls()
+        del quills_stub.Session.created[:]
+        shutil.rmtree(temp_dir)
+
+def shell_words(count=100000, distinct=200):
+    """shell_words(count, distinct) -> None
+
+    Time shell_words.split() against shlex.split() for the
+    given number of command lines, which are chosen from the
+    given number of distinct commands (so that the cache of
+    shell_words.split() is effective, as for generated session
+    files); the time without the cache is also reported, and
+    so are times for the distinct commands alone.  One command
+    in four uses quotes or backslashes.
+
+    """
+    import shlex
+    from . import shell_words as words_module
+    rng = random.Random(0)
+    templates = ('/usr/bin/ssh -p %d -l user host%d.example.com',
+                 '/bin/ls -l "/Volumes/Backup Disk/%d" /tmp/%d',
+                 "/usr/bin/env TERM=xterm-256color /usr/bin/top -s %d -n %d",
+                 '/bin/echo one\\ two %d \'%d\'')
+    commands = [templates[i % len(templates)] % (i, i)
+                for i in range(distinct)]
+    sample = [commands[rng.randint(0, distinct - 1)] for x in range(count)]
+    def split_all(split, command_list):
+        for command in command_list:
+            split(command)
+    def split_cached(command_list):
+        words_module.clear_split_cache()
+        for command in command_list:
+            words_module.split(command)
+    for (command_list, detail) in \
+            ((commands, "%d distinct commands" % distinct),
+             (sample, "%d commands (%d distinct)" % (count, distinct))):
+        old = _best_time(split_all, (shlex.split, command_list), repeat=1)
+        _report("shell_words (shlex)", detail, old)
+        _report("shell_words (uncached)", detail,
+                _best_time(split_all,
+                           (words_module._split_uncached, command_list)), old)
+        _report("shell_words", detail,
+                _best_time(split_cached, (command_list,)), old)
+    words_module.clear_split_cache()
+
+def url_authority(count=2000000):
+    """url_authority(count) -> None
+
+    Time url_authority.parse() against the original parser
+    (_user_host_port(), which splits strings) for the
+    given number of URL authorities, with and without users and
+    ports.  (IPv6 addresses are not used, since the original
+    parser does not support them.)
+
+    """
+    from . import url_authority as authority_module
+    templates = ('host%d.example.com',
+                 'user%d@host%d.example.com',
+                 'user%d@host%d.example.com:22',
+                 'host%d.example.com:%d')
+    authorities = [templates[i % len(templates)].replace('%d',
+                                                         str(i % 65536))
+                   for i in range(count)]
+    def parse_all(parse):
+        for authority in authorities:
+            parse(authority)
+    detail = "%d authorities" % count
+    old = _best_time(parse_all, (_user_host_port,), repeat=1)
+    _report_rate("url_authority (split)", detail, old, count, "authorities")
+    new = _best_time(parse_all, (authority_module.parse,), repeat=1)
+    _report_rate("url_authority", detail, new, count, "authorities")
+    _report("url_authority", detail, new, old)
+
+def url_dispatch(count=1000000):
+    """url_dispatch(count) -> None
+
+    Time the parsing of the given number of URLs of mixed types
+    by url_parse.parse() and by the original functions for each
+    scheme (see _url_dict_by_scheme(), which chooses one by the
+    URL's scheme, as Quills did), and then
+    the time for url_open.open() to handle each URL (creating
+    Sessions with "quills_stub").  Throughput is also reported.
+
+    The parse() times are given with every URL different (so
+    its cache never helps) and with URLs chosen repeatedly
+    from 200 (as when bookmarks are opened), and are
+    compared to the time without the cache.
+
+    """
+    from . import url_open
+    from . import url_parse
+    templates = ('ssh://user%d@host%d.example.com:22',
+                 'sftp://host%d.example.com/%d',
+                 'x-man-page://%d/printf%d',
+                 'file:///Users/me/Documents/%d/%d')
+    urls = [templates[i % len(templates)] % (i, i) for i in range(count)]
+    repeated_urls = [urls[(i * 7) % min(count, 200)] for i in range(count)]
+    def parse_old():
+        for url in urls:
+            _url_dict_by_scheme(url)
+    def parse_new(url_list):
+        parse = url_parse.parse
+        for url in url_list:
+            parse(url)
+    def parse_uncached(url_list):
+        parse = url_parse._parse_uncached
+        for url in url_list:
+            parse(url)
+    def open_all():
+        open_url = url_open.open
+        for url in urls:
+            open_url(url)
+        del quills_stub.Session.created[:]
+    detail = "%d URLs" % count
+    old = _best_time(parse_old, (), repeat=1)
+    _report_rate("url_dispatch (scheme functions)", detail, old, count, "URLs")
+    uncached = _best_time(parse_uncached, (urls,), repeat=1)
+    _report("url_dispatch (parse, no cache)", detail, uncached, old)
+    url_parse.clear_parse_cache()
+    new = _best_time(parse_new, (urls,), repeat=1)
+    _report("url_dispatch (parse, all different)", detail, new, uncached)
+    uncached = _best_time(parse_uncached, (repeated_urls,), repeat=1)
+    url_parse.clear_parse_cache()
+    new = _best_time(parse_new, (repeated_urls,), repeat=1)
+    _report("url_dispatch (parse, repeated)", detail, new, uncached)
+    stats = url_parse.parse_cache_stats()
+    print("MacTerm: benchmark url_dispatch (parse, repeated): %d hits, "
+          "%d misses" % (stats['hits'], stats['misses']))
+    url_parse.clear_parse_cache()
+    old_quills = url_open.quills
+    try:
+        url_open.quills = quills_stub
+        seconds = _best_time(open_all, (), repeat=1)
+        _report_rate("url_dispatch (open)", detail, seconds, count, "URLs")
+    finally:
+        url_open.quills = old_quills
+        quills_stub.reset_calls()
+        del quills_stub.Session.created[:]
+
+def run_all():
+    """Run every benchmark in this module, with default settings.
+    """
+    file_kvp()
+    find_smart_word()
+    find_word()
+    find_word_repeated()
+    host_warmup()
+    macros_reload()
+    prefs_roundtrip()
+    render_dumb()
+    session_batch()
+    session_launch()
+    session_sizes()
+    shell_words()
+    url_authority()
+    url_dispatch()
+
+def _test():
+    """Runs all of this module's "doctest" test cases.
+    """
+    import doctest
+    from . import benchmarks
+    return doctest.testmod(benchmarks)
+
+if __name__ == '__main__':
+    run_all()
@@ -6,7 +6,8 @@
 A key-value-pair file uses a single, all-lowercase, alphanumeric key name on
 each line, followed by an "=" sign, and the value.  The value may be in optional
 quotation marks.  If it is within braces {}, it is considered a list, and list
-items are each followed by a comma ",".
+items are each followed by a comma ",".  Quoted values may contain "=" signs or
+commas, and a backslash escapes a quote (or another backslash).
 
 Extremely old incarnations of this file format, specifically the saved files of
 NCSA Telnet 2.6, required an exact set of keys in a very specific order.  This
@@ -23,9 +24,30 @@ __author__ = 'Kevin Grant <kmg@mac.com>'
 __date__ = '13 April 2009'
 __version__ = '4.0.0'
 
+import itertools
+import re
+
+# see Parser._unquote(); a string in quotes, possibly with escapes
+_QUOTED_STRING = re.compile(r'''(?:"((?:[^"\\]|\\.)*)"
+                                |'((?:[^'\\]|\\.)*)')\Z''', re.S | re.X)
+_ESCAPE = re.compile(r'''\\([\\"'])''')
+
+# see Parser._parse_list_value(); only used when simply splitting a
+# list at every comma would be wrong (e.g. a comma is in quotes)
+_LIST_ITEM = re.compile(r'''((?:"(?:[^"\\]|\\.)*"
+                              |'(?:[^'\\]|\\.)*'
+                              |[^,])*)(,|\Z)''', re.S | re.X)
+
+# see Parser._parse_any_value(); anything that int() would accept (the
+# first character is checked before using the pattern, for speed)
+_INTEGER = re.compile(r'\s*[-+]?\s*\d+\s*\Z')
+_INTEGER_START = frozenset('+-0123456789 \t\n\r\f\v')
+_QUOTES = ('"', "'")
+
 class Parser(object):
     """Read key-value-pair syntax and translate it into Python data.
 
+    iter_pairs -- parse key-value pairs one at a time, while reading
     results -- retrieve key-value pairs as a dictionary
 
     """
@@ -46,14 +68,23 @@ class Parser(object):
         >>> print('|%s|' %
         ...       str(Parser._parse_any_value('   "  six seven  "\\n')))
         |  six seven  |
+        >>> print(Parser._parse_any_value(' "-12" '))
+        -12
+        >>> print(Parser._parse_any_value('12 monkeys'))
+        12 monkeys
 
         """
         result = value.strip(" \t\n")
-        result = result.strip("\"\'")
-        try:
+        contents = None
+        if result[:1] in _QUOTES:
+            contents = Parser._unquote(result)
+        if contents is None:
+            result = result.strip("\"\'")
+        else:
+            result = contents
+        if result.isdigit() or \
+                (result[:1] in _INTEGER_START and _INTEGER.match(result)):
             result = int(result)
-        except ValueError:
-            pass
         return result
     _parse_any_value = staticmethod(_parse_any_value)
 
@@ -77,14 +108,134 @@ class Parser(object):
         ('this', '  is a list  ', ' of stuff')
         >>> print(Parser._parse_list_value('{1, 2, 3, 4}'))
         (1, 2, 3, 4)
+        >>> print(Parser._parse_list_value('{"a, b", \\'c\\', d}'))
+        ('a, b', 'c', 'd')
+        >>> print(Parser._parse_list_value('{"say \\\\"hi\\\\", ok", it\\'s}'))
+        ('say "hi", ok', "it's")
+        >>> print(Parser._parse_list_value('{}'))
+        ('',)
 
         """
         value = value.lstrip("{")
         value = value.rstrip("}")
-        result = tuple([Parser._parse_any_value(x) for x in value.split(",")])
+        items = value.split(",")
+        if '"' not in value and "'" not in value and '\\' not in value:
+            # common case: nothing is quoted, so avoid function calls
+            try:
+                return tuple(map(int, items))
+            except ValueError:
+                pass
+            items = [x.strip(" \t\n") for x in items]
+            return tuple([(int(x) if (x.isdigit() or
+                                      (x[:1] in _INTEGER_START and
+                                       _INTEGER.match(x))) else x)
+                          for x in items])
+        if '\\' in value or \
+                [x for x in items if (x.count('"') % 2 or x.count("'") % 2)]:
+            # some comma is (or may be) quoted; this is slower
+            items = list()
+            for item, separator in _LIST_ITEM.findall(value):
+                items.append(item)
+                if not separator:
+                    break
+        result = tuple([Parser._parse_any_value(x) for x in items])
         return result
     _parse_list_value = staticmethod(_parse_list_value)
 
+    def _unquote(value):
+        """_unquote(string) -> string or None
+
+        Return the contents of a quoted string, with escapes
+        (backslashes before quotes or backslashes) removed.  If
+        the string is not entirely in quotes, return None.
+
+        (Below are REAL testcases run by doctest!)
+
+        >>> print(Parser._unquote('"a = b, c"'))
+        a = b, c
+        >>> print(Parser._unquote(\'"6\\\\" tall"\'))
+        6" tall
+        >>> print(Parser._unquote(\'"one" "two"\'))
+        None
+        >>> print(Parser._unquote("'unbalanced"))
+        None
+        >>> print(Parser._unquote(\'"C:\\\\dir\\\\\\\\"\'))
+        C:\\dir\\
+
+        """
+        quote = value[:1]
+        if quote in _QUOTES and len(value) > 1 and value[-1] == quote:
+            contents = value[1:-1]
+            if quote not in contents and '\\' not in contents:
+                return contents
+            match = _QUOTED_STRING.match(value)
+            if match is not None:
+                if quote == '"':
+                    contents = match.group(1)
+                else:
+                    contents = match.group(2)
+                return _ESCAPE.sub(r'\1', contents)
+        return None
+    _unquote = staticmethod(_unquote)
+
+    def iter_pairs(lines):
+        """iter_pairs(lines) -> iterator
+
+        Return a generator that parses each line of the given
+        iterable (such as an open file) only when it is needed,
+        and yields (key, value) tuples in file order.  Since no
+        lines are kept, memory use does not grow with the size
+        of the file.  Values are converted in the same way as the
+        results() of a Parser.  Only the first "=" on each line
+        ends the key, so values may contain "=" signs.
+
+        Raise SyntaxError (when the bad line is reached) on
+        failure.
+
+        (Below are REAL testcases run by doctest!)
+
+        >>> pairs = Parser.iter_pairs(iter([
+        ... 'a = 1\\n',
+        ... 'c = {1,2,3}\\n',
+        ... 'garbage\\n',
+        ... ]))
+        >>> print(next(pairs))
+        ('a', '1')
+        >>> print(next(pairs))
+        ('c', (1, 2, 3))
+        >>> try:
+        ...        next(pairs)
+        ... except SyntaxError as e:
+        ...        print(str(e))
+        session file line 3: expected 'key = value'
+
+        >>> print(list(Parser.iter_pairs(['url = "http://x/?a=1&b=2"'])))
+        [('url', 'http://x/?a=1&b=2')]
+
+        """
+        i = 1
+        for line in lines:
+            key, separator, value = str(line).partition('=')
+            if not separator:
+                raise SyntaxError("session file line %d: expected "
+                                  "'key = value'" % i)
+            key = key.strip()
+            result = value.strip(" \t\n\"\'")
+            if '"' in result or "'" in result or '\\' in result:
+                # only a value with quotes inside requires unquoting
+                value = value.strip(" \t\n")
+                contents = Parser._unquote(value)
+                if contents is None:
+                    result = value.strip(" \t\n\"\'")
+                else:
+                    result = contents.strip(" \t\n")
+            value = result
+            if value[:1] == '{':
+                value = Parser._parse_list_value(value)
+            yield (key, value)
+            i = i + 1
+    iter_pairs = staticmethod(iter_pairs)
+
     def __init__(self, lines=None, file_object=None):
         """Parser(lines) -> Parser
         Parser(file_object) -> Parser
@@ -94,7 +245,7 @@ class Parser(object):
         results() method.
 
         The lines can either be given directly, or from a file
-        (on which readlines() is then invoked).  If both are
+        (which is read one line at a time).  If both are
         defined, then both are processed, and act as if they were
         both part of the same original file (the "lines" array
         acts like the top of the file).
@@ -130,29 +281,15 @@ class Parser(object):
         ...        p = Parser(lines=['this is garbage input'])
         ... except SyntaxError as e:
         ...        print(str(e))
-        session file line 1: need more than 1 value to unpack
+        session file line 1: expected 'key = value'
 
         """
-        self._definitions = dict()
+        sources = list()
         if lines is not None:
-            lines = lines[:]
-        else:
-            lines = list()
+            sources.append(lines)
         if file_object is not None:
-            lines.extend(file_object.readlines())
-        i = 1
-        for line in lines:
-            try:
-                key, value = str(line).split('=')
-                key = key.strip()
-                value = value.strip(" \t\n\"\'")
-                if len(value) > 0:
-                    if value[0] == '{':
-                        value = Parser._parse_list_value(value)
-            except ValueError as _:
-                raise SyntaxError("session file line %d: %s" % (i, str(_)))
-            self._definitions[key] = value
-            i = i + 1
+            sources.append(file_object)
+        self._definitions = dict(Parser.iter_pairs(itertools.chain(*sources)))
 
     def results(self):
         """results() -> dict
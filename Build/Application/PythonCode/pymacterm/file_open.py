@@ -3,10 +3,23 @@
 
 """Routines to open various types of files.
 
+check_script -- make sure that a file can be run, and return its interpreter
+clear_file_cache -- forget all files that read_kvp_file() has parsed
+file_cache_stats -- return hit and miss counts for the read_kvp_file() cache
+handler_for -- return the function that open_file() would use for a file
+install_handlers -- register all file handlers with Quills in one batch
+invalidate_file -- forget the parsed contents of one file
 macros -- set current macro set according to a ".macros" key-value-pair file
+open_file -- open any file using the handler for its extension or contents
 prefs -- import preferences stored in a standard XML property list
+prefs_async -- like prefs(), but in steps that do not stop the user interface
+read_kvp_file -- parse a key-value-pair file, or reuse results if unchanged
+register_handlers -- choose functions to open files by extension or contents
 script -- run any executable file as a Session
 session -- start a Session according to a ".session" key-value-pair file
+sessions -- start Sessions for many ".session" files, parsing them in parallel
+set_compiled_file_dir -- choose where read_kvp_file() saves compiled files
+set_file_cache_capacity -- change how many files read_kvp_file() remembers
 
 """
 from __future__ import absolute_import
@@ -17,23 +30,632 @@ __author__ = 'Kevin Grant <kmg@mac.com>'
 __date__ = '1 January 2008'
 __version__ = '4.0.0'
 
+import hashlib
+import itertools
+import marshal
+from multiprocessing.pool import ThreadPool
+import os
+import re
+import stat
+import tempfile
+import threading
+
 from . import file_kvp
+from . import prefs_import
+from . import shell_words
 # note: Quills is a compiled module, library path must be set properly
 import quills
 
+from .utilities import \
+    LRUCache, \
+    sort_dict as _sort_dict
+
+# see read_kvp_file(); launchers tend to open the same few files
+# repeatedly, so their parsed contents are kept (keyed by the real
+# path, modification time and size, so that changes are noticed)
+_file_cache = LRUCache(capacity=16)
+
+# see set_compiled_file_dir(); if set, read_kvp_file() saves parsed
+# results in this directory in "marshal" format, which is much faster
+# to load in a new process than parsing the original text; the key
+# must change whenever the format or the parser's results change
+_compiled_dir = None
+_COMPILED_KEY = ('compiled-kvp-file', 1)
+
+# see macros(); a macro key is letters and a number, such as "f1" or "m0"
+_MACRO_KEY = re.compile(r'([A-Za-z]+)([0-9]+)\Z')
+
+# see macros(); the macro set that was most recently made current, the
+# (name, contents) of each of its macros by index, and the file that it
+# came from (by real path), so that opening a modified file only has to
+# change macros that are different; changed only with the lock held
+_macro_set = None
+_macro_defs = dict()
+_macro_source = None
+_macro_lock = threading.Lock()
+
+# see register_handlers(); the function for each file name extension
+# (in lowercase, without a dot), for each interpreter in a "#!" line
+# (by the name of the program, such as "bash"), and for each "magic"
+# prefix (indexed by length, so any prefix is found with one lookup
+# per distinct length); see the end of this module for the defaults
+_handlers_by_extension = dict()
+_handlers_by_interpreter = dict()
+_handlers_by_magic = dict()
+
+# see handler_for(); the most bytes read from a file to find a "#!"
+# line or "magic" prefix (longer interpreter paths are ignored)
+_SNIFF_SIZE = 512
+
+# see check_script(); results for recently-checked files, keyed by the
+# device, inode, modification and status-change times (the latter is
+# needed to notice "chmod") and size, so that a script that is run
+# repeatedly is only read once; each value is an (interpreter, error,
+# program, signature) tuple where the first two are never both set, and
+# the last two identify the "#!" program (if any) when it was checked
+_script_cache = LRUCache(capacity=64)
+
+# see check_script(); the first bytes of native executables (Mach-O,
+# universal and ELF), which do not need a "#!" line
+_EXECUTABLE_MAGIC = (b'\xfe\xed\xfa\xce', b'\xfe\xed\xfa\xcf',
+                     b'\xce\xfa\xed\xfe', b'\xcf\xfa\xed\xfe',
+                     b'\xca\xfe\xba\xbe', b'\x7fELF')
+
+def _file_key(pathname, stat_result):
+    """_file_key(pathname, stat_result) -> tuple
+
+    Return the key that identifies a particular version of the
+    file with the given resolved path and os.stat() results.
+    Nanosecond modification times are used when available.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> st = os.stat('.')
+    >>> _file_key('/x', st)[0] == '/x'
+    True
+    >>> _file_key('/x', st)[2] == st.st_size
+    True
+
+    """
+    mtime = getattr(stat_result, 'st_mtime_ns', None)
+    if mtime is None:
+        mtime = stat_result.st_mtime
+    return (pathname, mtime, stat_result.st_size)
+
+def _compiled_pathname(realpath):
+    """_compiled_pathname(realpath) -> string
+
+    Return the pathname in the directory of compiled files for
+    the given resolved path of a key-value-pair file, or None
+    if there is no such directory.  Names are unique for each
+    source file, and of a predictable length.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> print(_compiled_pathname('/x/y.session'))
+    None
+
+    """
+    result = None
+    if _compiled_dir is not None:
+        if isinstance(realpath, unicode):
+            realpath = realpath.encode('utf-8')
+        digest = hashlib.sha1(realpath).hexdigest()
+        result = os.path.join(_compiled_dir, "%s.kvpc" % digest)
+    return result
+
+def _check_script_uncached(pathname, stat_result):
+    """_check_script_uncached(pathname, stat_result) -> tuple
+
+    Implementation of check_script(), which does not use the
+    cache; return an (interpreter, error, program) tuple, where
+    the program is the file named in the "#!" line (whether or
+    not it can be run), or None.  Paths are byte strings (the
+    "#!" line is not decoded).
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> source_dir = tempfile.mkdtemp()
+    >>> pathname = os.path.join(source_dir, 'x.sh')
+    >>> with open(pathname, 'wb') as ofh:
+    ...     ofh.write(b'#!/no/such/\\xc3\\xa9t\\xc3\\xa9/sh\\n')
+    >>> os.chmod(pathname, 0o755)
+    >>> (interpreter, error, program) = _check_script_uncached(
+    ...     pathname.decode('utf-8'), os.stat(pathname))
+    >>> (interpreter, program)
+    (None, '/no/such/\\xc3\\xa9t\\xc3\\xa9/sh')
+    >>> print(error.replace(source_dir, 'D'))
+    script interpreter "/no/such/été/sh" cannot be run: D/x.sh
+    >>> import shutil
+    >>> shutil.rmtree(source_dir)
+
+    """
+    if isinstance(pathname, unicode):
+        pathname = pathname.encode('utf-8')
+    if not stat.S_ISREG(stat_result.st_mode):
+        return (None, "not a regular file: %s" % pathname, None)
+    if not (stat_result.st_mode & 0o111) or not os.access(pathname, os.X_OK):
+        return (None, "script is not executable (try \"chmod +x\"): %s" %
+                      pathname, None)
+    try:
+        with open(pathname, 'rb') as ifh:
+            head = ifh.read(_SNIFF_SIZE)
+    except EnvironmentError as _:
+        return (None, "unable to read script: %s (%s)" %
+                      (pathname, _.strerror), None)
+    if not head.startswith(b'#!'):
+        # native programs need no interpreter, and other files
+        # are run by the shell (as "execvp()" does)
+        return (None, None, None)
+    first_line = head.split(b'\n', 1)[0]
+    if len(first_line) == len(head) == _SNIFF_SIZE:
+        return (None, "script \"#!\" line is too long: %s" % pathname,
+                None)
+    words = first_line[2:].split()
+    if not words:
+        return (None, "script \"#!\" line has no interpreter: %s" % pathname,
+                None)
+    interpreter = words[0]
+    if not os.access(interpreter, os.X_OK) or os.path.isdir(interpreter):
+        return (None, "script interpreter \"%s\" cannot be run: %s" %
+                      (interpreter, pathname), interpreter)
+    return (interpreter, None, interpreter)
+
+def _interpreter_name(first_line):
+    """_interpreter_name(first_line) -> str
+
+    Return the program name from the given "#!" line (as a
+    byte string), skipping "env" (and its options) if present,
+    or None if the line does not start with "#!" or names no
+    program.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> _interpreter_name(b'#!/bin/bash -e')
+    'bash'
+    >>> _interpreter_name(b'#! /usr/bin/env -S python3 -u')
+    'python3'
+    >>> _interpreter_name(b'#!/opt/\\xc3\\xa9/bin/p\\xc3\\xbfthon')
+    'p\\xc3\\xbfthon'
+    >>> _interpreter_name(b'#!') is None
+    True
+    >>> _interpreter_name(b'echo') is None
+    True
+
+    """
+    if not first_line.startswith(b'#!'):
+        return None
+    words = first_line[2:].split()
+    if words and os.path.basename(words[0]) == b'env':
+        words = [x for x in words[1:] if not x.startswith(b'-')]
+    if not words:
+        return None
+    return os.path.basename(words[0])
+
+def _interpreter_signature(program):
+    """_interpreter_signature(program) -> tuple
+
+    Return a tuple that changes if the given file is created,
+    replaced, changed or has new permissions, or None if it
+    does not exist.  See check_script().
+
+    """
+    try:
+        st = os.stat(program)
+    except OSError as _:
+        return None
+    return (st.st_dev, st.st_ino, st.st_mode, st.st_uid, st.st_gid,
+            st.st_mtime, st.st_ctime)
+
+def _load_compiled_file(pathname, file_key):
+    """_load_compiled_file(pathname, file_key) -> dict
+
+    Return the parsed results saved by _save_compiled_file(),
+    or None if the file does not exist, cannot be read, or was
+    not saved for the given version of its source file (as
+    returned by _file_key()) in the current format.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> (fd, path) = tempfile.mkstemp()
+    >>> os.close(fd)
+    >>> print(_load_compiled_file(path, ('/x', 1, 2)))
+    None
+    >>> _save_compiled_file(path, ('/x', 1, 2), {'a': (1, '2')})
+    >>> print(_load_compiled_file(path, ('/x', 1, 2)))
+    {'a': (1, '2')}
+    >>> print(_load_compiled_file(path, ('/x', 1, 3)))
+    None
+    >>> os.unlink(path)
+
+    """
+    result = None
+    try:
+        with open(pathname, 'rb') as ifh:
+            (key, source_key, defs) = marshal.load(ifh)
+        if key == _COMPILED_KEY and source_key == file_key and \
+                isinstance(defs, dict):
+            result = defs
+    except (EnvironmentError, EOFError, ValueError, TypeError) as _:
+        pass
+    return result
+
+def _macro_definitions(defs):
+    """_macro_definitions(defs) -> dict
+
+    Return a dictionary that maps the one-based index of each
+    macro to a tuple of its name and contents, given the
+    results of parsing a ".macros" file.  Keys that do not
+    look like macro keys are ignored.  Keys starting with "f"
+    (for function keys) are already one-based; others, such as
+    "m0", are zero-based.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> d = _macro_definitions({'f1': 'a', 'f11': 'b', 'm2': 'c',
+    ...                         'encoding': 'UTF-8', 'f': 'd'})
+    >>> for index in sorted(d):
+    ...     print(index, d[index])
+    1 ('Macro 1', 'a')
+    3 ('Macro 3', 'c')
+    11 ('Macro 11', 'b')
+
+    """
+    result = dict()
+    for key in sorted(defs):
+        match = _MACRO_KEY.match(key)
+        if match is None:
+            continue
+        (letters, number) = match.groups()
+        index = int(number)
+        # need a one-based index, files normally start with 0 (except F1...)
+        if letters != "f" and letters != "F":
+            index += 1
+        result[index] = ("Macro %i" % index, defs[key])
+    return result
+
+def _register(mapping, key, handler):
+    """_register(mapping, key, handler) -> None
+
+    Set or (if the handler is None) remove a handler.
+
+    """
+    if handler is None:
+        mapping.pop(key, None)
+    else:
+        mapping[key] = handler
+
+def _save_compiled_file(pathname, file_key, defs):
+    """_save_compiled_file(pathname, file_key, defs) -> None
+
+    Write the given parsed results of the given version of a
+    source file (as returned by _file_key()) in a form that is
+    quickly loaded by _load_compiled_file().  The file is
+    replaced atomically, so that other processes never see an
+    incomplete file.  Errors are printed, not raised.
+
+    """
+    try:
+        (fd, temp_pathname) = tempfile.mkstemp(
+            dir=os.path.dirname(pathname), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as ofh:
+                marshal.dump((_COMPILED_KEY, file_key, defs), ofh)
+            os.rename(temp_pathname, pathname)
+        except:
+            os.unlink(temp_pathname)
+            raise
+    except (EnvironmentError, ValueError) as _:
+        print("warning, unable to save compiled file:", _)
+
+def _session_args(defs):
+    """_session_args(defs) -> list
+
+    Return the command line for a Session, given the results
+    of parsing a ".session" file; the command is split into
+    words like a shell would (see shell_words.split()).  Raise
+    KeyError if there is no command information, or ValueError
+    if the command is not a string of at least one word or if
+    its quoting is incomplete.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> _session_args({'command': '/usr/bin/ssh -p 22 example.com'})
+    ['/usr/bin/ssh', '-p', '22', 'example.com']
+
+    >>> _session_args({'command': "/bin/ls -l '/Volumes/Backup Disk'"})
+    ['/bin/ls', '-l', '/Volumes/Backup Disk']
+
+    >>> try:
+    ...     _session_args({'command': ('ls', '-l')})
+    ... except ValueError as e:
+    ...     print(e)
+    "command" must be a nonempty string
+
+    """
+    if 'command' not in defs:
+        raise KeyError('no "command" was found in the file')
+    command = defs['command']
+    if isinstance(command, basestring):
+        result = list(shell_words.split(command))
+        if result:
+            return result
+    raise ValueError('"command" must be a nonempty string')
+
+def check_script(pathname):
+    """check_script(pathname) -> str
+
+    Make sure that the given file can be run by script(), and
+    return the program named in its "#!" line, or None if it
+    has none (for instance, if it is a native executable).
+    Only the first few hundred bytes of the file are read, and
+    only if it (or its interpreter) has changed since it was
+    last checked.
+
+    Raise ValueError with a description of the problem if the
+    file does not exist, is not an executable file, or names
+    an interpreter that cannot be run.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> source_dir = tempfile.mkdtemp()
+    >>> pathname = os.path.join(source_dir, 'x.sh')
+    >>> with open(pathname, 'w') as ofh:
+    ...     ofh.write('#!/bin/sh -e\\necho\\n')
+    >>> try:
+    ...     check_script(pathname)
+    ... except ValueError as e:
+    ...     print(str(e).replace(source_dir, 'D'))
+    script is not executable (try "chmod +x"): D/x.sh
+    >>> os.chmod(pathname, 0o755)
+    >>> check_script(pathname)
+    '/bin/sh'
+    >>> with open(pathname, 'w') as ofh:
+    ...     ofh.write('#!/no/such/shell\\n')
+    >>> os.utime(pathname, (0, 0))
+    >>> try:
+    ...     check_script(pathname)
+    ... except ValueError as e:
+    ...     print(str(e).replace(source_dir, 'D'))
+    script interpreter "/no/such/shell" cannot be run: D/x.sh
+
+    Installing the interpreter fixes the script, without any
+    change to the script itself:
+
+    >>> shell = os.path.join(source_dir, 'shell')
+    >>> with open(pathname, 'w') as ofh:
+    ...     ofh.write('#!%s\\n' % shell)
+    >>> os.utime(pathname, (1, 1))
+    >>> try:
+    ...     check_script(pathname)
+    ... except ValueError as e:
+    ...     print(str(e).replace(source_dir, 'D'))
+    script interpreter "D/shell" cannot be run: D/x.sh
+    >>> os.symlink('/bin/sh', shell)
+    >>> check_script(pathname) == shell
+    True
+    >>> try:
+    ...     check_script(source_dir)
+    ... except ValueError as e:
+    ...     print(str(e).replace(source_dir, 'D'))
+    not a regular file: D
+    >>> import shutil
+    >>> shutil.rmtree(source_dir)
+
+    """
+    try:
+        st = os.stat(pathname)
+    except OSError as _:
+        raise ValueError("unable to find script: %s (%s)" %
+                         (pathname, _.strerror))
+    key = (st.st_dev, st.st_ino, _file_key(pathname, st)[1], st.st_ctime,
+           st.st_size)
+    result = _script_cache.get(key)
+    if result is not None and result[2] is not None and \
+            _interpreter_signature(result[2]) != result[3]:
+        # the interpreter was installed, removed or changed
+        result = None
+    if result is None:
+        result = _check_script_uncached(pathname, st)
+        signature = None
+        if result[2] is not None:
+            signature = _interpreter_signature(result[2])
+        result = result + (signature,)
+        _script_cache.put(key, result)
+    (interpreter, error, ignored_program, ignored_signature) = result
+    if error is not None:
+        raise ValueError(error)
+    return interpreter
+
+def clear_file_cache():
+    """clear_file_cache() -> None
+
+    Forget every file that read_kvp_file() has parsed, and
+    reset the hit and miss counts.
+
+    """
+    _file_cache.clear(reset_stats=True)
+
+def file_cache_stats():
+    """file_cache_stats() -> dict
+
+    Return a dictionary describing the cache of files used by
+    read_kvp_file(), with keys 'hits', 'misses', 'size' (number
+    of file versions now remembered) and 'capacity'.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> import tempfile
+    >>> fd, pathname = tempfile.mkstemp(suffix='.session')
+    >>> os.write(fd, 'command = "/bin/ls -l"\\n')
+    23
+    >>> os.close(fd)
+    >>> clear_file_cache()
+    >>> read_kvp_file(pathname)['command']
+    '/bin/ls -l'
+    >>> read_kvp_file(pathname)['command']
+    '/bin/ls -l'
+    >>> _sort_dict(file_cache_stats())
+    'capacity:16 hits:1 misses:1 size:1'
+    >>> invalidate_file(pathname)
+    >>> _sort_dict(file_cache_stats())
+    'capacity:16 hits:1 misses:1 size:0'
+    >>> os.remove(pathname)
+
+    """
+    return _file_cache.stats()
+
+def handler_for(pathname, sniff=True):
+    """handler_for(pathname, sniff=True) -> function
+
+    Return the function that open_file() would call for the
+    given file, or None if there is no suitable function.
+
+    The file name extension is checked first (ignoring case),
+    without reading the file.  Otherwise, if "sniff" is true
+    and the file can be read, its first few bytes are checked
+    for a "#!" line naming a registered interpreter, and then
+    for a registered "magic" prefix.  Each check is a single
+    dictionary lookup, no matter how many handlers exist.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> handler_for('/tmp/Test.SH') is script
+    True
+    >>> handler_for('/tmp/settings.plist') is prefs
+    True
+    >>> handler_for('/no/such/file') is None
+    True
+
+    >>> source_dir = tempfile.mkdtemp()
+    >>> tool = os.path.join(source_dir, 'tool')
+    >>> with open(tool, 'w') as ofh:
+    ...     ofh.write('#!/usr/bin/env zsh\\necho\\n')
+    >>> handler_for(tool) is script
+    True
+    >>> handler_for(tool, sniff=False) is None
+    True
+    >>> import shutil
+    >>> shutil.rmtree(source_dir)
+
+    """
+    extension = os.path.splitext(pathname)[1]
+    if extension:
+        handler = _handlers_by_extension.get(extension[1:].lower(), None)
+        if handler is not None:
+            return handler
+    if not sniff or not (_handlers_by_interpreter or _handlers_by_magic):
+        return None
+    try:
+        with open(pathname, 'rb') as ifh:
+            head = ifh.read(_SNIFF_SIZE)
+    except EnvironmentError as _:
+        return None
+    if head.startswith(b'#!'):
+        interpreter = _interpreter_name(head.split(b'\n', 1)[0])
+        if interpreter is not None:
+            handler = _handlers_by_interpreter.get(interpreter, None)
+            if handler is not None:
+                return handler
+    for (length, handlers) in _handlers_by_magic.items():
+        handler = handlers.get(head[:length], None)
+        if handler is not None:
+            return handler
+    return None
+
+def install_handlers(register_function=None):
+    """install_handlers(register_function=None) -> int
+
+    Register every file name extension given to
+    register_handlers() so that MacTerm calls open_file() for
+    files of those types; return the number of extensions.
+    The registration function is quills.Session.on_fileopen_call
+    by default.  (Since Quills only finds handlers by extension,
+    "#!" and "magic" rules apply when open_file() is called
+    directly, or for a registered extension with no handler.)
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> calls = list()
+    >>> install_handlers(lambda f, ext: calls.append(ext)) == len(calls)
+    True
+    >>> 'command' in calls and 'xml' in calls
+    True
+
+    """
+    if register_function is None:
+        register_function = quills.Session.on_fileopen_call
+    extensions = sorted(_handlers_by_extension)
+    for extension in extensions:
+        register_function(open_file, extension)
+    return len(extensions)
+
+def invalidate_file(pathname):
+    """invalidate_file(pathname) -> None
+
+    Forget any parsed contents of the given file, so that the
+    next read_kvp_file() will read it again.  This is normally
+    unnecessary, since a file that has a different size or
+    modification time is automatically read again.
+
+    """
+    realpath = os.path.realpath(pathname)
+    for key in _file_cache.keys():
+        if key[0] == realpath:
+            _file_cache.discard(key)
+
 def macros(pathname):
     """macros(pathname) -> None
 
     Load macros from the given ".macros" file, by parsing the
-    file and assuming that the first up to 12 keys have values
-    representing strings to be sent.  (This is a limitation of
-    the original file format, that might be avoidable if a
-    transition to XML is made in the future.)
+    file and assuming that keys such as "f1" or "m0" have values
+    representing strings to be sent.  Macros with indexes that
+    the current macro set cannot hold (currently, above 12) are
+    skipped, with a warning.
     Raise SyntaxError if the file is not formatted properly.
     Raise KeyError if the file is successfully parsed but it has
     no keys that apparently represent macros (macro key names
     should look like "f1", "f2", ... or "m0", "m1", ...).
 
+    The macro set is kept, so that opening the same ".macros"
+    file again (such as after it is updated) only changes macros
+    that are different from those already defined.  Since
+    macros cannot be removed from a set, a new set is made if
+    any macro is removed or becomes empty, or if the file is
+    not the one that the current set came from.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> from pymacterm import file_open, quills_stub
+    >>> file_open.quills = quills_stub # (do not change real macros!)
+    >>> source_dir = tempfile.mkdtemp()
+    >>> (a, b) = [os.path.join(source_dir, x)
+    ...           for x in ('a.macros', 'b.macros')]
+    >>> for (pathname, text) in ((a, 'f1 = "ls"\\nf2 = "pwd"\\n'),
+    ...                          (b, 'f1 = "ls"\\nf2 = "cd"\\n')):
+    ...     with open(pathname, 'w') as ofh:
+    ...         ofh.write(text)
+    >>> macros(a)
+    >>> first_set = quills_stub.Prefs._current_macros
+    >>> with open(a, 'a') as ofh:
+    ...     ofh.write('f3 = "date"\\n')
+    >>> macros(a)
+    >>> quills_stub.Prefs._current_macros is first_set
+    True
+    >>> macros(b)
+    >>> quills_stub.Prefs._current_macros is first_set
+    False
+    >>> sorted(quills_stub.Prefs._current_macros.macros.items())
+    [(1, ('Macro 1', 'ls')), (2, ('Macro 2', 'cd'))]
+    >>> with open(b, 'a') as ofh:
+    ...     ofh.write('f13 = "too far"\\n')
+    >>> macros(b)
+    warning, macro 13 was skipped: macro index is out of range
+    >>> file_open.quills = quills
+    >>> file_open._macro_set = file_open._macro_source = None
+    >>> import shutil
+    >>> shutil.rmtree(source_dir)
+
     WARNING: This routine is incomplete, as the Quills API has
     not advanced far enough to make use of all of the settings
     that could exist in a ".macros" file.
@@ -45,21 +667,42 @@ def macros(pathname):
     is doing both.
 
     """
-    with open(pathname, 'rU') as mfile:
-        parser = file_kvp.Parser(file_object=mfile)
-        defs = parser.results()
-        macro_set = quills.Prefs(quills.Prefs.MACRO_SET)
-        for key in defs:
-            data = defs[key]
-            first_part = key.rstrip('0123456789')
-            second_part = key.replace(first_part, "")
-            number = int(second_part)
-            # need a one-based index, files normally start with 0 (except F1...)
-            if first_part != "f" and first_part != "F":
-                number += 1
-            macro_set.define_macro(number, name="Macro %i" % number,
-                                   contents=data)
-        quills.Prefs.set_current_macros(macro_set)
+    global _macro_set, _macro_defs, _macro_source
+    new_defs = _macro_definitions(read_kvp_file(pathname))
+    if not new_defs:
+        raise KeyError("no macros were found in the file")
+    source = os.path.realpath(pathname)
+    with _macro_lock:
+        changed = [x for x in sorted(new_defs)
+                   if _macro_defs.get(x) != new_defs[x]]
+        if _macro_set is None or source != _macro_source or \
+                [x for x in _macro_defs if x not in new_defs] or \
+                [x for x in changed if not new_defs[x][1]]:
+            _macro_set = quills.Prefs(quills.Prefs.MACRO_SET)
+            _macro_defs = dict()
+            _macro_source = source
+            changed = sorted(new_defs)
+        for index in changed:
+            (name, contents) = new_defs[index]
+            try:
+                _macro_set.define_macro(index, name=name, contents=contents)
+            except ValueError as _:
+                print("warning, macro %d was skipped: %s" % (index, _))
+                continue
+            _macro_defs[index] = new_defs[index]
+        quills.Prefs.set_current_macros(_macro_set)
+
+def open_file(pathname):
+    """open_file(pathname) -> None
+
+    Open the given file by calling the function that
+    handler_for() returns.  Raise ValueError if there is none.
+
+    """
+    handler = handler_for(pathname)
+    if handler is None:
+        raise ValueError("no handler for file: %s" % pathname)
+    handler(pathname)
 
 def prefs(pathname):
     """prefs(pathname) -> None
@@ -71,13 +714,167 @@ def prefs(pathname):
     """
     quills.Prefs.import_from_file(pathname, allow_rename=True)
 
+def prefs_async(pathname):
+    """prefs_async(pathname) -> prefs_import.Import
+
+    Like prefs(), but parse the file on a background thread
+    and import its collections a few at a time on the main
+    thread (see the "prefs_import" module), so that a large
+    file of many collections does not stop the user interface.
+    This must be called on the main thread.
+
+    This is not used by default: for a file with one collection
+    (as MacTerm exports), it only adds work.  It may be given to
+    register_handlers() for files that are known to be large.
+
+    A failure is reported to the user as an error, in the same
+    way as an exception from prefs() (but only once it happens,
+    since this returns right away).
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> from pymacterm import file_open, prefs_import, quills_stub
+    >>> file_open.quills = prefs_import.quills = quills_stub
+    >>> job = prefs_async('/no/such/file.plist')
+    >>> try:
+    ...     quills_stub.Events.run_loop()
+    ... except ValueError as e:
+    ...     print(str(e).partition(': ')[0])
+    unable to import preferences from "/no/such/file.plist"
+    >>> del quills_stub.Events.pending[:]
+    >>> file_open.quills = prefs_import.quills = quills
+
+    """
+    def report(job):
+        if job.error is not None:
+            def fail():
+                raise ValueError("unable to import preferences from \"%s\": "
+                                 "%s" % (pathname, job.error))
+            # (the error appears as if raised by a file handler)
+            quills.Events.call_soon(fail)
+    return prefs_import.import_file(pathname, progress=report)
+
+def read_kvp_file(pathname):
+    """read_kvp_file(pathname) -> dict
+
+    Return a new dictionary with the results() of parsing the
+    given key-value-pair file with a file_kvp.Parser.  If the
+    same file was parsed recently, and it still has the same
+    resolved path, modification time and size, the previous
+    results are reused without reading the file at all.
+
+    Otherwise, if set_compiled_file_dir() was used, a compiled
+    version of the file is loaded if it was saved for the same
+    version of the file; else, the file is parsed and then
+    saved in compiled form for next time.
+
+    Raise SyntaxError if the file is not formatted properly.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> source_dir = tempfile.mkdtemp()
+    >>> pathname = os.path.join(source_dir, 'x.session')
+    >>> with open(pathname, 'w') as ofh:
+    ...     ofh.write('command = "/bin/ls -l"\\n')
+    >>> set_compiled_file_dir(os.path.join(source_dir, 'compiled'))
+    >>> read_kvp_file(pathname)['command']
+    '/bin/ls -l'
+    >>> os.path.exists(_compiled_pathname(os.path.realpath(pathname)))
+    True
+    >>> clear_file_cache()
+    >>> read_kvp_file(pathname)['command']
+    '/bin/ls -l'
+    >>> set_compiled_file_dir(None)
+    >>> import shutil
+    >>> shutil.rmtree(source_dir)
+
+    """
+    realpath = os.path.realpath(pathname)
+    key = _file_key(realpath, os.stat(realpath))
+    defs = _file_cache.get(key)
+    if defs is None:
+        compiled_pathname = _compiled_pathname(realpath)
+        if compiled_pathname is not None:
+            defs = _load_compiled_file(compiled_pathname, key)
+        if defs is None:
+            with open(realpath, 'rU') as ifh:
+                # the key is found again, in case the file just changed
+                key = _file_key(realpath, os.fstat(ifh.fileno()))
+                parser = file_kvp.Parser(file_object=ifh)
+                defs = parser.results()
+            if compiled_pathname is not None:
+                _save_compiled_file(compiled_pathname, key, defs)
+        _file_cache.put(key, defs)
+    return dict(defs)
+
+def register_handlers(extensions=None, interpreters=None, magic=None):
+    """register_handlers(extensions=None, interpreters=None,
+                         magic=None) -> None
+
+    Choose the functions that open_file() uses, given any of:
+    a dictionary mapping file name extensions (without dots)
+    to functions; a dictionary mapping program names that may
+    appear in "#!" lines (such as "perl") to functions; and a
+    dictionary mapping byte strings that start files to
+    functions.  Each function is given a pathname.  A function
+    of None removes any previous handler.  Nothing changes
+    unless every given handler is valid.
+
+    To add handlers from a "customize_macterm" module, call
+    this before MacTerm calls install_handlers().
+
+    Raise ValueError if a handler cannot be called, or if a
+    key is empty.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> opened = list()
+    >>> register_handlers(extensions={'Note': opened.append},
+    ...                   magic={b'%PDF': opened.append})
+    >>> handler_for('/tmp/a.note') == opened.append
+    True
+    >>> register_handlers(extensions={'note': None}, magic={b'%PDF': None})
+    >>> handler_for('/tmp/a.note') is None
+    True
+
+    >>> try:
+    ...     register_handlers(interpreters={'ruby': 'not a function'})
+    ... except ValueError as e:
+    ...     print(e)
+    file handler for 'ruby' is not callable
+
+    """
+    extensions = dict(extensions or ())
+    interpreters = dict(interpreters or ())
+    magic = dict(magic or ())
+    for (key, handler) in itertools.chain(extensions.items(),
+                                          interpreters.items(),
+                                          magic.items()):
+        if not key:
+            raise ValueError("file handler key must not be empty")
+        if handler is not None and not callable(handler):
+            raise ValueError("file handler for %r is not callable" % (key,))
+    for (extension, handler) in extensions.items():
+        _register(_handlers_by_extension, extension.lstrip('.').lower(),
+                  handler)
+    for (interpreter, handler) in interpreters.items():
+        _register(_handlers_by_interpreter, interpreter, handler)
+    for (prefix, handler) in magic.items():
+        by_prefix = _handlers_by_magic.setdefault(len(prefix), dict())
+        _register(by_prefix, prefix, handler)
+        if not by_prefix:
+            del _handlers_by_magic[len(prefix)]
+
 def script(pathname):
     """script(pathname) -> None
 
     Asynchronously open a session from the given script file, by
-    running the script!  Raise an exception on failure.
+    running the script!  Raise ValueError right away if the
+    script cannot be run (see check_script()), or some other
+    exception on failure.
 
     """
+    check_script(pathname)
     args = [pathname]
     ignored_session = quills.Session(args)
 
@@ -97,14 +894,125 @@ def session(pathname):
     that could exist in a ".session" file.
 
     """
-    with open(pathname, 'rU') as ifh:
-        parser = file_kvp.Parser(file_object=ifh)
-        defs = parser.results()
-        if 'command' in defs:
-            args = defs['command'].split()
-            ignored_session = quills.Session(args)
-        else:
-            raise KeyError('no "command" was found in the file')
+    args = _session_args(read_kvp_file(pathname))
+    ignored_session = quills.Session(args)
+
+def sessions(pathnames, thread_count=8):
+    """sessions(pathnames, thread_count=8) -> dict
+
+    Like session(), but for any number of ".session" files at
+    once (such as when restoring a workspace).  The files are
+    read, parsed and checked on up to the given number of
+    threads, while a Session is created for each valid file
+    (in the given order, on the calling thread) as soon as
+    that file is ready.
+
+    A problem with one file does not prevent other Sessions
+    from being created; instead, return a dictionary that maps
+    the pathname of each file that could not be opened to the
+    exception that session() would have raised for it.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> source_dir = tempfile.mkdtemp()
+    >>> good = os.path.join(source_dir, 'good.session')
+    >>> bad = os.path.join(source_dir, 'bad.session')
+    >>> with open(good, 'w') as ofh:
+    ...     ofh.write('command = "/bin/ls -l"\\n')
+    >>> with open(bad, 'w') as ofh:
+    ...     ofh.write('title = "no command"\\n')
+    >>> errors = sessions([good, bad, os.path.join(source_dir, 'none')])
+    >>> sorted([os.path.basename(x) for x in errors])
+    ['bad.session', 'none']
+    >>> type(errors[bad]).__name__
+    'KeyError'
+    >>> import shutil
+    >>> shutil.rmtree(source_dir)
+
+    """
+    def parse(pathname):
+        try:
+            return (_session_args(read_kvp_file(pathname)), None)
+        except Exception as _:
+            return (None, _)
+    pathnames = list(pathnames)
+    pool = None
+    if len(pathnames) > 1 and thread_count > 1:
+        pool = ThreadPool(min(thread_count, len(pathnames)))
+        parsed = pool.imap(parse, pathnames)
+    else:
+        parsed = (parse(x) for x in pathnames)
+    result = dict()
+    try:
+        for (i, (args, error)) in enumerate(parsed):
+            pathname = pathnames[i]
+            if error is None:
+                try:
+                    ignored_session = quills.Session(args)
+                except Exception as _:
+                    error = _
+            if error is not None:
+                result[pathname] = error
+    finally:
+        if pool is not None:
+            # threads exit on their own; join() can wait much longer
+            # than the parsing (for the pool's internal polling)
+            pool.close()
+    return result
+
+def set_compiled_file_dir(pathname):
+    """set_compiled_file_dir(pathname) -> None
+
+    Change the directory where read_kvp_file() saves compiled
+    versions of the files that it parses, creating it (with
+    access only for the current user) if necessary.  Each
+    compiled file is named after a hash of the path of its
+    source file.  If the pathname is None, compiled files are
+    neither saved nor loaded (the default).
+
+    """
+    global _compiled_dir
+    if pathname is not None:
+        pathname = os.path.abspath(pathname)
+        if not os.path.isdir(pathname):
+            os.makedirs(pathname, 0o700)
+    _compiled_dir = pathname
+
+def set_file_cache_capacity(file_count):
+    """set_file_cache_capacity(file_count) -> None
+
+    Change the maximum number of files whose parsed contents
+    read_kvp_file() will remember.  Raise ValueError if the
+    count is less than 1.
+
+    """
+    _file_cache.set_capacity(file_count)
+
+# the file types that MacTerm opens by default
+register_handlers(extensions={
+    'bash': script,
+    'command': script,
+    'csh': script,
+    'pl': script,
+    'plist': prefs,
+    'py': script,
+    'sh': script,
+    'tcl': script,
+    'tcsh': script,
+    'tool': script,
+    'xml': prefs,
+    'zsh': script,
+}, interpreters={
+    'bash': script,
+    'csh': script,
+    'perl': script,
+    'python': script,
+    'python3': script,
+    'sh': script,
+    'tclsh': script,
+    'tcsh': script,
+    'zsh': script,
+})
 
 def _test():
     """Runs all of this module's "doctest" test cases.
@@ -0,0 +1,1009 @@
+#!/usr/bin/python
+# vim: set fileencoding=UTF-8 :
+
+"""Routines to notice when files change, and reload them automatically.
+
+A Watcher checks for notifications from a "backend", and then calls a
+function for each watched file that really changed (according to its size,
+modification time and inode).  Since editors often save a file with several
+writes, or by replacing it, a function is only called once writes have
+stopped for a short time.
+
+Quills does not release the interpreter lock while events are handled (see
+also the "host_cache" module), so inside MacTerm a background thread only
+runs while some other Python code happens to run on the main thread; while
+the application is idle, changes would not be noticed at all.  The Watcher
+used by watch_macros() and watch_session() is therefore driven by the main
+event loop: Watcher.schedule() checks the backend without waiting, twice a
+second, using Events.call_after().  Watcher.start() uses a background thread
+instead, which is only useful outside MacTerm.
+
+Backends watch the directories that contain the files, so that files are
+still watched after they are replaced.  InotifyBackend (Linux) and
+KqueueBackend (macOS and BSD) use no CPU at all while nothing changes.
+PollingBackend works anywhere, and limits how many files it checks per
+second no matter how many are watched.
+
+InotifyBackend -- wait for changes using Linux "inotify"
+KqueueBackend -- wait for changes using BSD "kqueue"
+PollingBackend -- periodically check some of the watched files
+Watcher -- call functions when watched files change
+default_backend -- return the best backend for this system
+stop_watching -- stop watching all files given to watch_macros/session()
+watch_macros -- reload a ".macros" file whenever it changes
+watch_session -- parse a ".session" file again whenever it changes
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__author__ = 'Kevin Grant <kmg@mac.com>'
+__date__ = '18 October 2026'
+__version__ = '4.0.0'
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+# note: Quills is a compiled module, library path must be set properly
+import quills
+
+# see InotifyBackend; these are from <sys/inotify.h>
+_IN_MODIFY = 0x00000002
+_IN_ATTRIB = 0x00000004
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ONLYDIR = 0x01000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_IN_DIR_MASK = (_IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM |
+                _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_ONLYDIR)
+_IN_EVENT_HEADER = struct.Struct('iIII')
+
+# see KqueueBackend; on macOS, O_EVTONLY opens a file only for events (and
+# does not prevent a volume from being ejected)
+_O_EVTONLY = 0x8000 if sys.platform == 'darwin' else os.O_RDONLY
+
+# see watch_macros() and watch_session()
+_shared_watcher = None
+_shared_watcher_lock = threading.Lock()
+
+def _drain(fd):
+    """_drain(fd) -> None
+
+    Read and discard everything available from a nonblocking
+    descriptor.
+
+    """
+    try:
+        while os.read(fd, 4096):
+            pass
+    except OSError as _:
+        if _.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+            raise
+
+def _file_signature(pathname):
+    """_file_signature(pathname) -> tuple
+
+    Return a value that changes whenever the given file is
+    modified or replaced, or None if the file does not exist.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> _file_signature('/no/such/file') is None
+    True
+    >>> _file_signature('.') == _file_signature('.')
+    True
+
+    """
+    try:
+        st = os.stat(pathname)
+    except OSError as _:
+        return None
+    mtime = getattr(st, 'st_mtime_ns', None)
+    if mtime is None:
+        mtime = st.st_mtime
+    return (mtime, st.st_size, st.st_ino, st.st_dev)
+
+def _make_wake_pipe():
+    """_make_wake_pipe() -> tuple
+
+    Return the read and write descriptors of a nonblocking pipe
+    that a backend can wait on, so that wake() can interrupt its
+    wait() from another thread.
+
+    """
+    import fcntl
+    (read_fd, write_fd) = os.pipe()
+    for fd in (read_fd, write_fd):
+        flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+        fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+        flags = fcntl.fcntl(fd, fcntl.F_GETFD)
+        fcntl.fcntl(fd, fcntl.F_SETFD, flags | fcntl.FD_CLOEXEC)
+    return (read_fd, write_fd)
+
+def _print_exception(description, pathname, exc):
+    """_print_exception(description, pathname, exc) -> None
+
+    Describe a problem on the standard error stream, since
+    there is nothing else to report it to from a background
+    thread.
+
+    """
+    print("MacTerm: warning, %s \"%s\":" % (description, pathname), exc,
+          file=sys.stderr)
+
+class _DirectoryBackend(object):
+    """Base for backends that watch the directories of files;
+    it keeps track of which files are watched in which
+    directories.  Subclasses must implement _add_dir(),
+    _remove_dir() and wait(), and usually close() and wake().
+
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._files_by_dir = dict()
+
+    def _add_dir(self, dir_pathname):
+        raise NotImplementedError
+
+    def _remove_dir(self, dir_pathname):
+        raise NotImplementedError
+
+    def _files_in(self, dir_pathname):
+        """Return a list of the watched files in a directory.
+        """
+        with self._lock:
+            return list(self._files_by_dir.get(dir_pathname, ()))
+
+    def _all_files(self):
+        """Return a list of all watched files.
+        """
+        result = list()
+        with self._lock:
+            for files in self._files_by_dir.values():
+                result.extend(files)
+        return result
+
+    def add(self, pathname):
+        """add(pathname) -> None
+
+        Start watching the given file (which must be a resolved
+        path).  Raise EnvironmentError if its directory cannot
+        be watched.
+
+        """
+        dir_pathname = os.path.dirname(pathname)
+        with self._lock:
+            files = self._files_by_dir.get(dir_pathname, None)
+            if files is None:
+                self._add_dir(dir_pathname)
+                files = self._files_by_dir[dir_pathname] = set()
+            files.add(pathname)
+
+    def close(self):
+        """close() -> None
+
+        Stop watching all files, and release any resources.
+
+        """
+        with self._lock:
+            for dir_pathname in list(self._files_by_dir):
+                self._remove_dir(dir_pathname)
+            self._files_by_dir.clear()
+
+    def remove(self, pathname):
+        """remove(pathname) -> None
+
+        Stop watching the given file, if it is watched.
+
+        """
+        dir_pathname = os.path.dirname(pathname)
+        with self._lock:
+            files = self._files_by_dir.get(dir_pathname, None)
+            if files is not None and pathname in files:
+                files.discard(pathname)
+                if not files:
+                    del self._files_by_dir[dir_pathname]
+                    self._remove_dir(dir_pathname)
+
+    def wake(self):
+        """wake() -> None
+
+        Make any wait() in progress return immediately.
+
+        """
+        pass
+
+class InotifyBackend(_DirectoryBackend):
+    """Wait for changes to files using the Linux "inotify"
+    facility, watching the directory of each file.  Raise
+    EnvironmentError when created if "inotify" is unavailable.
+
+    add -- start watching a file
+    close -- stop watching all files
+    remove -- stop watching a file
+    wait -- return files that might have changed
+    wake -- interrupt a wait() from another thread
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> import tempfile
+    >>> d = os.path.realpath(tempfile.mkdtemp())
+    >>> p = os.path.join(d, 'x.session')
+    >>> try:
+    ...     b = InotifyBackend()
+    ... except EnvironmentError:
+    ...     b = None # (not Linux; nothing to test)
+    >>> if b is not None:
+    ...     b.add(p)
+    ...     b.wait(0) == []
+    ... else: True
+    True
+    >>> with open(p, 'w') as ofh:
+    ...     ofh.write('command = ls\\n')
+    >>> if b is not None:
+    ...     p in b.wait(1)
+    ... else: True
+    True
+    >>> if b is not None:
+    ...     b.close()
+    >>> os.remove(p); os.rmdir(d)
+
+    """
+
+    def __init__(self):
+        _DirectoryBackend.__init__(self)
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6',
+                               use_errno=True)
+            self._add_watch = libc.inotify_add_watch
+            self._rm_watch = libc.inotify_rm_watch
+            fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        except (OSError, AttributeError) as _:
+            raise EnvironmentError(errno.ENOSYS, "inotify is unavailable")
+        if fd < 0:
+            code = ctypes.get_errno()
+            raise EnvironmentError(code, os.strerror(code))
+        self._fd = fd
+        self._dirs_by_wd = dict()
+        self._wds_by_dir = dict()
+        (self._wake_read, self._wake_write) = _make_wake_pipe()
+
+    def _add_dir(self, dir_pathname):
+        encoded = dir_pathname
+        if isinstance(encoded, unicode):
+            encoded = encoded.encode(sys.getfilesystemencoding() or 'utf-8')
+        wd = self._add_watch(self._fd, encoded, _IN_DIR_MASK)
+        if wd < 0:
+            code = ctypes.get_errno()
+            raise EnvironmentError(code, os.strerror(code), dir_pathname)
+        self._dirs_by_wd[wd] = dir_pathname
+        self._wds_by_dir[dir_pathname] = wd
+
+    def _remove_dir(self, dir_pathname):
+        wd = self._wds_by_dir.pop(dir_pathname, None)
+        if wd is not None:
+            del self._dirs_by_wd[wd]
+            self._rm_watch(self._fd, wd)
+
+    def close(self):
+        """close() -> None
+
+        Stop watching all files, and release any resources.
+
+        """
+        _DirectoryBackend.close(self)
+        for fd in (self._fd, self._wake_read, self._wake_write):
+            os.close(fd)
+
+    def wait(self, timeout=None):
+        """wait(timeout=None) -> list
+
+        Return the watched files that might have changed, after
+        waiting up to the given number of seconds (forever, if
+        None) for something to happen.
+
+        """
+        (ready, ignored, ignored) = select.select([self._fd, self._wake_read],
+                                                  [], [], timeout)
+        if self._wake_read in ready:
+            _drain(self._wake_read)
+        if self._fd not in ready:
+            return list()
+        data = list()
+        try:
+            while True:
+                chunk = os.read(self._fd, 65536)
+                if not chunk:
+                    break
+                data.append(chunk)
+        except OSError as _:
+            if _.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                raise
+        data = b"".join(data)
+        result = set()
+        offset = 0
+        header_size = _IN_EVENT_HEADER.size
+        while offset + header_size <= len(data):
+            (wd, mask, cookie, length) = \
+                _IN_EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + header_size:offset + header_size + length]
+            offset = offset + header_size + length
+            if mask & _IN_Q_OVERFLOW:
+                return self._all_files()
+            dir_pathname = self._dirs_by_wd.get(wd, None)
+            if dir_pathname is not None:
+                pathname = os.path.join(dir_pathname, name.rstrip(b"\0"))
+                if pathname in self._files_in(dir_pathname):
+                    result.add(pathname)
+        return list(result)
+
+    def wake(self):
+        """wake() -> None
+
+        Make any wait() in progress return immediately.
+
+        """
+        try:
+            os.write(self._wake_write, b"x")
+        except OSError as _:
+            pass
+
+class KqueueBackend(_DirectoryBackend):
+    """Wait for changes to files using the BSD "kqueue" facility
+    (as on macOS), watching each file and its directory (so that
+    replaced files are noticed).  Raise EnvironmentError when
+    created if "kqueue" is unavailable.
+
+    add -- start watching a file
+    close -- stop watching all files
+    remove -- stop watching a file
+    wait -- return files that might have changed
+    wake -- interrupt a wait() from another thread
+
+    """
+
+    def __init__(self):
+        _DirectoryBackend.__init__(self)
+        if not hasattr(select, 'kqueue'):
+            raise EnvironmentError(errno.ENOSYS, "kqueue is unavailable")
+        self._kq = select.kqueue()
+        self._fflags = (select.KQ_NOTE_WRITE | select.KQ_NOTE_EXTEND |
+                        select.KQ_NOTE_ATTRIB | select.KQ_NOTE_DELETE |
+                        select.KQ_NOTE_RENAME)
+        # each descriptor refers to a directory or a file; a file
+        # descriptor is reopened when its file is replaced
+        self._dirs_by_fd = dict()
+        self._fds_by_dir = dict()
+        self._files_by_fd = dict()
+        self._fds_by_file = dict()
+        (self._wake_read, self._wake_write) = _make_wake_pipe()
+        self._kq.control([select.kevent(self._wake_read,
+                                        filter=select.KQ_FILTER_READ,
+                                        flags=select.KQ_EV_ADD)], 0, 0)
+
+    def _open(self, pathname):
+        """Return a descriptor for events on the given path that
+        is registered with the queue, or None if it cannot be
+        opened.
+        """
+        try:
+            fd = os.open(pathname, _O_EVTONLY)
+        except OSError as _:
+            return None
+        self._kq.control([select.kevent(fd, filter=select.KQ_FILTER_VNODE,
+                                        flags=(select.KQ_EV_ADD |
+                                               select.KQ_EV_CLEAR),
+                                        fflags=self._fflags)], 0, 0)
+        return fd
+
+    def _open_file(self, pathname):
+        """Watch a file directly (in case it is changed in place),
+        if it exists.
+        """
+        fd = self._open(pathname)
+        if fd is not None:
+            self._files_by_fd[fd] = pathname
+            self._fds_by_file[pathname] = fd
+
+    def _close_file(self, pathname):
+        fd = self._fds_by_file.pop(pathname, None)
+        if fd is not None:
+            del self._files_by_fd[fd]
+            os.close(fd) # (this also removes the event)
+
+    def _add_dir(self, dir_pathname):
+        fd = self._open(dir_pathname)
+        if fd is None:
+            raise EnvironmentError(errno.ENOENT, "cannot watch directory",
+                                   dir_pathname)
+        self._dirs_by_fd[fd] = dir_pathname
+        self._fds_by_dir[dir_pathname] = fd
+
+    def _remove_dir(self, dir_pathname):
+        fd = self._fds_by_dir.pop(dir_pathname, None)
+        if fd is not None:
+            del self._dirs_by_fd[fd]
+            os.close(fd)
+
+    def add(self, pathname):
+        """add(pathname) -> None
+
+        Start watching the given file (which must be a resolved
+        path).  Raise EnvironmentError if its directory cannot
+        be watched.
+
+        """
+        _DirectoryBackend.add(self, pathname)
+        with self._lock:
+            if pathname not in self._fds_by_file:
+                self._open_file(pathname)
+
+    def close(self):
+        """close() -> None
+
+        Stop watching all files, and release any resources.
+
+        """
+        with self._lock:
+            for pathname in list(self._fds_by_file):
+                self._close_file(pathname)
+        _DirectoryBackend.close(self)
+        self._kq.close()
+        for fd in (self._wake_read, self._wake_write):
+            os.close(fd)
+
+    def remove(self, pathname):
+        """remove(pathname) -> None
+
+        Stop watching the given file, if it is watched.
+
+        """
+        with self._lock:
+            self._close_file(pathname)
+        _DirectoryBackend.remove(self, pathname)
+
+    def wait(self, timeout=None):
+        """wait(timeout=None) -> list
+
+        Return the watched files that might have changed, after
+        waiting up to the given number of seconds (forever, if
+        None) for something to happen.
+
+        """
+        events = self._kq.control(None, 64, timeout)
+        result = set()
+        for event in events:
+            fd = event.ident
+            if fd == self._wake_read:
+                _drain(self._wake_read)
+                continue
+            with self._lock:
+                dir_pathname = self._dirs_by_fd.get(fd, None)
+                pathname = self._files_by_fd.get(fd, None)
+            if dir_pathname is not None:
+                # a file was added, removed or renamed; any of the
+                # watched files might have been replaced
+                for pathname in self._files_in(dir_pathname):
+                    result.add(pathname)
+                    with self._lock:
+                        self._close_file(pathname)
+                        self._open_file(pathname)
+            elif pathname is not None:
+                result.add(pathname)
+                if event.fflags & (select.KQ_NOTE_DELETE |
+                                   select.KQ_NOTE_RENAME):
+                    with self._lock:
+                        self._close_file(pathname)
+                        self._open_file(pathname)
+        return list(result)
+
+    def wake(self):
+        """wake() -> None
+
+        Make any wait() in progress return immediately.
+
+        """
+        try:
+            os.write(self._wake_write, b"x")
+        except OSError as _:
+            pass
+
+class PollingBackend(object):
+    """Check watched files periodically.  This works on any
+    system, but changes are noticed less quickly.  At most
+    "files_per_poll" files are returned by each wait(), which
+    happens at most once every "interval" seconds, so the cost
+    does not depend on the number of files watched (a change
+    is noticed more slowly, the more files there are).
+
+    add -- start watching a file
+    close -- stop watching all files
+    remove -- stop watching a file
+    wait -- return files that might have changed
+    wake -- interrupt a wait() from another thread
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> b = PollingBackend(interval=0.01, files_per_poll=2)
+    >>> for name in ('/a', '/b', '/c'):
+    ...     b.add(name)
+    >>> b.wait(), b.wait(), b.wait()
+    (['/a', '/b'], ['/c', '/a'], ['/b', '/c'])
+
+    """
+
+    def __init__(self, interval=1.0, files_per_poll=20):
+        if interval <= 0 or files_per_poll < 1:
+            raise ValueError("polling interval and file count must be "
+                             "positive")
+        self._interval = interval
+        self._files_per_poll = files_per_poll
+        self._lock = threading.Lock()
+        self._files = list()
+        self._next_index = 0
+        self._wake_event = threading.Event()
+
+    def add(self, pathname):
+        """add(pathname) -> None
+
+        Start watching the given file.
+
+        """
+        with self._lock:
+            if pathname not in self._files:
+                self._files.append(pathname)
+
+    def close(self):
+        """close() -> None
+
+        Stop watching all files.
+
+        """
+        with self._lock:
+            del self._files[:]
+
+    def remove(self, pathname):
+        """remove(pathname) -> None
+
+        Stop watching the given file, if it is watched.
+
+        """
+        with self._lock:
+            if pathname in self._files:
+                self._files.remove(pathname)
+
+    def wait(self, timeout=None):
+        """wait(timeout=None) -> list
+
+        Return the next few watched files in turn, after waiting
+        for the polling interval (or the given timeout, if that
+        is shorter).
+
+        """
+        if timeout is None or timeout > self._interval:
+            timeout = self._interval
+        self._wake_event.wait(timeout)
+        self._wake_event.clear()
+        result = list()
+        with self._lock:
+            count = min(self._files_per_poll, len(self._files))
+            for ignored in range(count):
+                self._next_index = self._next_index % len(self._files)
+                result.append(self._files[self._next_index])
+                self._next_index = self._next_index + 1
+        return result
+
+    def wake(self):
+        """wake() -> None
+
+        Make any wait() in progress return immediately.
+
+        """
+        self._wake_event.set()
+
+class Watcher(object):
+    """Call functions when watched files change, either on the
+    main thread (see schedule()) or on a background thread (see
+    start()).  A function is given the pathname that it was
+    registered with, and is called once changes to that file
+    have stopped for "debounce" seconds.  Files are checked with
+    one os.stat() for each notification from the backend, so a
+    function is not called if a file is only touched by an
+    unrelated change in its directory.  A file that does not
+    exist is watched, in case it is created.
+
+    poll -- check for changes once, without waiting
+    schedule -- check for changes periodically from the main event loop
+    start -- begin watching files on a background thread
+    stop -- stop checking for changes
+    unwatch -- stop watching a file
+    watch -- call a function whenever a file changes
+    watched -- return the pathnames of all watched files
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> import tempfile
+    >>> d = tempfile.mkdtemp()
+    >>> p = os.path.join(d, 'x.macros')
+    >>> changes = list()
+    >>> w = Watcher(backend=PollingBackend(interval=0.01), debounce=0.05)
+    >>> w.watch(p, changes.append)
+    >>> w.start()
+    >>> with open(p, 'w') as ofh:
+    ...     ofh.write('f1 = "ls"\\n')
+    >>> _wait_until(lambda: changes)
+    >>> changes == [p]
+    True
+    >>> w.stop()
+    >>> w.watched() == [p]
+    True
+
+    With schedule(), functions are called on the main thread:
+
+    >>> from pymacterm import file_watch, quills_stub
+    >>> file_watch.quills = quills_stub
+    >>> w = Watcher(backend=PollingBackend(interval=0.01), debounce=0)
+    >>> w.watch(p, lambda x: changes.append(threading.current_thread().name))
+    >>> w.schedule(interval=0.25)
+    >>> with open(p, 'a') as ofh:
+    ...     ofh.write('f2 = "pwd"\\n')
+    >>> (seconds, poll) = quills_stub.Events.delayed.pop(0)
+    >>> poll()
+    >>> changes[1:] == [threading.current_thread().name]
+    True
+    >>> (seconds, poll) = quills_stub.Events.delayed.pop(0)
+    >>> seconds
+    0.25
+    >>> w.stop()
+    >>> poll()
+    >>> quills_stub.Events.delayed
+    []
+    >>> file_watch.quills = quills
+    >>> os.remove(p); os.rmdir(d)
+
+    """
+
+    def __init__(self, backend=None, debounce=0.5):
+        if backend is None:
+            backend = default_backend()
+        self._backend = backend
+        self._debounce = debounce
+        self._lock = threading.Lock()
+        self._callbacks = dict() # resolved path -> (pathname, callback)
+        self._signatures = dict() # resolved path -> _file_signature()
+        self._pending = dict() # resolved path -> time of last change
+        self._thread = None
+        self._stopping = False
+        self._generation = 0 # see schedule()
+
+    def _check(self, realpath):
+        """Compare a file with its previous signature, and note
+        the time if it is different.
+        """
+        signature = _file_signature(realpath)
+        with self._lock:
+            if realpath not in self._callbacks:
+                return
+            if signature != self._signatures.get(realpath, None):
+                self._signatures[realpath] = signature
+                self._pending[realpath] = time.time()
+
+    def _due(self):
+        """Return a tuple of the files whose changes have settled
+        and the number of seconds until another one might settle
+        (or None).
+        """
+        now = time.time()
+        result = list()
+        timeout = None
+        with self._lock:
+            for (realpath, changed) in list(self._pending.items()):
+                remaining = changed + self._debounce - now
+                if remaining <= 0:
+                    del self._pending[realpath]
+                    if realpath in self._callbacks and \
+                            self._signatures.get(realpath, None) is not None:
+                        result.append(self._callbacks[realpath])
+                elif timeout is None or remaining < timeout:
+                    timeout = remaining
+        return (result, timeout)
+
+    def _poll_on_main_loop(self, generation, interval):
+        """Body of each call from the main event loop; see
+        schedule().
+        """
+        with self._lock:
+            if generation != self._generation:
+                return
+        try:
+            timeout = self.poll()
+        except Exception as _:
+            _print_exception("file watcher failed for", "*", _)
+            return
+        if timeout is None or timeout > interval:
+            timeout = interval
+        quills.Events.call_after(timeout, lambda:
+                                 self._poll_on_main_loop(generation, interval))
+
+    def _run(self):
+        """Body of the background thread.
+        """
+        timeout = None
+        while not self._stopping:
+            try:
+                timeout = self._step(timeout)
+            except Exception as _:
+                _print_exception("file watcher failed for", "*", _)
+                return
+
+    def _step(self, timeout):
+        """Wait up to the given number of seconds for the backend,
+        call the functions of files whose changes have settled,
+        and return the number of seconds until another one might
+        settle (or None).
+        """
+        changed = self._backend.wait(timeout)
+        for realpath in changed:
+            self._check(realpath)
+        (due, timeout) = self._due()
+        for (pathname, callback) in due:
+            try:
+                callback(pathname)
+            except Exception as _:
+                _print_exception("unable to reload", pathname, _)
+        return timeout
+
+    def poll(self):
+        """poll() -> float
+
+        Check for changes without waiting, and call (on this
+        thread) the function of each file whose changes have
+        settled.  Return the number of seconds until another
+        change will have settled, or None if no change is
+        waiting to settle.  Raise an exception if the backend
+        fails.
+
+        """
+        return self._step(0)
+
+    def schedule(self, interval=0.5):
+        """schedule(interval=0.5) -> None
+
+        Call poll() on the main thread every "interval" seconds
+        (or sooner, when a change is about to settle), using
+        Events.call_after(), until stop() is called.  Unlike
+        start(), this works while the application is idle (see
+        the module description).  Use start() or schedule(), not
+        both.
+
+        """
+        with self._lock:
+            self._generation = self._generation + 1
+            generation = self._generation
+        quills.Events.call_after(0, lambda:
+                                 self._poll_on_main_loop(generation, interval))
+
+    def start(self):
+        """start() -> None
+
+        Begin watching files on a background (daemon) thread, if
+        that is not already happening.
+
+        """
+        with self._lock:
+            if self._thread is None:
+                self._stopping = False
+                self._thread = threading.Thread(target=self._run,
+                                                name="file watcher")
+                self._thread.setDaemon(True)
+                self._thread.start()
+
+    def stop(self):
+        """stop() -> None
+
+        Stop checking for changes from the main event loop, or
+        stop the background thread and wait for it to finish.
+        Files remain registered, so schedule() or start() can be
+        used again.
+
+        """
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+            self._stopping = True
+            self._generation = self._generation + 1
+        if thread is not None:
+            self._backend.wake()
+            thread.join()
+
+    def unwatch(self, pathname):
+        """unwatch(pathname) -> None
+
+        Stop watching the given file, if it is watched.
+
+        """
+        realpath = os.path.realpath(pathname)
+        with self._lock:
+            self._callbacks.pop(realpath, None)
+            self._signatures.pop(realpath, None)
+            self._pending.pop(realpath, None)
+        self._backend.remove(realpath)
+
+    def watch(self, pathname, callback):
+        """watch(pathname, callback) -> None
+
+        Call the given function with the given pathname (on the
+        thread that checks for changes) whenever the file
+        changes, replacing any function already given for the
+        same file.  Raise EnvironmentError if the file's
+        directory cannot be watched.
+
+        """
+        realpath = os.path.realpath(pathname)
+        signature = _file_signature(realpath)
+        self._backend.add(realpath)
+        with self._lock:
+            self._callbacks[realpath] = (pathname, callback)
+            self._signatures[realpath] = signature
+        self._backend.wake()
+
+    def watched(self):
+        """watched() -> list
+
+        Return the pathnames of all watched files, as given to
+        watch().
+
+        """
+        with self._lock:
+            return sorted([x[0] for x in self._callbacks.values()])
+
+def _reload_macros(pathname):
+    """_reload_macros(pathname) -> None
+
+    Arrange for file_open.macros() to be called with the given
+    ".macros" file on the main thread (since it calls Quills,
+    and shares state with everything else that loads macros),
+    even if a Watcher calls this on a background thread.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> from pymacterm import file_open, file_watch, quills_stub
+    >>> file_watch.quills = quills_stub # (do not change real macros!)
+    >>> original_macros = file_open.macros
+    >>> calls = list()
+    >>> file_open.macros = lambda x: calls.append(
+    ...     (x, threading.current_thread().name))
+    >>> t = threading.Thread(target=_reload_macros, args=('x.macros',),
+    ...                      name='watcher')
+    >>> t.start()
+    >>> t.join()
+    >>> calls
+    []
+    >>> quills_stub.Events.run_loop()
+    >>> calls == [('x.macros', threading.current_thread().name)]
+    True
+    >>> file_open.macros = original_macros
+    >>> file_watch.quills = quills
+
+    """
+    from . import file_open
+    quills.Events.call_soon(lambda: file_open.macros(pathname))
+
+def _reload_session(pathname):
+    """_reload_session(pathname) -> None
+
+    Parse a ".session" file again, and check its command, so
+    that the next time it is opened there is no delay, and so
+    that any problems are reported right away.
+
+    """
+    from . import file_open
+    file_open._session_args(file_open.read_kvp_file(pathname))
+
+def _shared():
+    """_shared() -> Watcher
+
+    Return the Watcher for watch_macros() and watch_session(),
+    creating it and scheduling it on the main event loop if
+    necessary.
+
+    """
+    global _shared_watcher
+    with _shared_watcher_lock:
+        if _shared_watcher is None:
+            _shared_watcher = Watcher()
+            _shared_watcher.schedule()
+        return _shared_watcher
+
+def _wait_until(predicate, timeout=5.0):
+    """_wait_until(predicate, timeout=5.0) -> None
+
+    For testing, return when the given function returns a true
+    value, or after the given number of seconds.
+
+    """
+    end = time.time() + timeout
+    while not predicate() and time.time() < end:
+        time.sleep(0.01)
+
+def default_backend():
+    """default_backend() -> object
+
+    Return a new InotifyBackend or KqueueBackend if possible,
+    or otherwise a new PollingBackend.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> b = default_backend()
+    >>> hasattr(b, 'wait')
+    True
+    >>> b.close()
+
+    """
+    for backend_class in (InotifyBackend, KqueueBackend):
+        try:
+            return backend_class()
+        except EnvironmentError as _:
+            pass
+    return PollingBackend()
+
+def stop_watching():
+    """stop_watching() -> None
+
+    Stop watching every file given to watch_macros() or
+    watch_session().
+
+    """
+    global _shared_watcher
+    with _shared_watcher_lock:
+        watcher = _shared_watcher
+        _shared_watcher = None
+    if watcher is not None:
+        watcher.stop()
+        watcher._backend.close()
+
+def watch_macros(pathname):
+    """watch_macros(pathname) -> None
+
+    Call file_open.macros() on the main thread (using
+    Events.call_soon()) whenever the given ".macros" file
+    changes.  Since file_open.macros() only changes macros that
+    are different, edits take effect with very little work.
+
+    """
+    _shared().watch(pathname, _reload_macros)
+
+def watch_session(pathname):
+    """watch_session(pathname) -> None
+
+    Parse the given ".session" file again on the main thread
+    whenever it changes (reporting any problems), so that the
+    next session opened from the file starts without delay and
+    uses the new settings.  Sessions are not opened.
+
+    """
+    _shared().watch(pathname, _reload_session)
+
+def _test():
+    """Runs all of this module's "doctest" test cases.
+    """
+    import doctest
+    from . import file_watch
+    return doctest.testmod(file_watch)
+
+if __name__ == '__main__':
+    _test()
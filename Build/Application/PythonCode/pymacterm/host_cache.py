@@ -0,0 +1,262 @@
+#!/usr/bin/python
+# vim: set fileencoding=UTF-8 :
+
+"""Routines to look up many host names at once, remembering the results.
+
+When several sessions are opened together (such as the "ssh://" URLs of
+a workspace), each "ssh" process would otherwise look up its server in
+turn, so that one slow DNS server delays every session.  A HostCache
+looks up a whole set of names in parallel, on a small pool of threads,
+and keeps each result for a time (failures are kept for less time).
+
+Names are looked up by a "resolver": any function that takes a host name
+and returns a list of address strings (raising an exception or returning
+an empty list if the name cannot be found).  The default resolver uses
+the system (so results are also kept by the system's own cache, which
+helps even if addresses are not used directly); tests can use a simple
+dictionary instead.
+
+Since Quills does not release the interpreter lock while events are
+handled, lookups only progress while Python code is running or waiting;
+use warm() with a time limit to wait for results on the main thread.
+
+HostCache -- look up host names in parallel, and remember the results
+default_resolver -- return the addresses of a host, using the system
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__author__ = 'Kevin Grant <kmg@mac.com>'
+__date__ = '18 October 2026'
+__version__ = '4.0.0'
+
+from multiprocessing.pool import ThreadPool
+import socket
+import threading
+import time
+
+from .utilities import \
+    LRUCache
+
+class HostCache(object):
+    """Look up host names with a resolver (see the module
+    description), in parallel, and remember the addresses of
+    each host for "ttl" seconds (or for "failure_ttl" seconds
+    if the host cannot be found).  At most "max_threads" names
+    are looked up at once, and at most "capacity" are kept.
+
+    addresses -- return the remembered addresses of a host, if any
+    clear -- forget all hosts
+    close -- stop the threads used for lookups
+    resolve -- return the addresses of a host, waiting if necessary
+    stats -- return a dictionary of cache counts and pending lookups
+    warm -- start looking up hosts, optionally waiting for them
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> looked_up = list()
+    >>> def resolver(host):
+    ...     looked_up.append(host)
+    ...     return {'a.example': ['10.0.0.1'], 'b.example': ['::1']}[host]
+    >>> cache = HostCache(resolver=resolver, ttl=60, failure_ttl=5)
+    >>> now = [1000.0]
+    >>> cache._clock = lambda: now[0]
+    >>> cache.warm(['a.example', 'b.example', 'c.example', 'a.example'],
+    ...            wait=5.0)
+    3
+    >>> sorted(looked_up)
+    ['a.example', 'b.example', 'c.example']
+    >>> cache.addresses('b.example'), cache.addresses('c.example')
+    (['::1'], [])
+    >>> cache.warm(['a.example', 'b.example', 'c.example'])
+    0
+
+    Results expire (failures first):
+
+    >>> now[0] = 1010.0
+    >>> print(cache.addresses('c.example'))
+    None
+    >>> cache.resolve('c.example')
+    []
+    >>> now[0] = 1100.0
+    >>> del looked_up[:]
+    >>> cache.resolve('a.example')
+    ['10.0.0.1']
+    >>> looked_up
+    ['a.example']
+    >>> cache.close()
+
+    """
+
+    def __init__(self, resolver=None, ttl=300.0, failure_ttl=30.0,
+                 max_threads=8, capacity=256):
+        if max_threads < 1:
+            raise ValueError("number of threads must be at least 1")
+        self._resolver = resolver or default_resolver
+        self._ttl = ttl
+        self._failure_ttl = failure_ttl
+        self._max_threads = max_threads
+        self._clock = time.time
+        self._results = LRUCache(capacity=capacity)
+        self._lock = threading.Lock()
+        self._pending = dict() # host name to threading.Event
+        self._pool = None
+
+    def _fresh(self, host):
+        """Return the remembered addresses of the given host if
+        they have not expired, or None.
+        """
+        entry = self._results.get(host)
+        if entry is None or entry[0] <= self._clock():
+            return None
+        return entry[1]
+
+    def _look_up(self, host):
+        """Find the addresses of a host (on any thread), remember
+        them, and release anything waiting for them.
+        """
+        try:
+            result = list(self._resolver(host) or ())
+        except Exception as _:
+            result = []
+        ttl = self._ttl if result else self._failure_ttl
+        self._results.put(host, (self._clock() + ttl, result))
+        with self._lock:
+            done = self._pending.pop(host, None)
+        if done is not None:
+            done.set()
+        return result
+
+    def addresses(self, host):
+        """addresses(host) -> list
+
+        Return the addresses of the given host if they are known
+        and have not expired (an empty list means that the host
+        could not be found), or None.  This never waits.
+
+        """
+        return self._fresh(host)
+
+    def clear(self):
+        """clear() -> None
+
+        Forget the addresses of every host.  Lookups in progress
+        still finish.
+
+        """
+        self._results.clear(reset_stats=True)
+
+    def close(self):
+        """close() -> None
+
+        Stop the threads used for lookups (they are started again
+        if necessary).  Lookups in progress may not finish.
+
+        """
+        with self._lock:
+            pool = self._pool
+            self._pool = None
+            unfinished = list(self._pending.values())
+            self._pending.clear()
+        if pool is not None:
+            pool.terminate()
+        for done in unfinished:
+            # (anything waiting looks up the host itself)
+            done.set()
+
+    def resolve(self, host):
+        """resolve(host) -> list
+
+        Return the addresses of the given host, looking them up
+        (on this thread) only if they are not known.  An empty
+        list means that the host could not be found.
+
+        """
+        result = self._fresh(host)
+        if result is None:
+            with self._lock:
+                done = self._pending.get(host, None)
+            if done is not None:
+                done.wait()
+                result = self._fresh(host)
+            if result is None:
+                result = self._look_up(host)
+        return result
+
+    def stats(self):
+        """stats() -> dict
+
+        Return a dictionary with the cache counts (see
+        utilities.LRUCache.stats()) and the number of lookups
+        not yet finished, as 'pending'.
+
+        """
+        result = self._results.stats()
+        with self._lock:
+            result['pending'] = len(self._pending)
+        return result
+
+    def warm(self, hosts, wait=None):
+        """warm(hosts, wait=None) -> int
+
+        Start looking up every host in the given sequence whose
+        addresses are not known, in parallel, and return the
+        number of lookups started.  If "wait" is given, wait at
+        most that many seconds for every host to be finished
+        (including lookups that were started earlier).
+
+        """
+        started = list()
+        waiting = list()
+        with self._lock:
+            for host in hosts:
+                done = self._pending.get(host, None)
+                if done is None and self._fresh(host) is None:
+                    done = threading.Event()
+                    self._pending[host] = done
+                    started.append(host)
+                if done is not None and done not in waiting:
+                    waiting.append(done)
+            if started and self._pool is None:
+                self._pool = ThreadPool(self._max_threads)
+            pool = self._pool
+        for host in started:
+            pool.apply_async(self._look_up, (host,))
+        if wait is not None:
+            deadline = time.time() + wait
+            for done in waiting:
+                done.wait(max(0.0, deadline - time.time()))
+        return len(started)
+
+def default_resolver(host):
+    """default_resolver(host) -> list
+
+    Return the distinct addresses of the given host (IPv4 or
+    IPv6) in the order given by the system.  Raise socket.error
+    if the host cannot be found.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> default_resolver('127.0.0.1')
+    ['127.0.0.1']
+
+    """
+    result = list()
+    for info in socket.getaddrinfo(host, None, socket.AF_UNSPEC,
+                                   socket.SOCK_STREAM):
+        address = info[4][0]
+        if address not in result:
+            result.append(address)
+    return result
+
+def _test():
+    """Runs all of this module's "doctest" test cases.
+    """
+    import doctest
+    from . import host_cache
+    return doctest.testmod(host_cache)
+
+if __name__ == '__main__':
+    _test()
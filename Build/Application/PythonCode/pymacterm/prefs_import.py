@@ -0,0 +1,403 @@
+#!/usr/bin/python
+# vim: set fileencoding=UTF-8 :
+
+"""Routines to import preferences without making the application wait.
+
+An exported preferences file is an XML property list containing one
+collection (a dictionary, as saved by the Preferences window); a "bundle"
+of collections (an array of such dictionaries, such as a script might
+create to share many collections at once) is also accepted.  Importing a
+large bundle all at once would prevent the user interface from responding,
+so an Import reads and checks the file on a background thread, and then
+imports a few collections at a time on the main thread (using
+Events.call_soon(), so that events are handled between each batch).
+
+Import -- import preferences from a file in steps, reporting progress
+import_file -- start importing preferences from a file, and return an Import
+read_collections -- return each collection in a file, without reading it all
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__author__ = 'Kevin Grant <kmg@mac.com>'
+__date__ = '18 October 2026'
+__version__ = '4.0.0'
+
+import base64
+from collections import deque
+import datetime
+import os
+import plistlib
+import shutil
+import sys
+import tempfile
+import threading
+try:
+    import xml.etree.cElementTree as ElementTree
+except ImportError:
+    import xml.etree.ElementTree as ElementTree
+
+# note: Quills is a compiled module, library path must be set properly
+import quills
+
+# see Import; the classes of named collections (whose names may conflict
+# with imported collections)
+_NAMED_CLASSES = ('FORMAT', 'MACRO_SET', 'SESSION', 'TERMINAL',
+                  'TRANSLATION', 'WORKSPACE')
+
+# see Import; the longest time that one step may wait for the file to be
+# read on the main thread (since Quills does not release the interpreter
+# lock while events are handled, a background thread can only run while
+# Python code on the main thread is running or waiting)
+_STEP_WAIT_SECONDS = 0.01
+
+def _iter_collections(pathname):
+    """_iter_collections(pathname) -> generator
+
+    Like read_collections(), but yield pairs whose first
+    element is true only if the file is a bundle.
+
+    """
+    depth = 0
+    top = None
+    is_bundle = False
+    with open(pathname, 'rb') as ifh:
+        for (event, element) in ElementTree.iterparse(ifh, ('start', 'end')):
+            if event == 'start':
+                depth = depth + 1
+                if depth == 1 and element.tag != 'plist':
+                    raise SyntaxError("not a property list: %s" % pathname)
+                elif depth == 2:
+                    if top is not None:
+                        raise SyntaxError("property list has more than one "
+                                          "value: %s" % pathname)
+                    top = element
+                    is_bundle = (element.tag == 'array')
+                    if not is_bundle and element.tag != 'dict':
+                        raise SyntaxError("property list is not a dictionary "
+                                          "or array: %s" % pathname)
+                continue
+            depth = depth - 1
+            if depth == 2 and is_bundle:
+                # each complete item is discarded once converted, so
+                # that memory use does not grow with the file size
+                yield (True, _plist_value(element))
+                top.remove(element)
+            elif depth == 1 and not is_bundle:
+                yield (False, _plist_value(element))
+    if top is None:
+        raise SyntaxError("property list is empty: %s" % pathname)
+
+def _plist_value(element):
+    """_plist_value(element) -> object
+
+    Return the Python value for a complete property list
+    element (such as "<integer>").  Raise SyntaxError for
+    anything that is not valid in a property list.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> e = ElementTree.fromstring('<dict><key>a</key><array>'
+    ...                            '<integer>1</integer><true/>'
+    ...                            '</array></dict>')
+    >>> _plist_value(e)
+    {'a': [1, True]}
+
+    >>> try:
+    ...     _plist_value(ElementTree.fromstring('<dict><string/></dict>'))
+    ... except SyntaxError as e:
+    ...     print(e)
+    property list dictionary has a value without a key
+
+    """
+    tag = element.tag
+    text = element.text or ''
+    if tag == 'string':
+        return text
+    if tag == 'integer':
+        return int(text)
+    if tag == 'real':
+        return float(text)
+    if tag == 'true':
+        return True
+    if tag == 'false':
+        return False
+    if tag == 'data':
+        data = base64.b64decode(text.encode('ascii'))
+        if hasattr(plistlib, 'Data'):
+            data = plistlib.Data(data)
+        return data
+    if tag == 'date':
+        return datetime.datetime.strptime(text, '%Y-%m-%dT%H:%M:%SZ')
+    if tag == 'array':
+        return [_plist_value(x) for x in element]
+    if tag == 'dict':
+        result = dict()
+        key = None
+        for child in element:
+            if child.tag == 'key':
+                if key is not None:
+                    raise SyntaxError("property list dictionary key \"%s\" "
+                                      "has no value" % key)
+                key = child.text or ''
+            elif key is None:
+                raise SyntaxError("property list dictionary has a value "
+                                  "without a key")
+            else:
+                result[key] = _plist_value(child)
+                key = None
+        if key is not None:
+            raise SyntaxError("property list dictionary key \"%s\" has no "
+                              "value" % key)
+        return result
+    raise SyntaxError("unexpected element in property list: <%s>" % tag)
+
+def _write_plist(value, pathname):
+    """_write_plist(value, pathname) -> None
+
+    Save a value as an XML property list file.
+
+    """
+    if hasattr(plistlib, 'dump'):
+        with open(pathname, 'wb') as ofh:
+            plistlib.dump(value, ofh)
+    else:
+        plistlib.writePlist(value, pathname)
+
+class Import(object):
+    """Import preferences from a file in small steps.  Call
+    start() on the main thread to begin; after that, the
+    progress function (if any) is called with this object on
+    the main thread after each step, and once more when
+    "finished" becomes true.
+
+    The following attributes describe the progress:
+
+    applied -- number of collections imported so far
+    error -- the exception that stopped the import, or None
+    finished -- true when nothing more will happen
+    skipped -- names of collections that were not imported
+    total -- number of collections to import (None until known)
+
+    Each collection is imported with Prefs.import_from_file(),
+    with "allow_rename" set, so that a collection with the same
+    name as an existing one is given a unique name.  But if
+    "skip_existing" is true, such a collection is not imported
+    at all (for instance, so that an updated bundle can be
+    imported again to add only its new collections).
+
+    The "call_soon" function must arrange for a function to be
+    called later on the main thread; it is Events.call_soon()
+    by default.
+
+    start -- begin importing preferences
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> source_dir = tempfile.mkdtemp()
+    >>> pathname = os.path.join(source_dir, 'bundle.plist')
+    >>> _write_plist([{'name-string': 'A'}, {'name-string': 'B'},
+    ...               {'name-string': 'C'}], pathname)
+    >>> from pymacterm import prefs_import, quills_stub
+    >>> prefs_import.quills = quills_stub # (do not change real preferences!)
+    >>> quills_stub.Prefs.collections = {quills_stub.Prefs.FORMAT: ['B']}
+    >>> del quills_stub.Prefs.imported[:]
+    >>> steps = list()
+    >>> job = Import(pathname, batch_size=1, skip_existing=True,
+    ...              progress=lambda x: steps.append(x.applied))
+    >>> job.start()
+    >>> quills_stub.Events.run_loop()
+    >>> job.finished, job.error, job.total, job.skipped
+    (True, None, 2, ['B'])
+    >>> steps
+    [1, 2]
+    >>> quills_stub.Prefs.imported
+    ['A', 'C']
+    >>> quills_stub.Prefs.collections = dict()
+    >>> prefs_import.quills = quills
+    >>> shutil.rmtree(source_dir)
+
+    """
+
+    def __init__(self, pathname, progress=None, batch_size=4,
+                 skip_existing=False, call_soon=None):
+        if batch_size < 1:
+            raise ValueError("batch size must be at least 1")
+        self.pathname = pathname
+        self.applied = 0
+        self.error = None
+        self.finished = False
+        self.skipped = list()
+        self.total = None
+        self._progress = progress
+        self._batch_size = batch_size
+        self._skip_existing = skip_existing
+        self._call_soon = call_soon or quills.Events.call_soon
+        self._existing_names = None
+        self._is_bundle = False
+        self._pending = deque()
+        self._parsed = threading.Event()
+        self._temp_dir = None
+
+    def _apply(self, collection):
+        """Import one collection (on the main thread).
+        """
+        if not self._is_bundle:
+            # the original file can be imported directly
+            quills.Prefs.import_from_file(self.pathname, allow_rename=True)
+            return
+        if self._temp_dir is None:
+            self._temp_dir = tempfile.mkdtemp(prefix='MacTermImport')
+        pathname = os.path.join(self._temp_dir, 'collection.plist')
+        _write_plist(collection, pathname)
+        try:
+            quills.Prefs.import_from_file(pathname, allow_rename=True)
+        finally:
+            os.remove(pathname)
+
+    def _finish(self, error=None):
+        """Stop importing, and report the final progress.
+        """
+        self.error = error
+        self.finished = True
+        if self._temp_dir is not None:
+            shutil.rmtree(self._temp_dir, ignore_errors=True)
+            self._temp_dir = None
+        self._report()
+
+    def _parse(self):
+        """Read and check the file (on a background thread), and
+        find the collections to import.
+        """
+        try:
+            pending = list()
+            names = set()
+            for (is_bundle, collection) in _iter_collections(self.pathname):
+                self._is_bundle = is_bundle
+                if not isinstance(collection, dict):
+                    raise SyntaxError("preferences bundle item is not a "
+                                      "dictionary")
+                name = collection.get('name-string', None)
+                if self._skip_existing and name and \
+                        (name in self._existing_names or name in names):
+                    self.skipped.append(name)
+                    continue
+                names.add(name)
+                pending.append(collection)
+            self._pending = deque(pending)
+            self.total = len(pending)
+        except Exception as _:
+            self.error = _
+        self._parsed.set()
+
+    def _report(self):
+        """Call the progress function, if any.
+        """
+        if self._progress is not None:
+            try:
+                self._progress(self)
+            except Exception as _:
+                print("MacTerm: warning, progress function failed:", _,
+                      file=sys.stderr)
+
+    def _step(self):
+        """Import the next few collections (on the main thread),
+        and schedule the next step.
+        """
+        if not self._parsed.is_set():
+            self._parsed.wait(_STEP_WAIT_SECONDS)
+            if not self._parsed.is_set():
+                self._call_soon(self._step)
+                return
+        if self.error is not None:
+            self._finish(self.error)
+            return
+        try:
+            for ignored in range(min(self._batch_size, len(self._pending))):
+                self._apply(self._pending.popleft())
+                self.applied = self.applied + 1
+        except Exception as _:
+            self._finish(_)
+            return
+        if self._pending:
+            self._report()
+            self._call_soon(self._step)
+        else:
+            self._finish()
+
+    def start(self):
+        """start() -> None
+
+        Begin reading the file on a background thread, and
+        schedule the first import step.  This must be called on
+        the main thread.
+
+        """
+        existing = set()
+        for class_name in _NAMED_CLASSES:
+            of_class = getattr(quills.Prefs, class_name)
+            existing.update(quills.Prefs.list_collections(of_class))
+        self._existing_names = existing
+        thread = threading.Thread(target=self._parse,
+                                  name="preferences import")
+        thread.setDaemon(True)
+        thread.start()
+        self._call_soon(self._step)
+
+def import_file(pathname, progress=None, batch_size=4, skip_existing=False,
+                call_soon=None):
+    """import_file(pathname, progress=None, batch_size=4,
+                   skip_existing=False, call_soon=None) -> Import
+
+    Create an Import with the given options, start() it, and
+    return it.  This must be called on the main thread.
+
+    """
+    result = Import(pathname, progress=progress, batch_size=batch_size,
+                    skip_existing=skip_existing, call_soon=call_soon)
+    result.start()
+    return result
+
+def read_collections(pathname):
+    """read_collections(pathname) -> generator
+
+    Yield each collection (dictionary) in the given XML property
+    list file, which may contain one collection or an array of
+    them.  The file is read incrementally, so only one collection
+    is in memory at a time.  Raise SyntaxError (possibly after
+    some collections are returned) if the file is not valid.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> source_dir = tempfile.mkdtemp()
+    >>> pathname = os.path.join(source_dir, 'one.plist')
+    >>> _write_plist({'name-string': 'Mint', 'size': 12}, pathname)
+    >>> [sorted(x.items()) for x in read_collections(pathname)]
+    [[('name-string', 'Mint'), ('size', 12)]]
+    >>> _write_plist(['not a collection'], pathname)
+    >>> list(read_collections(pathname))
+    ['not a collection']
+    >>> with open(pathname, 'w') as ofh:
+    ...     ofh.write('<html/>')
+    >>> try:
+    ...     list(read_collections(pathname))
+    ... except SyntaxError as e:
+    ...     print(str(e).replace(source_dir, 'D'))
+    not a property list: D/one.plist
+    >>> shutil.rmtree(source_dir)
+
+    """
+    for (ignored, collection) in _iter_collections(pathname):
+        yield collection
+
+def _test():
+    """Runs all of this module's "doctest" test cases.
+    """
+    import doctest
+    from . import prefs_import
+    return doctest.testmod(prefs_import)
+
+if __name__ == '__main__':
+    _test()
@@ -0,0 +1,349 @@
+#!/usr/bin/python
+# vim: set fileencoding=UTF-8 :
+
+"""Stand-in for the compiled Quills module, for tests and benchmarks.
+
+MacTerm's Python code imports "quills", which is built from C++ and is only
+available inside the application.  This module defines the same classes and
+methods in pure Python so that the other modules can be imported, and their
+speed measured (see the "benchmarks" module), anywhere.  Nothing is displayed
+and no process is ever started; Session objects only remember their arguments.
+
+Calls to the Prefs and Session methods used by "file_open" and "url_open" are
+added to the list "calls" as (name, seconds) pairs, such as ("Session", 0.0).
+The "latency" dictionary can make any of these calls take a number of seconds
+by name (to simulate the real costs of Quills).
+
+Base -- stand-in for quills.Base
+Events -- stand-in for quills.Events (can run functions given to call_soon())
+Prefs -- stand-in for quills.Prefs
+Session -- stand-in for quills.Session (can simulate slow window creation)
+Terminal -- stand-in for quills.Terminal
+call_stats -- return the number and total time of recorded calls, by name
+install -- make "import quills" find this module, if Quills is unavailable
+reset_calls -- forget all recorded calls
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__author__ = 'Kevin Grant <kmg@mac.com>'
+__date__ = '18 October 2026'
+__version__ = '4.0.0'
+
+import sys
+import time
+from timeit import default_timer as _timer
+
+# see _simulate(); recorded (name, seconds) pairs, and simulated seconds
+# for each call by name
+calls = list()
+latency = dict()
+
+def _simulate(name, minimum=0.0):
+    """_simulate(name, minimum=0.0) -> None
+
+    Wait as long as "latency" says that the named call takes
+    (or at least the given number of seconds), and add the
+    name and time to the "calls" list.
+
+    """
+    start = _timer()
+    seconds = max(latency.get(name, 0.0), minimum)
+    if seconds > 0:
+        time.sleep(seconds)
+    calls.append((name, _timer() - start))
+
+class Base(object):
+    """Stand-in for quills.Base.
+    """
+
+    def all_done():
+        """all_done() -> None
+        """
+        pass
+    all_done = staticmethod(all_done)
+
+    def all_init(initial_workspace=''):
+        """all_init(initial_workspace='') -> None
+        """
+        pass
+    all_init = staticmethod(all_init)
+
+    def version():
+        """version() -> string
+        """
+        return "stub"
+    version = staticmethod(version)
+
+class Events(object):
+    """Stand-in for quills.Events; functions given to call_soon()
+    are kept in the list "Events.pending" until run_loop().
+    Functions given to call_after() are kept, with their delays,
+    in the list "Events.delayed"; since there is no clock, they
+    are never called by run_loop() (a test calls them itself).
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> calls = list()
+    >>> Events.call_soon(lambda: calls.append(1))
+    >>> Events.call_soon(lambda: Events.call_soon(lambda: calls.append(2)))
+    >>> Events.call_after(0.5, lambda: calls.append(3))
+    >>> Events.run_loop()
+    >>> calls
+    [1, 2]
+    >>> (seconds, function) = Events.delayed.pop(0)
+    >>> seconds
+    0.5
+    >>> function()
+    >>> calls
+    [1, 2, 3]
+
+    """
+    delayed = list()
+    pending = list()
+
+    def call_after(seconds, function):
+        """call_after(seconds, function) -> None
+        """
+        Events.delayed.append((seconds, function))
+    call_after = staticmethod(call_after)
+
+    def call_soon(function):
+        """call_soon(function) -> None
+        """
+        Events.pending.append(function)
+    call_soon = staticmethod(call_soon)
+
+    def on_endloop_call(callback):
+        """on_endloop_call(callback) -> None
+        """
+        pass
+    on_endloop_call = staticmethod(on_endloop_call)
+
+    def run_loop():
+        """run_loop() -> None
+
+        Call the functions given to call_soon() (including any
+        that they schedule) and return, since there are no
+        events.
+
+        """
+        while Events.pending:
+            Events.pending.pop(0)()
+    run_loop = staticmethod(run_loop)
+
+class Prefs(object):
+    """Stand-in for quills.Prefs; macros that are defined are
+    kept in the "macros" dictionary of each object.  The
+    "name-string" of each imported file is added to the list
+    "Prefs.imported", and list_collections() returns the names
+    in the dictionary "Prefs.collections" for the given class.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> reset_calls()
+    >>> p = Prefs(Prefs.MACRO_SET)
+    >>> p.define_macro(1, name='Macro 1', contents='ls')
+    >>> p.macros
+    {1: ('Macro 1', 'ls')}
+    >>> [x[0] for x in calls]
+    ['Prefs', 'Prefs.define_macro']
+
+    """
+    # these do not have the same values as in Quills
+    GENERAL = 0
+    FORMAT = 1
+    MACRO_SET = 2
+    SESSION = 3
+    TERMINAL = 4
+    TRANSLATION = 5
+    WORKSPACE = 6
+    _current_macros = None
+    collections = dict()
+    imported = list()
+
+    def __init__(self, of_class):
+        _simulate('Prefs')
+        self.of_class = of_class
+        self.macros = dict()
+
+    def define_macro(self, index_in_set, name='', contents=''):
+        """define_macro(index_in_set, name='', contents='') -> None
+
+        Raise ValueError if the index is not in the range 1-12,
+        like the real binding (see "%exception define_macro" in
+        QuillsPrefs.h).
+
+        """
+        _simulate('Prefs.define_macro')
+        if not 1 <= index_in_set <= 12:
+            raise ValueError("macro index is out of range")
+        self.macros[index_in_set] = (name, contents)
+
+    def import_from_file(pathname, allow_rename=False):
+        """import_from_file(pathname, allow_rename=False) -> None
+        """
+        _simulate('Prefs.import_from_file')
+        import plistlib
+        Prefs.imported.append(plistlib.readPlist(pathname).get('name-string'))
+    import_from_file = staticmethod(import_from_file)
+
+    def list_collections(of_class):
+        """list_collections(of_class) -> list
+        """
+        _simulate('Prefs.list_collections')
+        return list(Prefs.collections.get(of_class, ()))
+    list_collections = staticmethod(list_collections)
+
+    def set_current_macros(new_set):
+        """set_current_macros(new_set) -> None
+        """
+        _simulate('Prefs.set_current_macros')
+        Prefs._current_macros = new_set
+    set_current_macros = staticmethod(set_current_macros)
+
+class Session(object):
+    """Stand-in for quills.Session; the arguments of every
+    Session ever created are added to the list "Session.created",
+    and each construction first waits for "Session.delay"
+    seconds (zero by default) to simulate opening a window.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> del Session.created[:]
+    >>> s = Session(['/bin/ls', '-l'])
+    >>> Session.created
+    [['/bin/ls', '-l']]
+
+    """
+    created = list()
+    delay = 0.0
+
+    def __init__(self, args):
+        _simulate('Session', Session.delay)
+        self.args = list(args)
+        Session.created.append(self.args)
+
+    def _on_seekpidscwds_call(callback):
+        """_on_seekpidscwds_call(callback) -> None
+        """
+        pass
+    _on_seekpidscwds_call = staticmethod(_on_seekpidscwds_call)
+
+    def handle_file(pathname):
+        """handle_file(pathname) -> None
+        """
+        _simulate('Session.handle_file')
+    handle_file = staticmethod(handle_file)
+
+    def handle_url(url):
+        """handle_url(url) -> None
+        """
+        _simulate('Session.handle_url')
+    handle_url = staticmethod(handle_url)
+
+    def on_fileopen_call(callback, file_extension):
+        """on_fileopen_call(callback, file_extension) -> None
+        """
+        _simulate('Session.on_fileopen_call')
+    on_fileopen_call = staticmethod(on_fileopen_call)
+
+    def on_new_call(callback):
+        """on_new_call(callback) -> None
+        """
+        pass
+    on_new_call = staticmethod(on_new_call)
+
+    def on_urlopen_call(callback, url_scheme):
+        """on_urlopen_call(callback, url_scheme) -> None
+        """
+        _simulate('Session.on_urlopen_call')
+    on_urlopen_call = staticmethod(on_urlopen_call)
+
+    def set_keep_alive_transmission(string):
+        """set_keep_alive_transmission(string) -> None
+        """
+        pass
+    set_keep_alive_transmission = staticmethod(set_keep_alive_transmission)
+
+class Terminal(object):
+    """Stand-in for quills.Terminal.
+    """
+
+    def on_seekword_call(callback):
+        """on_seekword_call(callback) -> None
+        """
+        pass
+    on_seekword_call = staticmethod(on_seekword_call)
+
+    def set_dumb_string_for_char(unicode, rendering_utf8):
+        """set_dumb_string_for_char(unicode, rendering_utf8) -> None
+        """
+        pass
+    set_dumb_string_for_char = staticmethod(set_dumb_string_for_char)
+
+    def set_dumb_strings_for_chars(renderings_utf8, first_char=0):
+        """set_dumb_strings_for_chars(renderings_utf8, first_char=0) -> None
+        """
+        pass
+    set_dumb_strings_for_chars = staticmethod(set_dumb_strings_for_chars)
+
+def call_stats():
+    """call_stats() -> dict
+
+    Return a dictionary that maps the name of each recorded
+    call to a pair: the number of calls, and their total time
+    in seconds.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> reset_calls()
+    >>> latency['Session'] = 0.01
+    >>> for i in range(3):
+    ...     ignored = Session(['/bin/ls'])
+    >>> del latency['Session']
+    >>> (count, seconds) = call_stats()['Session']
+    >>> count, seconds >= 0.03
+    (3, True)
+
+    """
+    result = dict()
+    for (name, seconds) in calls:
+        (count, total) = result.get(name, (0, 0.0))
+        result[name] = (count + 1, total + seconds)
+    return result
+
+def install():
+    """install() -> module
+
+    Return the real Quills module if it can be imported, or
+    otherwise arrange for "import quills" to import this
+    module instead, and return this module.
+
+    """
+    try:
+        import quills
+    except ImportError:
+        quills = sys.modules[__name__]
+        sys.modules['quills'] = quills
+    return quills
+
+def reset_calls():
+    """reset_calls() -> None
+
+    Forget all recorded calls.
+
+    """
+    del calls[:]
+
+def _test():
+    """Runs all of this module's "doctest" test cases.
+    """
+    import doctest
+    from . import quills_stub
+    return doctest.testmod(quills_stub)
+
+if __name__ == '__main__':
+    _test()
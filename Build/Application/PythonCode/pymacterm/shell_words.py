@@ -0,0 +1,194 @@
+#!/usr/bin/python
+# vim: set fileencoding=UTF-8 :
+
+"""Routines to split command lines into arguments, like a POSIX shell.
+
+The rules are those of "shlex.split()" (without comments): words are
+separated by spaces, tabs and new-lines; a backslash outside of quotes
+escapes any character; nothing is special between single quotes; and
+between double quotes, a backslash only escapes a double quote or another
+backslash.  Variables, globs and other shell expansions are not performed.
+
+Since the same commands tend to be split many times, results are kept in a
+small cache.
+
+clear_split_cache -- forget all commands that split() has seen recently
+set_split_cache_capacity -- change how many commands split() remembers
+split -- return a tuple of the words in a command line
+split_cache_stats -- return hit and miss counts for the split() cache
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__author__ = 'Kevin Grant <kmg@mac.com>'
+__date__ = '18 October 2026'
+__version__ = '4.0.0'
+
+import re
+
+from .utilities import \
+    LRUCache, \
+    sort_dict as _sort_dict
+
+# each match is one piece of a word, or the space between words; quotes
+# and backslashes that are not part of a complete piece are errors
+_PIECE = re.compile(r'''(?P<space>[ \t\r\n]+)
+                       |(?P<plain>[^ \t\r\n'"\\]+)
+                       |'(?P<single>[^']*)'
+                       |"(?P<double>(?:[^"\\]|\\.)*)"
+                       |\\(?P<escaped>.)
+                       |(?P<error>.)''', re.S | re.X)
+_DOUBLE_QUOTED_ESCAPE = re.compile(r'\\(["\\])')
+_UNCLOSED_DOUBLE_QUOTED = re.compile(r'(?:[^\\]|\\.)*', re.S)
+
+# see split()
+_split_cache = LRUCache(capacity=256)
+
+def _split_uncached(command):
+    """_split_uncached(command) -> tuple
+
+    Implementation of split(), which does not use the cache.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> _split_uncached('ls -l')
+    ('ls', '-l')
+
+    >>> _split_uncached('  echo  "a  b"c  ')
+    ('echo', 'a  bc')
+
+    """
+    if isinstance(command, str) and '"' not in command and \
+            "'" not in command and '\\' not in command and \
+            '\v' not in command and '\f' not in command:
+        # common case: no quoting at all (and only the white space
+        # that is also recognized by str.split())
+        return tuple(command.split())
+    result = list()
+    word = None
+    for match in _PIECE.finditer(command):
+        kind = match.lastgroup
+        if kind == 'space':
+            if word is not None:
+                result.append(word)
+                word = None
+            continue
+        if kind == 'error':
+            char = match.group(kind)
+            if char == '"':
+                # like "shlex", complain first about a final backslash
+                rest = command[match.end():]
+                if _UNCLOSED_DOUBLE_QUOTED.match(rest).end() < len(rest):
+                    char = '\\'
+            if char == '\\':
+                raise ValueError("No escaped character")
+            raise ValueError("No closing quotation")
+        piece = match.group(kind)
+        if kind == 'double' and '\\' in piece:
+            piece = _DOUBLE_QUOTED_ESCAPE.sub(r'\1', piece)
+        if word is None:
+            word = piece
+        else:
+            word = word + piece
+    if word is not None:
+        result.append(word)
+    return tuple(result)
+
+def clear_split_cache():
+    """clear_split_cache() -> None
+
+    Forget every command that split() has seen recently, and
+    reset the hit and miss counts.
+
+    """
+    _split_cache.clear(reset_stats=True)
+
+def set_split_cache_capacity(command_count):
+    """set_split_cache_capacity(command_count) -> None
+
+    Change the maximum number of commands that split() will
+    remember.  Raise ValueError if the count is less than 1.
+
+    """
+    _split_cache.set_capacity(command_count)
+
+def split(command):
+    """split(command) -> tuple
+
+    Return the words in the given command line, as they would
+    be given to a program by a POSIX shell (see above), with
+    the same results as "tuple(shlex.split(command))".
+
+    Raise ValueError if a quotation is not closed or if the
+    command ends with a backslash.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> split('/usr/bin/ssh -p 22 example.com')
+    ('/usr/bin/ssh', '-p', '22', 'example.com')
+
+    >>> split('open "My Documents/a file.txt"')
+    ('open', 'My Documents/a file.txt')
+
+    >>> split("echo 'single \\\\ \\"quotes\\"' and\\\\ escape")
+    ('echo', 'single \\\\ "quotes"', 'and escape')
+
+    >>> split('echo "double \\\\"quote\\\\" \\\\\\\\ \\\\n"')
+    ('echo', 'double "quote" \\\\ \\\\n')
+
+    >>> split("empty '' \\"\\" words")
+    ('empty', '', '', 'words')
+
+    >>> split('')
+    ()
+
+    >>> try:
+    ...     split('echo "unfinished')
+    ... except ValueError as e:
+    ...     print(e)
+    No closing quotation
+
+    >>> try:
+    ...     split('echo backslash\\\\')
+    ... except ValueError as e:
+    ...     print(e)
+    No escaped character
+
+    """
+    result = _split_cache.get(command)
+    if result is None:
+        result = _split_uncached(command)
+        _split_cache.put(command, result)
+    return result
+
+def split_cache_stats():
+    """split_cache_stats() -> dict
+
+    Return a dictionary describing the cache of commands used by
+    split(), with keys 'hits', 'misses', 'size' (number of
+    commands now remembered) and 'capacity'.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> clear_split_cache()
+    >>> split('ls -l')
+    ('ls', '-l')
+    >>> split('ls -l')
+    ('ls', '-l')
+    >>> _sort_dict(split_cache_stats())
+    'capacity:256 hits:1 misses:1 size:1'
+
+    """
+    return _split_cache.stats()
+
+def _test():
+    """Runs all of this module's "doctest" test cases.
+    """
+    import doctest
+    from . import shell_words
+    return doctest.testmod(shell_words)
+
+if __name__ == '__main__':
+    _test()
@@ -0,0 +1,418 @@
+#!/usr/bin/python
+# vim: set fileencoding=UTF-8 :
+
+"""Routines to share one SSH connection among sessions for the same server.
+
+Opening an "ssh" or "sftp" session normally requires a complete network
+connection and authentication, which can take seconds.  With connection
+multiplexing, the first session for a server (the "master") leaves a
+control socket, and later sessions use the master's connection instead,
+starting almost immediately.  A Multiplexer chooses a control socket for
+each (user, host, port) and set of other SSH options (so that sessions
+with a different identity or route never share a master), and returns
+"ssh" options that use it.
+
+Control sockets are kept in a directory that only the current user can
+access.  Their names are short hashes, since socket names are limited to
+about 100 bytes (and "ssh" adds a suffix while creating one); a small
+".target" file beside each socket records the server that it is for.
+Sockets whose masters have exited are removed automatically.
+
+Multiplexing is off until enable() is called; after that, url_open uses
+the Multiplexer for every "ssh://" and "sftp://" URL.  (URLs cannot set
+these options themselves; see url_parse.)
+
+Multiplexer -- choose control sockets and options for SSH servers
+disable -- stop using a Multiplexer for new sessions
+enable -- use a new Multiplexer for new sessions, and return it
+get_multiplexer -- return the Multiplexer given by enable(), or None
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__author__ = 'Kevin Grant <kmg@mac.com>'
+__date__ = '18 October 2026'
+__version__ = '4.0.0'
+
+import errno
+import hashlib
+import os
+import re
+import socket
+import stat
+import subprocess
+import tempfile
+import threading
+import time
+
+# see Multiplexer; the longest name that a Unix-domain socket can have
+# on macOS, less the suffix that "ssh" adds to a new control socket
+# (".XXXXXXXXXXXXXXXX") before renaming it
+_MAX_SOCKET_PATH = 103 - 17
+
+# see Multiplexer; the number of hex digits in a control socket name
+_NAME_DIGITS = 16
+
+# see Multiplexer.collect_garbage(); a ".target" file without a socket
+# is kept for this long, since its master may still be connecting
+_TARGET_GRACE_SECONDS = 120
+
+# see Multiplexer.option_args(); the least time between automatic
+# garbage collections
+_COLLECT_INTERVAL_SECONDS = 60
+
+# see Multiplexer.control_path(); users and hosts are command arguments
+# and are written to ".target" files, one per line
+_UNSAFE_NAME = re.compile(r'\A-|[\s\x00-\x1f\x7f]')
+
+# see enable()
+_current = None
+
+def _default_directory():
+    """_default_directory() -> str
+
+    Return the directory for control sockets when none is given
+    to Multiplexer: "MacTerm-<uid>" in the temporary directory,
+    or in "/tmp" if the temporary directory name is too long.
+
+    """
+    name = 'MacTerm-%d' % os.getuid()
+    result = os.path.join(tempfile.gettempdir(), name)
+    if len(result) + 1 + _NAME_DIGITS > _MAX_SOCKET_PATH:
+        result = os.path.join('/tmp', name)
+    return result
+
+def _is_live(pathname):
+    """_is_live(pathname) -> bool
+
+    Return True only if something is accepting connections on
+    the given Unix-domain socket (for a control socket, this
+    means that its master is running).
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> _is_live('/nonexistent/socket')
+    False
+
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.settimeout(1.0)
+        client.connect(pathname)
+        return True
+    except (socket.error, socket.timeout) as _:
+        return False
+    finally:
+        client.close()
+
+def _make_private_directory(pathname):
+    """_make_private_directory(pathname) -> None
+
+    Create the given directory with mode 0700 if it does not
+    exist.  Raise ValueError if it exists and is not a real
+    directory owned by the current user; any access by other
+    users is removed.
+
+    """
+    try:
+        os.makedirs(pathname, 0o700)
+    except OSError as _:
+        if _.errno != errno.EEXIST:
+            raise
+    info = os.lstat(pathname)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise ValueError("unsafe directory for SSH control sockets: %s" %
+                         pathname)
+    if stat.S_IMODE(info.st_mode) != 0o700:
+        os.chmod(pathname, 0o700)
+
+class Multiplexer(object):
+    """Choose a control socket for each SSH server, in a private
+    directory, and find the "ssh" options that use it.
+
+    The directory is created if necessary (with mode 0700).  By
+    default, it is "MacTerm-<uid>" in the temporary directory.
+    Raise ValueError if the directory is not private, or if its
+    name is too long for sockets.
+
+    A master stays running for "persist" (an "ssh" time, such
+    as "10m" or "600") after its last session ends, so that a
+    new session can still use it.  The "ssh_command" is used to
+    control masters (see stop()).
+
+    collect_garbage -- remove sockets and files of masters that exited
+    control_path -- return the control socket for a server
+    is_live -- return True if a server has a running master
+    live_masters -- return every server that has a running master
+    option_args -- return "ssh" arguments that use the control socket
+    stop -- ask the master for a server to exit
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> import shutil
+    >>> directory = os.path.join(tempfile.mkdtemp(), 'sockets')
+    >>> mux = Multiplexer(directory=directory, ssh_command='true')
+    >>> oct(stat.S_IMODE(os.stat(directory).st_mode))[-3:]
+    '700'
+    >>> path = mux.control_path('me', 'bastion.example.com', 22)
+    >>> path == mux.control_path('me', 'bastion.example.com', 22)
+    True
+    >>> path == mux.control_path(None, 'bastion.example.com', 22)
+    False
+    >>> path == mux.control_path('me', 'bastion.example.com', 22,
+    ...                          (('IdentityFile', '~/.ssh/other'),))
+    False
+    >>> try:
+    ...     mux.control_path('me', 'evil\\nhost', 22)
+    ... except ValueError as e:
+    ...     print(e)
+    unsafe host for SSH control socket: 'evil\\nhost'
+    >>> mux._stop_args('me', 'bastion.example.com', 22, None)[-2:]
+    ['--', 'bastion.example.com']
+    >>> len(os.path.basename(path))
+    16
+    >>> [x.replace(path, 'P') for x in
+    ...  mux.option_args('me', 'bastion.example.com', 22)]
+    ['-oControlMaster=auto', '-oControlPath=P', '-oControlPersist=10m']
+
+    A listening socket stands in for a running master:
+
+    >>> master = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    >>> master.bind(path)
+    >>> master.listen(1)
+    >>> mux.is_live('me', 'bastion.example.com', 22)
+    True
+    >>> mux.live_masters()
+    [('me', 'bastion.example.com', 22)]
+    >>> mux.stop('me', 'bastion.example.com', 22)
+    True
+
+    Once it exits, its files are garbage:
+
+    >>> master.close()
+    >>> mux.live_masters()
+    []
+    >>> mux.collect_garbage()
+    1
+    >>> os.listdir(directory) == [os.path.basename(path) + '.target']
+    True
+    >>> shutil.rmtree(os.path.dirname(directory))
+
+    >>> try:
+    ...     Multiplexer(directory='/%s' % ('x' * 100))
+    ... except ValueError as e:
+    ...     print(str(e)[:46])
+    directory name is too long for SSH control soc
+
+    """
+
+    def __init__(self, directory=None, persist='10m',
+                 ssh_command='/usr/bin/ssh'):
+        if directory is None:
+            directory = _default_directory()
+        if len(directory) + 1 + _NAME_DIGITS > _MAX_SOCKET_PATH:
+            raise ValueError("directory name is too long for SSH control "
+                             "sockets: %s" % directory)
+        _make_private_directory(directory)
+        self.directory = directory
+        self.persist = persist
+        self.ssh_command = ssh_command
+        self._lock = threading.Lock()
+        self._next_collection = 0
+
+    def _stop_args(self, user, host, port, options):
+        """Return the command that stop() runs.
+        """
+        control_path = self.control_path(user, host, port, options)
+        args = [self.ssh_command, '-O', 'exit',
+                '-oControlPath=%s' % control_path]
+        if user is not None:
+            args.extend(['-l', user])
+        if port is not None:
+            args.extend(['-p', str(port)])
+        # ("--" ensures that the host is never seen as an option)
+        args.extend(['--', host])
+        return args
+
+    def _target_path(self, control_path):
+        """Return the name of the file that records the server
+        for the given control socket.
+        """
+        return control_path + '.target'
+
+    def _targets(self):
+        """Return pairs of control socket names and (user, host,
+        port) tuples, for every ".target" file.
+        """
+        result = list()
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith('.target'):
+                continue
+            control_path = os.path.join(self.directory, name[:-7])
+            try:
+                with open(self._target_path(control_path)) as ifh:
+                    (user, host, port) = ifh.read().split('\n')[:3]
+            except (IOError, OSError, ValueError) as _:
+                continue
+            result.append((control_path, (user or None, host,
+                                          int(port) if port else None)))
+        return result
+
+    def collect_garbage(self):
+        """collect_garbage() -> int
+
+        Remove every control socket whose master is no longer
+        running, along with its ".target" file (a ".target" file
+        without any socket is only removed after a short time,
+        in case a master is starting).  Return the number of
+        sockets removed.
+
+        """
+        count = 0
+        now = time.time()
+        with self._lock:
+            for name in os.listdir(self.directory):
+                pathname = os.path.join(self.directory, name)
+                try:
+                    info = os.lstat(pathname)
+                except OSError as _:
+                    continue
+                if stat.S_ISSOCK(info.st_mode):
+                    if not _is_live(pathname):
+                        os.remove(pathname)
+                        count = count + 1
+                elif name.endswith('.target'):
+                    if not os.path.exists(pathname[:-7]) and \
+                            now - info.st_mtime > _TARGET_GRACE_SECONDS:
+                        os.remove(pathname)
+            self._next_collection = now + _COLLECT_INTERVAL_SECONDS
+        return count
+
+    def control_path(self, user, host, port, options=None):
+        """control_path(user, host, port, options=None) -> str
+
+        Return the control socket name for the given server (the
+        user and port may be None, for the "ssh" defaults) and
+        other SSH options (such as url_parse.URL.options), which
+        are different if the options are different.  The socket
+        may not exist.  Raise ValueError if the user or host is
+        not safe to give to "ssh" (for instance, if it contains
+        a newline).
+
+        """
+        for (description, value) in (('user', user), ('host', host)):
+            if value is not None and _UNSAFE_NAME.search(value) is not None:
+                raise ValueError("unsafe %s for SSH control socket: %r" %
+                                 (description, value))
+        key = "%s@%s:%s %r" % (user or '', host, port or '',
+                               tuple(options or ()))
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()[:_NAME_DIGITS]
+        return os.path.join(self.directory, name)
+
+    def is_live(self, user, host, port, options=None):
+        """is_live(user, host, port, options=None) -> bool
+
+        Return True only if the master for the given server and
+        options is running.
+
+        """
+        return _is_live(self.control_path(user, host, port, options))
+
+    def live_masters(self):
+        """live_masters() -> list
+
+        Return a (user, host, port) tuple for every server whose
+        master is running, in no particular order (a server may
+        appear more than once, if masters use different options).
+
+        """
+        return [target for (control_path, target) in self._targets()
+                if _is_live(control_path)]
+
+    def option_args(self, user, host, port, options=None):
+        """option_args(user, host, port, options=None) -> list
+
+        Return "ssh" (or "sftp") arguments that share a master
+        for the given server and options, starting one if
+        necessary.  Stale sockets are also removed occasionally.
+
+        """
+        if time.time() >= self._next_collection:
+            self.collect_garbage()
+        control_path = self.control_path(user, host, port, options)
+        target_path = self._target_path(control_path)
+        if not os.path.exists(target_path):
+            with open(target_path, 'w') as ofh:
+                ofh.write("%s\n%s\n%s\n" % (user or '', host, port or ''))
+        return ['-oControlMaster=auto', '-oControlPath=%s' % control_path,
+                '-oControlPersist=%s' % self.persist]
+
+    def stop(self, user, host, port, options=None):
+        """stop(user, host, port, options=None) -> bool
+
+        Run "ssh -O exit" to make the master for the given server
+        and options exit (once its sessions end), and return True
+        only if the command succeeds.
+
+        """
+        args = self._stop_args(user, host, port, options)
+        with open(os.devnull, 'w') as null:
+            return subprocess.call(args, stdout=null, stderr=null) == 0
+
+def disable():
+    """disable() -> None
+
+    Stop using a Multiplexer for new sessions.  Any running
+    masters continue until their sessions end.
+
+    """
+    global _current
+    _current = None
+
+def enable(directory=None, persist='10m', ssh_command='/usr/bin/ssh'):
+    """enable(directory=None, persist='10m',
+              ssh_command='/usr/bin/ssh') -> Multiplexer
+
+    Create a Multiplexer with the given options (see the class),
+    remove any stale sockets, and use it for all new "ssh" and
+    "sftp" sessions opened from URLs.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> import shutil
+    >>> mux = enable(directory=tempfile.mkdtemp())
+    >>> get_multiplexer() is mux
+    True
+    >>> disable()
+    >>> print(get_multiplexer())
+    None
+    >>> shutil.rmtree(mux.directory)
+
+    """
+    global _current
+    result = Multiplexer(directory=directory, persist=persist,
+                         ssh_command=ssh_command)
+    result.collect_garbage()
+    _current = result
+    return result
+
+def get_multiplexer():
+    """get_multiplexer() -> Multiplexer
+
+    Return the Multiplexer given by the most recent enable(), or
+    None if multiplexing is not enabled.
+
+    """
+    return _current
+
+def _test():
+    """Runs all of this module's "doctest" test cases.
+    """
+    import doctest
+    from . import ssh_mux
+    return doctest.testmod(ssh_mux)
+
+if __name__ == '__main__':
+    _test()
@@ -3,8 +3,16 @@
 
 """Routines to handle text in terminal screen buffers.
 
+Utf8Line -- class to map between byte and character offsets of UTF-8 text
+clear_word_cache -- forget all lines remembered by find_word()
+dumb_rendering_table -- renderings of every BMP character, for dumb terminals
+find_smart_word -- like find_word, but keep URLs, paths, addresses, etc. whole
 find_word -- scan around a starting point to find the range of the word
 get_dumb_rendering -- string to describe a Unicode character in a dumb terminal
+render_dumb -- string to describe an entire buffer of text in a dumb terminal
+set_word_breaks -- change which characters find_word() considers to be breaks
+set_word_cache_capacity -- change how many lines find_word() remembers
+word_cache_stats -- return hit and miss counts for the find_word() cache
 
 """
 from __future__ import absolute_import
@@ -15,11 +23,863 @@ __author__ = 'Kevin Grant <kmg@mac.com>'
 __date__ = '28 November 2010'
 __version__ = '4.0.0'
 
+from array import array
+from bisect import bisect_left, bisect_right
+import codecs
+import marshal
+import re
 import string
+import sys
+import threading
+import unicodedata
 
 # note: Quills is a compiled module, library path must be set properly
 import quills
 
+from .utilities import \
+    LRUCache, \
+    sort_dict as _sort_dict
+
+# characters that separate words (see find_word() and set_word_breaks());
+# these are compiled once so that each double-click only scans the word
+# under the cursor
+_NONWORD_CHARS = frozenset()
+_NONWORD_RUN = None
+_WORD_RUN = None
+_NONWORD_SPAN = None
+
+# for get_dumb_rendering(), the standard abbreviations of C1 control
+# characters (0x80-0x9F) and of some other invisible characters
+_C1_CONTROL_NAMES = ('PAD', 'HOP', 'BPH', 'NBH', 'IND', 'NEL', 'SSA', 'ESA',
+                     'HTS', 'HTJ', 'VTS', 'PLD', 'PLU', 'RI', 'SS2', 'SS3',
+                     'DCS', 'PU1', 'PU2', 'STS', 'CCH', 'MW', 'SPA', 'EPA',
+                     'SOS', 'SGCI', 'SCI', 'CSI', 'ST', 'OSC', 'PM', 'APC')
+_DUMB_ABBREVIATIONS = {0xA0: 'NBSP', 0xAD: 'SHY', 0x200B: 'ZWSP',
+                       0x200C: 'ZWNJ', 0x200D: 'ZWJ', 0x200E: 'LRM',
+                       0x200F: 'RLM', 0x2028: 'LSEP', 0x2029: 'PSEP',
+                       0x2060: 'WJ', 0xFEFF: 'BOM'}
+
+# see dumb_rendering_table(); files are only reused for the same data
+_dumb_rendering_table = None
+_DUMB_TABLE_KEY = ('dumb-rendering-table', 1, unicodedata.unidata_version)
+
+# see render_dumb(); text is rendered by looking up each UTF-16 code
+# unit in the table, unless surrogates or (on "wide" Python builds)
+# characters beyond the BMP are present, in which case a mapping of
+# code points to renderings (omitting every character that is
+# rendered as itself) is given to unicode.translate() instead
+_dumb_translation = None
+_NATIVE_UTF16 = ('utf-16-le' if sys.byteorder == 'little' else 'utf-16-be')
+if sys.maxunicode > 0xFFFF:
+    _NON_BMP = re.compile(u'[\ud800-\udfff%s-%s]' %
+                          (unichr(0x10000), unichr(sys.maxunicode)))
+else:
+    _NON_BMP = re.compile(u'[\ud800-\udfff]')
+
+# number of characters initially examined when scanning backwards
+_BACKWARD_WINDOW = 64
+
+# punctuation that is never considered part of the end of a word
+_TRAILING_PUNCTUATION = frozenset(u'.,;:')
+
+# pairs of characters that are stripped when they surround a word
+_END_CAPS = frozenset([(u'"', u'"'), (u"'", u"'"), (u'`', u'`'),
+                       (u'`', u"'"), (u'<', u'>'), (u'(', u')'),
+                       (u'[', u']'), (u'{', u'}')])
+
+# for find_smart_word(), the recognized kinds of tokens; these are combined
+# into one pattern that is applied only to the whitespace-delimited part of
+# the line around the click (ordered so that more specific kinds win); all
+# but bracketed IPv6 addresses share one look-behind assertion, so that most
+# positions inside words are rejected by a single test
+_SMART_TOKEN_KINDS = (
+    ('url', u"[A-Za-z][A-Za-z0-9+.-]*://[^\\s<>\"'`]*[^\\s<>\"'`.,;:!?)\\]}]"),
+    ('ipv4', u"(?:[\\w.+-]+@)?(?:[0-9]{1,3}\\.){3}[0-9]{1,3}"
+             u"(?::[0-9]{1,5})?(?![\\w.])"),
+    ('ipv6', u"(?<!:)(?:(?:[0-9A-Fa-f]{1,4}:){7}[0-9A-Fa-f]{1,4}|"
+             u"(?:[0-9A-Fa-f]{1,4}(?::[0-9A-Fa-f]{1,4})*)?::"
+             u"(?:[0-9A-Fa-f]{1,4}(?::[0-9A-Fa-f]{1,4})*)?)(?![\\w:])"),
+    ('host_port', u"(?:[\\w.+-]+@)?[A-Za-z0-9](?:[A-Za-z0-9-]*[A-Za-z0-9])?"
+                  u"(?:\\.[A-Za-z0-9](?:[A-Za-z0-9-]*[A-Za-z0-9])?)*"
+                  u":[0-9]{1,5}(?![\\w])"),
+    ('path', u"(?:~[\\w.-]*|\\.{1,2}|[\\w.@+-]+)?(?:/[\\w.@%+=~,:-]+)+/?"
+             u"(?<![.,;:])|~[\\w.-]*(?=[\\s]|$)"),
+    ('hash', u"(?=[a-f]*[0-9])[0-9a-f]{7,64}(?![0-9A-Za-z])"),
+)
+_SMART_TOKEN = re.compile(u"(?P<ipv6_b>\\[[0-9A-Fa-f:.]+(?:%%[0-9A-Za-z]+)?\\]"
+                          u"(?::[0-9]{1,5})?)|(?<![\\w.@+~-])(?:%s)" %
+                          u'|'.join([u'(?P<%s>%s)' % (name, expr)
+                                     for (name, expr) in _SMART_TOKEN_KINDS]),
+                          re.UNICODE)
+_SMART_TOKEN_REACH = 256
+_SMART_SPACE_CHARS = frozenset(unicode(string.whitespace))
+_SMART_TEXT_RUN = re.compile(u'[^%s]*' % re.escape(string.whitespace),
+                             re.UNICODE)
+
+def _run_bounds(ustr, pos, run_re):
+    """_run_bounds(ustr, pos, run_re) -> (first, past_end)
+
+    Return the range of the run of characters matching the
+    given compiled pattern (one of the "_..._RUN" patterns)
+    that includes the character at the given offset.
+
+    The search backwards uses reversed windows of increasing
+    size so that the cost is proportional to the length of
+    the run and not the length of the string.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> _run_bounds(u"this is a sentence", 1, _WORD_RUN)
+    (0, 4)
+
+    >>> _run_bounds(u"  well   spaced  ", 7, _NONWORD_RUN)
+    (6, 9)
+
+    >>> _run_bounds(u"x" * 1000, 500, _WORD_RUN)
+    (0, 1000)
+
+    """
+    past_end = run_re.match(ustr, pos).end()
+    window = _BACKWARD_WINDOW
+    while True:
+        low = max(0, pos - window)
+        behind = ustr[low:pos + 1][::-1]
+        length = run_re.match(behind).end()
+        if length < len(behind) or low == 0:
+            break
+        window = window * 4
+    return (pos + 1 - length, past_end)
+
+# positions of bytes that could not be decoded by the most recent call to
+# Utf8Line() in each thread (see _record_invalid_utf8())
+_invalid_utf8 = threading.local()
+
+def _record_invalid_utf8(err):
+    """_record_invalid_utf8(err) -> (unicode, int)
+
+    Codec error handler that replaces exactly one undecodable
+    byte with U+FFFD, and records the byte offset so that the
+    replacement is not mistaken for a 3-byte sequence.
+
+    """
+    positions = getattr(_invalid_utf8, 'positions', None)
+    if positions is not None:
+        positions.append(err.start)
+    return (u'\ufffd', err.start + 1)
+
+codecs.register_error('pymacterm.term_text', _record_invalid_utf8)
+
+# runs of code units that have the same UTF-8 length (1, 2 or 3 bytes);
+# anything else (surrogates, or non-BMP characters in wide builds) is
+# handled one code unit at a time
+_UTF8_WIDTH_RUN = re.compile(u'([\x00-\x7f]+)|([\x80-\u07ff]+)|'
+                             u'([\u0800-\ud7ff\ue000-\uffff]+)', re.UNICODE)
+
+class Utf8Line(object):
+    """The decoded form of a line of UTF-8 bytes, with tables to
+    convert between byte offsets and character offsets (where
+    a "character" is a unit of the Python Unicode string).
+
+    Decoding is deterministic: each byte that is not part of a
+    valid sequence becomes exactly one U+FFFD character, so
+    that invalid input cannot shift the offsets of the other
+    characters unpredictably.  Offset tables are compact arrays
+    that are only created the first time they are needed (and
+    not at all for pure ASCII), after which each conversion
+    takes constant time.
+
+    byte_offset -- return the byte offset where a character begins
+    char_offset -- return the offset of the character with a given byte
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> x = Utf8Line('caf\\xc3\\xa9 \\xe2\\x82\\xac5')
+    >>> x.text
+    u'caf\\xe9 \\u20ac5'
+    >>> [x.byte_offset(i) for i in range(len(x.text) + 1)]
+    [0, 1, 2, 3, 5, 6, 9, 10]
+    >>> [x.char_offset(i) for i in range(len(x.utf8) + 1)]
+    [0, 1, 2, 3, 3, 4, 5, 5, 5, 6, 7]
+
+    >>> x = Utf8Line('a\\xffb\\xe2\\x82')
+    >>> x.text
+    u'a\\ufffdb\\ufffd\\ufffd'
+    >>> [x.byte_offset(i) for i in range(len(x.text) + 1)]
+    [0, 1, 2, 3, 4, 5]
+
+    >>> x = Utf8Line('\\xef\\xbf\\xbd\\xff')
+    >>> [x.byte_offset(i) for i in range(len(x.text) + 1)]
+    [0, 3, 4]
+
+    """
+    __slots__ = ('text', 'utf8', '_invalid', '_char_to_byte', '_byte_to_char')
+
+    def __init__(self, text_utf8):
+        """Utf8Line(text_utf8) -> Utf8Line
+
+        Decode the given string of UTF-8 bytes.
+
+        """
+        self.utf8 = text_utf8
+        self._char_to_byte = None
+        self._byte_to_char = None
+        _invalid_utf8.positions = []
+        try:
+            self.text = unicode(text_utf8, "utf-8", "pymacterm.term_text")
+            self._invalid = _invalid_utf8.positions
+        finally:
+            _invalid_utf8.positions = None
+
+    def _build_tables(self):
+        """_build_tables() -> None
+
+        Create the arrays for byte_offset() and char_offset().
+        Most of the work is done by array operations on runs of
+        characters that have the same UTF-8 length.
+
+        """
+        char_to_byte = array('i')
+        byte_to_char = array('i')
+        text = self.text
+        (unit, byte) = (0, 0)
+        while unit < len(text):
+            count = 0
+            bad = bisect_left(self._invalid, byte)
+            if bad == len(self._invalid) or self._invalid[bad] != byte:
+                match = _UTF8_WIDTH_RUN.match(text, unit)
+                if match is not None:
+                    width = match.lastindex
+                    count = match.end() - unit
+                    # the replacement for an invalid byte is a 1-byte
+                    # character that would otherwise appear to be 3 bytes
+                    if bad < len(self._invalid) and \
+                       self._invalid[bad] < (byte + count * width):
+                        count = (self._invalid[bad] - byte) // width
+            if count > 0:
+                size = count * width
+                char_to_byte.extend(range(byte, byte + size, width))
+                chars = array('i', range(unit, unit + count))
+                start = len(byte_to_char)
+                byte_to_char.extend(chars * width)
+                for i in range(width):
+                    byte_to_char[start + i:start + size:width] = chars
+                unit = unit + count
+                byte = byte + size
+            else:
+                # one invalid byte, surrogate or non-BMP character
+                if bad < len(self._invalid) and self._invalid[bad] == byte:
+                    width = 1
+                else:
+                    lead = ord(self.utf8[byte])
+                    width = 1 + (lead >= 0xC0) + (lead >= 0xE0) + \
+                            (lead >= 0xF0)
+                char_to_byte.append(byte)
+                byte_to_char.extend(array('i', [unit]) * width)
+                if width == 4 and (unit + 1) < len(text) and \
+                   u'\ud800' <= text[unit] < u'\udc00':
+                    # narrow build: both halves of a surrogate pair
+                    # represent the same 4-byte sequence
+                    char_to_byte.append(byte)
+                    unit = unit + 1
+                unit = unit + 1
+                byte = byte + width
+        char_to_byte.append(byte)
+        byte_to_char.append(unit)
+        self._char_to_byte = char_to_byte
+        self._byte_to_char = byte_to_char
+
+    def byte_offset(self, char_offset):
+        """byte_offset(char_offset) -> int
+
+        Return the offset of the first byte of the character at
+        the given offset; the length of the text is converted to
+        the total number of bytes.  Raise IndexError if the
+        offset is out of range.
+
+        """
+        if len(self.text) == len(self.utf8):
+            if not 0 <= char_offset <= len(self.text):
+                raise IndexError("character offset out of range")
+            return char_offset
+        if self._char_to_byte is None:
+            self._build_tables()
+        if char_offset < 0:
+            raise IndexError("character offset out of range")
+        return self._char_to_byte[char_offset]
+
+    def char_offset(self, byte_offset):
+        """char_offset(byte_offset) -> int
+
+        Return the offset of the character that includes the
+        byte at the given offset; the total number of bytes is
+        converted to the length of the text.  Raise IndexError
+        if the offset is out of range.
+
+        """
+        if len(self.text) == len(self.utf8):
+            if not 0 <= byte_offset <= len(self.utf8):
+                raise IndexError("byte offset out of range")
+            return byte_offset
+        if self._byte_to_char is None:
+            self._build_tables()
+        if byte_offset < 0:
+            raise IndexError("byte offset out of range")
+        return self._byte_to_char[byte_offset]
+
+class _LineIndex(Utf8Line):
+    """A line given to find_word(), decoded by Utf8Line, and
+    (once the line has been seen more than once) the sorted
+    offsets where each run of word or non-word characters
+    begins, so that repeated clicks only need a binary search.
+
+    run_bounds -- return the range of the run that includes an offset
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> x = _LineIndex("  well   spaced  ")
+    >>> x.run_bounds(3)
+    (2, 6)
+    >>> x.uses = 2
+    >>> x.run_bounds(3)
+    (2, 6)
+    >>> x.run_bounds(0)
+    (0, 2)
+    >>> x.run_bounds(16)
+    (15, 17)
+    >>> list(x.run_starts)
+    [0, 2, 6, 9, 15]
+
+    """
+    __slots__ = ('run_starts', 'uses')
+
+    def __init__(self, text_utf8):
+        """_LineIndex(text_utf8) -> _LineIndex
+
+        Create an index for the given string of UTF-8 bytes,
+        which is not built until it is needed.
+
+        """
+        Utf8Line.__init__(self, text_utf8)
+        self.run_starts = None
+        self.uses = 0
+
+    def run_bounds(self, pos):
+        """run_bounds(pos) -> (first, past_end)
+
+        Like _run_bounds(), return the range of the run of
+        word or non-word characters that includes the given
+        character offset.  A line that has only been used once
+        is scanned directly; otherwise, the index is used (and
+        created if necessary).
+
+        """
+        if self.run_starts is None:
+            if self.uses < 2:
+                if self.text[pos] in _NONWORD_CHARS:
+                    return _run_bounds(self.text, pos, _NONWORD_RUN)
+                return _run_bounds(self.text, pos, _WORD_RUN)
+            bounds = [0]
+            for match in _NONWORD_SPAN.finditer(self.text):
+                bounds.extend(match.span())
+            if len(bounds) > 1 and bounds[1] == 0:
+                del bounds[1]
+            if bounds[-1] == len(self.text):
+                del bounds[-1]
+            self.run_starts = array('l', bounds)
+        i = bisect_right(self.run_starts, pos) - 1
+        if (i + 1) < len(self.run_starts):
+            return (self.run_starts[i], self.run_starts[i + 1])
+        return (self.run_starts[i], len(self.text))
+
+# lines recently given to find_word(), keyed by the original UTF-8 bytes;
+# the capacity limits how many lines (not how many bytes) are retained
+_word_cache = LRUCache(capacity=32)
+
+def _char_class(chars):
+    """_char_class(chars) -> unicode
+
+    Return the body of a regular expression character class
+    (without brackets) that matches any of the given Unicode
+    characters; consecutive code points are given as ranges
+    so that large sets remain compact.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> print(_char_class(u'cabxz'))
+    a-cxz
+
+    """
+    result = []
+    codes = sorted(set([ord(x) for x in chars]))
+    i = 0
+    while i < len(codes):
+        j = i
+        while (j + 1) < len(codes) and codes[j + 1] == (codes[j] + 1):
+            j = j + 1
+        if j > i:
+            result.append(u'%s-%s' % (re.escape(unichr(codes[i])),
+                                      re.escape(unichr(codes[j]))))
+        else:
+            result.append(re.escape(unichr(codes[i])))
+        i = j + 1
+    return u''.join(result)
+
+def _chars_in_categories(categories):
+    """_chars_in_categories(categories) -> frozenset
+
+    Return every character in the Basic Multilingual Plane
+    whose Unicode general category is one of the given names.
+    A name can be exact (such as "Pd", dash punctuation) or
+    one letter for all related categories (such as "P").
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> sorted(_chars_in_categories(['Zl', 'Zp']))
+    [u'\\u2028', u'\\u2029']
+
+    >>> u'-' in _chars_in_categories(['P'])
+    True
+
+    """
+    exact = frozenset([x for x in categories if len(x) == 2])
+    major = frozenset([x for x in categories if len(x) == 1])
+    result = []
+    for code in range(0x10000):
+        char = unichr(code)
+        category = unicodedata.category(char)
+        if category in exact or category[0] in major:
+            result.append(char)
+    return frozenset(result)
+
+def _compile_word_breaks(chars):
+    """_compile_word_breaks(chars) -> None
+
+    Make the given set of Unicode characters the only ones
+    that separate words, by replacing the compiled patterns
+    that find_word() relies on.  Lines already remembered by
+    find_word() are forgotten, since their indexes depend on
+    the previous set.
+
+    """
+    global _NONWORD_CHARS, _NONWORD_RUN, _WORD_RUN, _NONWORD_SPAN
+    char_class = _char_class(chars)
+    _NONWORD_CHARS = frozenset(chars)
+    _NONWORD_RUN = re.compile(u'[%s]*' % char_class, re.UNICODE)
+    _WORD_RUN = re.compile(u'[^%s]*' % char_class, re.UNICODE)
+    _NONWORD_SPAN = re.compile(u'[%s]+' % char_class, re.UNICODE)
+    _word_cache.clear()
+
+def _dumb_rendering(ord_unicode_16):
+    """_dumb_rendering(ord_unicode_16) -> text_utf8
+
+    Implementation of get_dumb_rendering(), which does not
+    use the table from dumb_rendering_table().
+
+    """
+    result = '<?>' # must use UTF-8 encoding
+    if ord_unicode_16 < 128:
+        as_ascii = ord_unicode_16
+        if as_ascii == 27:
+            result = '<ESC>'
+        # a "proper" control symbol is preferred, but MacTerm cannot render
+        # higher Unicode characters just yet...
+        #elif as_ascii < ord(' '):
+        #    result = '⌃%c' % chr(ord('@') + as_ascii)
+        elif as_ascii < ord(' '):
+            result = '^%c' % chr(ord('@') + as_ascii)
+        elif chr(as_ascii) in string.printable:
+            result = chr(as_ascii)
+        else: result = '<%i>' % as_ascii
+    elif ord_unicode_16 < 0xA0:
+        result = '<%s>' % _C1_CONTROL_NAMES[ord_unicode_16 - 0x80]
+    elif ord_unicode_16 in _DUMB_ABBREVIATIONS:
+        result = '<%s>' % _DUMB_ABBREVIATIONS[ord_unicode_16]
+    else:
+        char = unichr(ord_unicode_16)
+        category = unicodedata.category(char)
+        if category[0] in 'LNPS' or category == 'Mc':
+            result = char.encode('utf-8')
+        elif category[0] in 'MZ' or category == 'Cf':
+            result = '<%s>' % unicodedata.name(char, 'u%i' % ord_unicode_16)
+        else:
+            result = '<u%i>' % ord_unicode_16
+    return result
+
+def _dumb_translation_map():
+    """_dumb_translation_map() -> dict
+
+    Return a mapping suitable for unicode.translate() that
+    gives the rendering of each character in the table from
+    dumb_rendering_table(), as Unicode.  Characters rendered
+    as themselves are left out so that they are copied as-is,
+    and so are surrogates (which may be part of a valid pair).
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> m = _dumb_translation_map()
+    >>> m[27], m[0x9B]
+    (u'<ESC>', u'<CSI>')
+    >>> 97 in m, 0xE9 in m, 0xD800 in m
+    (False, False, False)
+
+    """
+    global _dumb_translation
+    if _dumb_translation is None:
+        result = dict()
+        for code, rendering in enumerate(dumb_rendering_table()):
+            if 0xD800 <= code <= 0xDFFF:
+                continue
+            as_unicode = rendering.decode('utf-8')
+            if as_unicode != unichr(code):
+                result[code] = as_unicode
+        _dumb_translation = result
+    return _dumb_translation
+
+def _load_dumb_rendering_table(pathname):
+    """_load_dumb_rendering_table(pathname) -> tuple
+
+    Return the table saved by _save_dumb_rendering_table(), or
+    None if the file does not exist, cannot be read, or was
+    saved for a different version of the Unicode data.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> import os, tempfile
+    >>> (fd, path) = tempfile.mkstemp()
+    >>> os.close(fd)
+    >>> print(_load_dumb_rendering_table(path))
+    None
+    >>> _save_dumb_rendering_table(path, dumb_rendering_table())
+    >>> _load_dumb_rendering_table(path) == dumb_rendering_table()
+    True
+    >>> os.unlink(path)
+
+    """
+    result = None
+    try:
+        with open(pathname, 'rb') as ifh:
+            (key, table) = marshal.load(ifh)
+        if key == _DUMB_TABLE_KEY and len(table) == 0x10000:
+            result = table
+    except (EnvironmentError, EOFError, ValueError, TypeError) as _:
+        pass
+    return result
+
+def _save_dumb_rendering_table(pathname, table):
+    """_save_dumb_rendering_table(pathname, table) -> None
+
+    Write the given table to the given file in a form that is
+    quickly loaded by _load_dumb_rendering_table().  Errors are
+    printed, not raised.
+
+    """
+    try:
+        with open(pathname, 'wb') as ofh:
+            marshal.dump((_DUMB_TABLE_KEY, table), ofh)
+    except EnvironmentError as _:
+        print("warning, unable to save dumb-terminal renderings:", _)
+
+def _line_index(text_utf8):
+    """_line_index(text_utf8) -> _LineIndex
+
+    Return the cached index for the given line, creating and
+    caching a new index if the line has not been seen lately.
+
+    """
+    result = _word_cache.get(text_utf8)
+    if result is None:
+        result = _LineIndex(text_utf8)
+        _word_cache.put(text_utf8, result)
+    result.uses = result.uses + 1
+    return result
+
+_compile_word_breaks(unicode(string.whitespace))
+
+def _smart_token(ustr, pos):
+    """_smart_token(ustr, pos) -> (kind, first, past_end)
+
+    Return the kind (such as "url" or "path") and range of the
+    token recognized by find_smart_word() that includes the
+    given character offset, or None if there is no token.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> _smart_token(u"see http://x.org/a.html.", 8)
+    ('url', 4, 23)
+
+    >>> _smart_token(u"just words", 2)
+
+    """
+    if ustr[pos] in _SMART_SPACE_CHARS:
+        return None
+    # very long runs without whitespace (such as minified data) are only
+    # searched near the offset, to bound the cost of each click
+    low = max(0, pos - _SMART_TOKEN_REACH)
+    (first, past_end) = _run_bounds(ustr[low:pos + _SMART_TOKEN_REACH],
+                                    pos - low, _SMART_TEXT_RUN)
+    first = first + low
+    past_end = past_end + low
+    for match in _SMART_TOKEN.finditer(ustr, first, past_end):
+        if match.start() > pos:
+            break
+        if match.end() > pos:
+            kind = str(match.lastgroup).replace('_b', '')
+            return (kind, match.start(), match.end())
+    return None
+
+def _strip_punctuation(ustr, result):
+    """_strip_punctuation(ustr, result) -> None
+
+    Given a list of [pos, count] that describes a range of
+    word characters in the given string, adjust the range so
+    that surrounding quotation marks, brackets and punctuation
+    are excluded where they do not appear to be part of the
+    word.  The list is modified in place.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> r = [0, 8]; _strip_punctuation(u"(quoted)", r); r
+    [1, 6]
+
+    >>> r = [0, 7]; _strip_punctuation(u"xyz()),", r); r
+    [0, 5]
+
+    """
+    if result[1] > 0:
+        # WARNING: variable helpers are synchronized "as needed", not
+        # "always"; be careful when adding new code to make sure the
+        # variables are actually up-to-date before depending on them
+        first = ustr[result[0]]
+        last = ustr[result[0] + result[1] - 1]
+        # strip basic punctuation off the end (this is repeated below)
+        if last in _TRAILING_PUNCTUATION:
+            result[1] = result[1] - 1
+            last = ustr[result[0] + result[1] - 1] # synchronize variable
+        if result[1] > 1:
+            # study the word's characters; note that due to GNU's broken
+            # behavior of treating a backquote like an open-quote, this
+            # algorithm assumes that "`" is a type of single quotation mark
+            word_start = result[0]
+            word_end = result[0] + result[1]
+            double_quote_count = ustr.count('"', word_start, word_end)
+            single_quote_count = ustr.count("'", word_start, word_end) + \
+                                 ustr.count("`", word_start, word_end)
+            open_paren_count = ustr.count("(", word_start, word_end)
+            close_paren_count = ustr.count(")", word_start, word_end)
+            # strip trailing punctuation as long as the word doesn't
+            # contain balanced brackets (e.g. keep "xyz()" but change
+            # "xyz)" to "xyz")
+            tail_ok = False
+            while not tail_ok and result[1] > 0:
+                if last == ")":
+                    if close_paren_count > open_paren_count:
+                        close_paren_count = close_paren_count - 1
+                        result[1] = result[1] - 1
+                    else:
+                        tail_ok = True
+                elif last == '"':
+                    if (double_quote_count % 2) != 0:
+                        double_quote_count = double_quote_count - 1
+                        result[1] = result[1] - 1
+                    else:
+                        tail_ok = True
+                elif last == "'" or last == "`":
+                    if (single_quote_count % 2) != 0:
+                        single_quote_count = single_quote_count - 1
+                        result[1] = result[1] - 1
+                    else:
+                        tail_ok = True
+                else:
+                    tail_ok = True
+                last = ustr[result[0] + result[1] - 1] # sync. variable
+            # strip leading punctuation as long as the word doesn't contain
+            # balanced brackets (e.g. keep "(xyz)", change "(xyz" to "xyz")
+            head_ok = False
+            while not head_ok and result[1] > 0:
+                if first == "(":
+                    if open_paren_count > close_paren_count:
+                        open_paren_count = open_paren_count - 1
+                        result[0] = result[0] + 1
+                        result[1] = result[1] - 1
+                    else:
+                        head_ok = True
+                elif first == '"':
+                    if (double_quote_count % 2) != 0:
+                        double_quote_count = double_quote_count - 1
+                        result[0] = result[0] + 1
+                        result[1] = result[1] - 1
+                    else:
+                        head_ok = True
+                elif first == "'" or first == "`":
+                    if (single_quote_count % 2) != 0:
+                        single_quote_count = single_quote_count - 1
+                        result[0] = result[0] + 1
+                        result[1] = result[1] - 1
+                    else:
+                        head_ok = True
+                else:
+                    head_ok = True
+                first = ustr[result[0]] # synchronize variable
+                last = ustr[result[0] + result[1] - 1] # sync. variable
+        # repeat this rule, as punctuation sometimes appears inside brackets
+        if last in _TRAILING_PUNCTUATION:
+            result[1] = result[1] - 1
+            last = ustr[result[0] + result[1] - 1] # synchronize variable
+    # strip any brackets that appear balanced at both ends
+    if result[1] > 1:
+        first = ustr[result[0]]
+        last = ustr[result[0] + result[1] - 1]
+        end_caps_ok = False
+        while not end_caps_ok and result[1] > 0:
+            if (first, last) in _END_CAPS:
+                # strip brackets
+                result[0] = result[0] + 1
+                result[1] = result[1] - 2
+                first = ustr[result[0]] # synchronize variable
+                last = ustr[result[0] + result[1] - 1] # sync. variable
+            else:
+                end_caps_ok = True
+
+def _word_in_line(line, pos):
+    """_word_in_line(line, pos) -> (pos, count)
+
+    Implementation of find_word(), given a _LineIndex instead
+    of UTF-8 bytes.
+
+    """
+    result = [pos, 1]
+    try:
+        ustr = line.text
+        if pos >= len(ustr):
+            raise ValueError("word-seeking callback expected offset to",
+                             "fall within range of characters")
+        # when starting on non-word characters, this finds all of the
+        # surrounding non-word characters instead
+        (first, past_end) = line.run_bounds(pos)
+        result[0] = first
+        result[1] = past_end - first
+        _strip_punctuation(ustr, result)
+    except Exception as _:
+        print("warning, exception while trying to find words:", _)
+    return (result[0], result[1])
+
+def clear_word_cache():
+    """clear_word_cache() -> None
+
+    Forget every line that find_word() has seen recently, and
+    reset the hit and miss counts.
+
+    """
+    _word_cache.clear(reset_stats=True)
+
+def dumb_rendering_table(cache_pathname=None):
+    """dumb_rendering_table(cache_pathname=None) -> tuple
+
+    Return an immutable sequence of 65536 strings, where each
+    item is the result of get_dumb_rendering() for the item's
+    index; in other words, the rendering of every character
+    in the Basic Multilingual Plane.  The table is created
+    the first time it is needed and then reused.
+
+    Since creating the table involves Unicode data for every
+    character, a file can be given to save startup time: the
+    table is loaded from that file if it was saved for the
+    same version of the Unicode data, and otherwise the table
+    is created and saved in the file for next time.  Problems
+    with the file are ignored.
+
+    This is meant to be installed all at once with the
+    quills.Terminal.set_dumb_strings_for_chars() method.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> t = dumb_rendering_table()
+    >>> len(t)
+    65536
+    >>> t[27], t[0x9B], t[0xE9] == u'\\xe9'.encode('utf-8')
+    ('<ESC>', '<CSI>', True)
+    >>> t is dumb_rendering_table()
+    True
+
+    """
+    global _dumb_rendering_table
+    if _dumb_rendering_table is None and cache_pathname is not None:
+        _dumb_rendering_table = _load_dumb_rendering_table(cache_pathname)
+    if _dumb_rendering_table is None:
+        _dumb_rendering_table = tuple([_dumb_rendering(x)
+                                       for x in range(0x10000)])
+        if cache_pathname is not None:
+            _save_dumb_rendering_table(cache_pathname, _dumb_rendering_table)
+    return _dumb_rendering_table
+
+def find_smart_word(text_utf8, pos):
+    """find_smart_word(text_utf8, pos) -> (pos, count)
+
+    Like find_word(), return a pair of integers as a tuple that
+    identifies the range of CHARACTERS (not bytes) around the
+    given CHARACTER offset in the given string of UTF-8 BYTES.
+    Unlike find_word(), this recognizes tokens that are often
+    selected in terminals, and returns the whole token even if
+    it contains punctuation: URLs, file paths, IPv4 and IPv6
+    addresses (with optional ports), "host:port" pairs (with an
+    optional user name) and hexadecimal hashes such as Git
+    commit IDs.  Anywhere else, the result of find_word() is
+    returned.
+
+    All token patterns are compiled into one expression that
+    is only applied to the whitespace-delimited text around
+    the offset, so the time taken is at worst proportional to
+    the length of the line.  (Tokens are only recognized up to
+    256 characters on either side of the offset.)
+
+    This is designed to be compatible with the callback
+    format required by quills.Terminal.on_seekword_call().
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> find_smart_word("open <https://www.macterm.net/help?x=1>, then", 12)
+    (6, 32)
+
+    >>> find_smart_word("edit /usr/local/etc/ssh_config.", 9)
+    (5, 25)
+
+    >>> find_smart_word("edit ../src/file_open.py:12", 9)
+    (5, 22)
+
+    >>> find_smart_word("ping 192.168.0.1.", 7)
+    (5, 11)
+
+    >>> find_smart_word("ssh -p 22 kevin@10.0.0.2:2222 now", 20)
+    (10, 19)
+
+    >>> find_smart_word("listen [fe80::1%en0]:8080 ok", 12)
+    (7, 18)
+
+    >>> find_smart_word("route 2001:db8::ff00:42:8329 dev", 10)
+    (6, 22)
+
+    >>> find_smart_word("proxy.example.com:3128, fallback", 3)
+    (0, 22)
+
+    >>> find_smart_word("commit 4fb76cc2e1 (HEAD)", 10)
+    (7, 10)
+
+    >>> find_smart_word("this is a (sentence).", 12)
+    (11, 8)
+
+    """
+    if pos < 0:
+        raise ValueError("word-seeking callback expected nonnegative offset")
+    line = _line_index(text_utf8)
+    try:
+        if pos < len(line.text):
+            token = _smart_token(line.text, pos)
+            if token is not None:
+                return (token[1], token[2] - token[1])
+    except Exception as _:
+        print("warning, exception while trying to find tokens:", _)
+    return _word_in_line(line, pos)
+
 def find_word(text_utf8, pos):
     """find_word(text_utf8, pos) -> (pos, count)
 
@@ -84,157 +944,9 @@ def find_word(text_utf8, pos):
     (0, 8)
 
     """
-    result = [pos, 1]
     if pos < 0:
         raise ValueError("word-seeking callback expected nonnegative offset")
-    try:
-        ustr = unicode(text_utf8, "utf-8", "ignore")
-        len_ustr = len(ustr)
-        if pos >= len_ustr:
-            raise ValueError("word-seeking callback expected offset to",
-                             "fall within range of characters")
-        nonword_chars = str(string.whitespace)
-        # an easy way to customize this is to add characters to
-        # the string variable "nonword_chars", e.g. the following
-        # would consider dots (.) to be word-breaking characters:
-        #     nonword_chars = nonword_chars + '.'
-        invert = False
-        if ustr[pos] in nonword_chars:
-            # special case; when starting on non-word characters, look for all
-            # non-word characters
-            invert = True
-        i = pos
-        j = pos
-        while i >= 0:
-            if (invert and ustr[i] not in nonword_chars) or \
-               (not invert and ustr[i] in nonword_chars):
-                i = i + 1
-                break
-            i = i - 1
-        if i < 0:
-            i = 0
-        while j < len_ustr:
-            if (invert and ustr[j] not in nonword_chars) or \
-               (not invert and ustr[j] in nonword_chars):
-                j = j - 1
-                break
-            j = j + 1
-        if j >= len_ustr:
-            j = len_ustr - 1
-        result[0] = i
-        result[1] = j - i + 1
-        # strip certain trailing punctuation marks to make word selections more
-        # sensible
-        if result[1] > 0:
-            # WARNING: variable helpers are synchronized "as needed", not
-            # "always"; be careful when adding new code to make sure the
-            # variables are actually up-to-date before depending on them
-            first = ustr[result[0]]
-            last = ustr[result[0] + result[1] - 1]
-            # strip basic punctuation off the end (this is repeated below)
-            if (last == ".") or (last == ",") or (last == ";") or (last == ":"):
-                result[1] = result[1] - 1
-                last = ustr[result[0] + result[1] - 1] # synchronize variable
-            if result[1] > 1:
-                open_paren_count = 0
-                close_paren_count = 0
-                double_quote_count = 0
-                single_quote_count = 0
-                # study the word's characters; note that due to GNU's broken
-                # behavior of treating a backquote like an open-quote, this
-                # algorithm assumes that "`" is a type of single quotation mark
-                for i in range(result[0], result[0] + result[1]):
-                    if ustr[i] == '"':
-                        double_quote_count = double_quote_count + 1
-                    elif ustr[i] == "'" or ustr[i] == "`":
-                        single_quote_count = single_quote_count + 1
-                    elif ustr[i] == "(":
-                        open_paren_count = open_paren_count + 1
-                    elif ustr[i] == ")":
-                        close_paren_count = close_paren_count + 1
-                # strip trailing punctuation as long as the word doesn't
-                # contain balanced brackets (e.g. keep "xyz()" but change
-                # "xyz)" to "xyz")
-                tail_ok = False
-                while not tail_ok and result[1] > 0:
-                    if last == ")":
-                        if close_paren_count > open_paren_count:
-                            close_paren_count = close_paren_count - 1
-                            result[1] = result[1] - 1
-                        else:
-                            tail_ok = True
-                    elif last == '"':
-                        if (double_quote_count % 2) != 0:
-                            double_quote_count = double_quote_count - 1
-                            result[1] = result[1] - 1
-                        else:
-                            tail_ok = True
-                    elif last == "'" or last == "`":
-                        if (single_quote_count % 2) != 0:
-                            single_quote_count = single_quote_count - 1
-                            result[1] = result[1] - 1
-                        else:
-                            tail_ok = True
-                    else:
-                        tail_ok = True
-                    last = ustr[result[0] + result[1] - 1] # sync. variable
-                # strip leading punctuation as long as the word doesn't contain
-                # balanced brackets (e.g. keep "(xyz)", change "(xyz" to "xyz")
-                head_ok = False
-                while not head_ok and result[1] > 0:
-                    if first == "(":
-                        if open_paren_count > close_paren_count:
-                            open_paren_count = open_paren_count - 1
-                            result[0] = result[0] + 1
-                            result[1] = result[1] - 1
-                        else:
-                            head_ok = True
-                    elif first == '"':
-                        if (double_quote_count % 2) != 0:
-                            double_quote_count = double_quote_count - 1
-                            result[0] = result[0] + 1
-                            result[1] = result[1] - 1
-                        else:
-                            head_ok = True
-                    elif first == "'" or first == "`":
-                        if (single_quote_count % 2) != 0:
-                            single_quote_count = single_quote_count - 1
-                            result[0] = result[0] + 1
-                            result[1] = result[1] - 1
-                        else:
-                            head_ok = True
-                    else:
-                        head_ok = True
-                    first = ustr[result[0]] # synchronize variable
-                    last = ustr[result[0] + result[1] - 1] # sync. variable
-            # repeat this rule, as punctuation sometimes appears inside brackets
-            if (last == ".") or (last == ",") or (last == ";") or (last == ":"):
-                result[1] = result[1] - 1
-                last = ustr[result[0] + result[1] - 1] # synchronize variable
-        # strip any brackets that appear balanced at both ends
-        if result[1] > 1:
-            first = ustr[result[0]]
-            last = ustr[result[0] + result[1] - 1]
-            end_caps_ok = False
-            while not end_caps_ok and result[1] > 0:
-                if (first == '"' and last == '"') or \
-                   (first == "'" and last == "'") or \
-                   (first == "`" and last == "`") or \
-                   (first == "`" and last == "'") or \
-                   (first == '<' and last == '>') or \
-                   (first == '(' and last == ')') or \
-                   (first == '[' and last == ']') or \
-                   (first == '{' and last == '}'):
-                    # strip brackets
-                    result[0] = result[0] + 1
-                    result[1] = result[1] - 2
-                    first = ustr[result[0]] # synchronize variable
-                    last = ustr[result[0] + result[1] - 1] # sync. variable
-                else:
-                    end_caps_ok = True
-    except Exception as _:
-        print("warning, exception while trying to find words:", _)
-    return (result[0], result[1])
+    return _word_in_line(_line_index(text_utf8), pos)
 
 def get_dumb_rendering(ord_unicode_16):
     """get_dumb_rendering(char_utf16) -> text_utf8
@@ -245,6 +957,14 @@ def get_dumb_rendering(ord_unicode_16):
     with normal terminals many invisible characters have
     special meaning.
 
+    Beyond ASCII, characters that are visible on their own
+    (letters, digits, punctuation and symbols) are rendered
+    as themselves.  Control characters, spaces, combining
+    marks and formatting characters are rendered by their
+    usual abbreviation or their Unicode name (in angle
+    brackets), and anything else (such as unassigned or
+    private-use code points) by a number like "<u57344>".
+
     (Below are REAL testcases run by doctest!)
 
     >>> get_dumb_rendering(0)
@@ -259,24 +979,157 @@ def get_dumb_rendering(ord_unicode_16):
     >>> get_dumb_rendering(97)
     'a'
 
+    >>> get_dumb_rendering(0x85)
+    '<NEL>'
+
+    >>> get_dumb_rendering(0xA0)
+    '<NBSP>'
+
+    >>> get_dumb_rendering(0x301)
+    '<COMBINING ACUTE ACCENT>'
+
+    >>> get_dumb_rendering(0x20AC) == u'\\u20ac'.encode('utf-8')
+    True
+
+    >>> get_dumb_rendering(0xE000)
+    '<u57344>'
+
     """
-    result = '<?>' # must use UTF-8 encoding
-    if ord_unicode_16 < 128:
-        as_ascii = ord_unicode_16
-        if as_ascii == 27:
-            result = '<ESC>'
-        # a "proper" control symbol is preferred, but MacTerm cannot render
-        # higher Unicode characters just yet...
-        #elif as_ascii < ord(' '):
-        #    result = '⌃%c' % chr(ord('@') + as_ascii)
-        elif as_ascii < ord(' '):
-            result = '^%c' % chr(ord('@') + as_ascii)
-        elif chr(as_ascii) in string.printable:
-            result = chr(as_ascii)
-        else: result = '<%i>' % as_ascii
+    if _dumb_rendering_table is not None:
+        return _dumb_rendering_table[ord_unicode_16]
+    return _dumb_rendering(ord_unicode_16)
+
+def render_dumb(buffer, encoding='utf-8'):
+    """render_dumb(buffer, encoding='utf-8') -> text_utf8
+
+    Return the string that dumb terminals should use to
+    render the given text, which is the concatenation of
+    the get_dumb_rendering() strings of all its characters.
+    The buffer may be Unicode or bytes; bytes are decoded
+    using the given encoding, and any bytes that are not
+    valid in that encoding become U+FFFD.
+
+    This renders the whole buffer in one pass that has no
+    per-character branching, so it is much faster than
+    calling get_dumb_rendering() for each character of a
+    large amount of (say) binary data.  Characters beyond
+    the Basic Multilingual Plane are rendered as themselves.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> render_dumb('a\\tb\\r\\n')
+    'a^Ib^M^J'
+
+    >>> render_dumb(u'\\x1b[0m\\x85')
+    '<ESC>[0m<NEL>'
+
+    >>> render_dumb('caf\\xc3\\xa9') == 'caf\\xc3\\xa9'
+    True
+
+    >>> render_dumb('\\xff\\x00', encoding='latin-1') == \\
+    ...     u'\\xff^@'.encode('utf-8')
+    True
+
+    >>> render_dumb('\\xff') == u'\\ufffd'.encode('utf-8')
+    True
+
+    >>> render_dumb(u'e\\u0301')
+    'e<COMBINING ACUTE ACCENT>'
+
+    >>> render_dumb('')
+    ''
+
+    >>> render_dumb(u'\\x00\\U0001f600') == u'^@\\U0001f600'.encode('utf-8')
+    True
+
+    """
+    if isinstance(buffer, unicode):
+        ustr = buffer
+    elif isinstance(buffer, bytes):
+        ustr = buffer.decode(encoding, 'replace')
     else:
-        result = '<u%i>' % ord_unicode_16
-    return result
+        ustr = bytearray(buffer).decode(encoding, 'replace')
+    if _NON_BMP.search(ustr) is not None:
+        return ustr.translate(_dumb_translation_map()).encode('utf-8')
+    code_units = array('H', ustr.encode(_NATIVE_UTF16))
+    return "".join(map(dumb_rendering_table().__getitem__, code_units))
+
+def set_word_breaks(chars='', categories=()):
+    """set_word_breaks(chars='', categories=()) -> None
+
+    Change which characters find_word() considers to separate
+    words.  Whitespace always separates words; in addition,
+    any of the given characters (a string, which is assumed
+    to be UTF-8 if it is not Unicode) will separate words, as
+    will any character whose Unicode general category is in
+    the given sequence of names (such as "Pd" for dashes, or
+    just "P" for all punctuation).
+
+    The settings are compiled right away, so they do not
+    slow down each double-click.  Each call replaces all
+    previous settings; call with no arguments to restore the
+    default behavior.
+
+    This is intended to be called from "customize_macterm".
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> find_word("/usr/local/bin", 6)
+    (0, 14)
+    >>> set_word_breaks('./')
+    >>> find_word("/usr/local/bin", 6)
+    (5, 5)
+    >>> find_word("www.macterm.net", 5)
+    (4, 7)
+    >>> set_word_breaks(categories=['Pd'])
+    >>> find_word("pre-fix", 1)
+    (0, 3)
+    >>> set_word_breaks()
+    >>> find_word("pre-fix", 1)
+    (0, 7)
+
+    """
+    if not isinstance(chars, unicode):
+        chars = unicode(chars, "utf-8")
+    all_chars = set(unicode(string.whitespace))
+    all_chars.update(chars)
+    if categories:
+        all_chars.update(_chars_in_categories(categories))
+    _compile_word_breaks(all_chars)
+
+def set_word_cache_capacity(line_count):
+    """set_word_cache_capacity(line_count) -> None
+
+    Change the maximum number of lines that find_word() will
+    remember.  Since each line is kept with its decoded text
+    and index, memory use is roughly proportional to the total
+    length of the remembered lines.  Raise ValueError if the
+    count is less than 1.
+
+    """
+    _word_cache.set_capacity(line_count)
+
+def word_cache_stats():
+    """word_cache_stats() -> dict
+
+    Return a dictionary describing the cache of lines used by
+    find_word(), with keys 'hits', 'misses', 'size' (number of
+    lines now remembered) and 'capacity'.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> clear_word_cache()
+    >>> find_word("this is a sentence", 5)
+    (5, 2)
+    >>> find_word("this is a sentence", 11)
+    (10, 8)
+    >>> find_word("another line", 1)
+    (0, 7)
+    >>> _sort_dict(word_cache_stats())
+    'capacity:32 hits:1 misses:2 size:2'
+
+    """
+    return _word_cache.stats()
 
 def _test():
     """Runs all of this module's "doctest" test cases.
@@ -0,0 +1,228 @@
+#!/usr/bin/python
+# vim: set fileencoding=UTF-8 :
+
+"""Routines to parse the "authority" of a URL, according to RFC 3986.
+
+The authority is the part of a URL such as "ssh://user@host:22/path" that
+follows "//" and ends before the path, query or fragment; it has the form
+"user:password@host:port", where everything except the host is optional.
+The host may be a name, an IPv4 address or an IPv6 address in brackets
+(optionally with an RFC 6874 zone, such as "[fe80::1%25en0]").  The user,
+password and host names may use percent-encoding (such as "%40" for "@").
+
+Authority -- the components of an authority
+AuthorityError -- exception raised for an authority that cannot be used
+parse -- return the components of an authority
+
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+__author__ = 'Kevin Grant <kmg@mac.com>'
+__date__ = '18 October 2026'
+__version__ = '4.0.0'
+
+from collections import namedtuple
+import re
+import socket
+
+# see parse(); matches a complete authority, allowing only characters
+# that RFC 3986 allows in each part (percent-encoding and IPv6 addresses
+# are checked separately); the user is optional and "lazy", so that an
+# authority without "@" (the most common kind) needs no backtracking
+_AUTHORITY = re.compile(r'''(?:(?P<user>[-\w.~!$&'()*+,;=%]*)
+                               (?::(?P<password>[-\w.~!$&'()*+,;=%:]*))?
+                            @)??
+                            (?:\[(?P<ipv6>[0-9A-Fa-f:.]+)
+                                 (?:%25(?P<zone>[-\w.~%]+))?\]
+                              |(?P<name>[-\w.~!$&'()*+,;=%]*))
+                            (?::(?P<port>[0-9]*))?
+                            \Z''', re.X)
+# see parse(); matches the most common authorities, "[user@]host[:port]"
+# with no password, IPv6 address, percent-encoding or ";" parameters, and
+# no user or host that starts with "-", using a much simpler pattern
+# (anything else is left to _AUTHORITY)
+_PLAIN_AUTHORITY = re.compile(r"(?:(?!-)([-\w.~!$&'()*+,=]*)@)?"
+                              r"(?!-)([-\w.~!$&'()*+,=]*)(?::([0-9]*))?\Z")
+_PERCENT = re.compile(r'%([0-9A-Fa-f]{2})')
+# see parse(); a user or host is given to "ssh" as a command argument, so
+# it must not look like an option, and (once decoded) must not contain
+# spaces or control characters
+_UNSAFE = re.compile(r'\A-|[\s\x00-\x1f\x7f]')
+_BAD_PERCENT = re.compile(r'%(?![0-9A-Fa-f]{2})')
+
+# see parse()
+_new_tuple = tuple.__new__
+
+def _decode(text, description):
+    """_decode(text, description) -> str
+
+    Return the given text with percent-encoded characters
+    decoded, or None if the text is empty.  Raise AuthorityError
+    if there is a "%" that is not followed by two hex digits.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> _decode('me%40example.com', 'user')
+    'me@example.com'
+    >>> _decode('', 'user') is None
+    True
+    >>> try:
+    ...     _decode('100%', 'user')
+    ... except AuthorityError as e:
+    ...     print(e)
+    invalid percent-encoding in user: 100%
+
+    """
+    if not text:
+        return None
+    if '%' not in text:
+        return text
+    if _BAD_PERCENT.search(text):
+        raise AuthorityError("invalid percent-encoding in %s: %s" %
+                             (description, text))
+    return _PERCENT.sub(lambda m: chr(int(m.group(1), 16)), text)
+
+class Authority(namedtuple('Authority', 'user password host port')):
+    """The components of an authority, as returned by parse();
+    any component that is not given is None.  The host does
+    not have brackets or percent-encoding.  Objects cannot be
+    changed.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> Authority(user='me', host='::1', port=22)
+    Authority(user='me', password=None, host='::1', port=22)
+
+    """
+    __slots__ = ()
+
+    def __new__(cls, user=None, password=None, host=None, port=None):
+        return tuple.__new__(cls, (user, password, host, port))
+
+class AuthorityError(ValueError):
+    """Raised when an authority is not valid, or has a
+    component (such as a port) that cannot be used.
+    """
+    pass
+
+def parse(authority):
+    """parse(authority) -> Authority
+
+    Return the components of the given authority (without any
+    "//" or path).  Empty components (such as the user in
+    "@host") are None.  Raise AuthorityError (a ValueError) if
+    the authority does not follow RFC 3986, if an IPv6 address
+    is not valid, or if a port is not in the range 0-65535.
+
+    A plain "[user@]host[:port]" is matched by a simple pattern
+    first, and costs about the same as splitting the string at
+    "@" and ":".  Any other authority (with a password, an IPv6
+    address or percent-encoding) is matched by the complete
+    RFC 3986 pattern and checked, which takes two to four times
+    as long.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> parse('nowhere.com')
+    Authority(user=None, password=None, host='nowhere.com', port=None)
+
+    >>> parse('me@nowhere.com:123')
+    Authority(user='me', password=None, host='nowhere.com', port=123)
+
+    >>> parse('me%40work:secret@[::1]:22')
+    Authority(user='me@work', password='secret', host='::1', port=22)
+
+    >>> parse('[fe80::1%25en0]').host
+    'fe80::1%en0'
+
+    >>> parse('@:')
+    Authority(user=None, password=None, host=None, port=None)
+
+    >>> for bad in ('a@b@c', '[::1', '[1::2::3]', 'host:99999', 'host:x',
+    ...             'a b'):
+    ...     try:
+    ...         parse(bad)
+    ...     except AuthorityError as e:
+    ...         print(e)
+    invalid URL authority: a@b@c
+    invalid URL authority: [::1
+    invalid IPv6 address in URL: 1::2::3
+    invalid port in URL: 99999
+    invalid URL authority: host:x
+    invalid URL authority: a b
+
+    Nothing may look like a command option, or contain spaces
+    or control characters (even if percent-encoded):
+
+    >>> for bad in ('-oProxyCommand=open%20-a%20Calculator',
+    ...             'x@-oProxyCommand=id', '-oProxyCommand=id@host',
+    ...             'a%00b', 'me%0A@host', '[fe80::1%25en%200]'):
+    ...     try:
+    ...         parse(bad)
+    ...     except AuthorityError as e:
+    ...         print(e)
+    unsafe host in URL: '-oProxyCommand=open -a Calculator'
+    unsafe host in URL: '-oProxyCommand=id'
+    unsafe user in URL: '-oProxyCommand=id'
+    unsafe host in URL: 'a\\x00b'
+    unsafe user in URL: 'me\\n'
+    unsafe host in URL: 'fe80::1%en 0'
+
+    """
+    match = _PLAIN_AUTHORITY.match(authority)
+    if match is not None:
+        # common case: nothing to decode or check
+        (user, host, port) = match.groups()
+        if port:
+            port = int(port)
+            if port > 65535:
+                raise AuthorityError("invalid port in URL: %s" % port)
+        else:
+            port = None
+        # (same as Authority(), but without a Python-level call)
+        return _new_tuple(Authority, (user or None, None, host or None, port))
+    match = _AUTHORITY.match(authority)
+    if match is None:
+        raise AuthorityError("invalid URL authority: %s" % authority)
+    (user, password, ipv6, zone, host, port) = match.groups()
+    if port:
+        port = int(port)
+        if port > 65535:
+            raise AuthorityError("invalid port in URL: %s" % port)
+    else:
+        port = None
+    if '%' not in authority and ipv6 is None:
+        # nothing to decode, and the pattern allows no spaces or
+        # control characters (only a leading "-" is unsafe)
+        if user and user.startswith('-'):
+            raise AuthorityError("unsafe user in URL: %r" % user)
+        if host and host.startswith('-'):
+            raise AuthorityError("unsafe host in URL: %r" % host)
+        return Authority(user or None, password or None, host or None, port)
+    if ipv6 is not None:
+        try:
+            socket.inet_pton(socket.AF_INET6, ipv6)
+        except (socket.error, ValueError) as _:
+            raise AuthorityError("invalid IPv6 address in URL: %s" % ipv6)
+        host = ipv6
+        if zone is not None:
+            host = "%s%%%s" % (ipv6, _decode(zone, 'IPv6 zone'))
+    else:
+        host = _decode(host, 'host')
+    user = _decode(user, 'user')
+    for (description, value) in (('user', user), ('host', host)):
+        if value is not None and _UNSAFE.search(value) is not None:
+            raise AuthorityError("unsafe %s in URL: %r" % (description, value))
+    return Authority(user, _decode(password, 'password'), host, port)
+
+def _test():
+    """Runs all of this module's "doctest" test cases.
+    """
+    import doctest
+    from . import url_authority
+    return doctest.testmod(url_authority)
+
+if __name__ == '__main__':
+    _test()
@@ -7,7 +7,26 @@ Below, example URLs fully specify all parts, although each type
 has a number of optional parts that may be omitted (e.g. user
 and port, man page section).
 
+The open() function handles a URL of any supported type; it is
+registered for every type by install_handlers(), so each URL is
+parsed only once (see url_parse.parse()).
+
+SSH options in "ssh://" and "sftp://" URLs (only the few that are
+allowed by url_parse, such as "IdentityFile" and "ProxyJump") are
+given to the command as "-o" arguments.  After ssh_mux.enable() is
+called, later sessions for the same server also reuse one connection,
+so that they open almost immediately.
+
+To open many URLs at once (as in a workspace), use open_many(), which
+looks up all of their servers in parallel first (see host_cache), so
+that one slow DNS server cannot delay each session in turn.
+
 file -- handle URLs of the form "file:///path/to/some/file"
+get_host_cache -- return the host_cache.HostCache used by open_many()
+install_handlers -- make MacTerm call open() for every supported URL scheme
+open -- handle a URL of any type below
+open_many -- handle several URLs, looking up their servers in parallel
+set_host_cache -- change the host_cache.HostCache used by open_many()
 sftp -- handle URLs of the form "sftp://user@host:port"
 ssh -- handle URLs of the form "ssh://user@host:port"
 x_man_page -- handle URLs of the form "x-man-page://section/cmd"
@@ -23,35 +42,51 @@ __version__ = '4.0.0'
 
 # note: Quills is a compiled module, library path must be set properly
 import quills
+from .host_cache import \
+    HostCache
+from .ssh_mux import \
+    get_multiplexer as _get_multiplexer
 from .url_parse import \
-    file as _parse_file, \
-    sftp as _parse_sftp, \
-    ssh as _parse_ssh, \
-    x_man_page as _parse_x_man_page
+    parse as _parse
 
-def file(url):
-    """file(url) -> None
+# see get_host_cache()
+_host_cache = None
 
-    Asynchronously open a session with "emacs" in file browser
-    mode, looking at the resource from a given "file://" URL.
+def _multiplex_args(url_info):
+    """_multiplex_args(url_info) -> list
 
-    Raises an exception for some failures.  Note, however, that
-    as an asynchronous process spawn, other types of failures
-    could occur later that are not trapped at call time.
+    Return "ssh" or "sftp" arguments that share a connection to
+    the server in the given url_parse.URL, if ssh_mux.enable()
+    has been called.
 
     (Below are REAL testcases run by doctest!)
 
-    >>> file('file:///System/Library')
+    >>> _multiplex_args(_parse('ssh://host'))
+    []
+    >>> import shutil, tempfile
+    >>> from pymacterm import ssh_mux
+    >>> mux = ssh_mux.enable(directory=tempfile.mkdtemp())
+    >>> args = _multiplex_args(_parse('ssh://host'))
+    >>> args[1] == '-oControlPath=%s' % mux.control_path(None, 'host', None,
+    ...                                                  ())
+    True
+    >>> ssh_mux.disable()
+    >>> shutil.rmtree(mux.directory)
 
-    >>> try:
-    ...        file('not a file url!')
-    ... except ValueError as e:
-    ...        print(e)
-    not a file URL
+    """
+    mux = _get_multiplexer()
+    if mux is None:
+        return []
+    return mux.option_args(url_info.user, url_info.host, url_info.port,
+                           url_info.options)
+
+def _open_file(url_info):
+    """_open_file(url_info) -> None
+
+    Implementation of file(), given a url_parse.URL.
 
     """
-    url_info = _parse_file(url)
-    path = url_info.get('path', None)
+    path = url_info.path
     if path is not None:
         if len(path) == 0:
             # default to the home directory
@@ -73,6 +108,267 @@ def file(url):
     else:
         raise ValueError("unsupported form of file URL")
 
+def _open_sftp(url_info, address=None):
+    """_open_sftp(url_info, address=None) -> None
+
+    Implementation of sftp(), given a url_parse.URL.  If an
+    address is given, it is used instead of the host name (see
+    _open_ssh()).
+
+    """
+    host = url_info.host
+    user = url_info.user
+    port = url_info.port
+    if host is not None:
+        args = ['/usr/bin/sftp']
+        if port is not None:
+            args.append('-oPort=%s' % str(port))
+        args.extend(_option_args(url_info.options))
+        args.extend(_multiplex_args(url_info))
+        if address is not None:
+            args.append('-oHostKeyAlias=%s' % host)
+            host = address
+        if ':' in host:
+            # IPv6 addresses must be in brackets here
+            host = "[%s]" % host
+        # sftp uses "user@host" form
+        if user is not None:
+            host = "%s@%s" % (user, host)
+        # ("--" ensures that the destination is never seen as an option)
+        args.extend(['--', host])
+        ignored_session = quills.Session(args)
+    else:
+        raise ValueError("unsupported form of sftp URL")
+
+def _open_ssh(url_info, address=None):
+    """_open_ssh(url_info, address=None) -> None
+
+    Implementation of ssh(), given a url_parse.URL.  If an
+    address is given, "ssh" connects to it without looking up
+    the host name, but still checks the host key of the name
+    (using the "HostKeyAlias" option).
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> from pymacterm import url_open, quills_stub
+    >>> url_open.quills = quills_stub
+    >>> del quills_stub.Session.created[:]
+    >>> _open_ssh(_parse('ssh://me;Compression=yes@host:2222'
+    ...                  '?IdentityFile=~/.ssh/work'))
+    >>> print(" ".join(quills_stub.Session.created[0][:6]))
+    /usr/bin/ssh -2 -l me -p 2222
+    >>> print(" ".join(quills_stub.Session.created[0][6:]))
+    -oCompression=yes -oIdentityFile=~/.ssh/work -- host
+    >>> _open_ssh(_parse('ssh://host'), address='10.0.0.1')
+    >>> print(" ".join(quills_stub.Session.created[1]))
+    /usr/bin/ssh -2 -oHostKeyAlias=host -- 10.0.0.1
+    >>> del quills_stub.Session.created[:]
+    >>> url_open.quills = quills
+
+    """
+    host = url_info.host
+    user = url_info.user
+    port = url_info.port
+    if host is not None:
+        args = ['/usr/bin/ssh']
+        args.append('-2') # SSH protocol version 2 by default
+        if user is not None:
+            args.extend(['-l', user])
+        if port is not None:
+            args.extend(['-p', str(port)])
+        args.extend(_option_args(url_info.options))
+        args.extend(_multiplex_args(url_info))
+        if address is not None:
+            args.append('-oHostKeyAlias=%s' % host)
+            host = address
+        # ("--" ensures that the destination is never seen as an option)
+        args.extend(['--', host])
+        ignored_session = quills.Session(args)
+    else:
+        raise ValueError("unsupported form of ssh URL")
+
+def _open_x_man_page(url_info):
+    """_open_x_man_page(url_info) -> None
+
+    Implementation of x_man_page(), given a url_parse.URL.
+
+    """
+    cmd = url_info.cmd
+    section = url_info.section
+    # pull the command name and optional section number out of the URL path
+    if section is not None:
+        ignored_session = quills.Session(['/usr/bin/man', section, cmd])
+    elif cmd is not None:
+        ignored_session = quills.Session(['/usr/bin/man', cmd])
+    else:
+        raise ValueError("unsupported form of x-man-page URL")
+
+def _option_args(options):
+    """_option_args(options) -> list
+
+    Return "ssh" or "sftp" arguments that set the given SSH
+    options (pairs from url_parse.URL.options, which are known
+    to be safe), in order.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> _option_args((('Compression', 'yes'), ('ProxyJump', 'gw:22')))
+    ['-oCompression=yes', '-oProxyJump=gw:22']
+    >>> _option_args(None)
+    []
+
+    """
+    if not options:
+        return []
+    return ['-o%s=%s' % pair for pair in options]
+
+def file(url):
+    """file(url) -> None
+
+    Asynchronously open a session with "emacs" in file browser
+    mode, looking at the resource from a given "file://" URL.
+
+    Raises an exception for some failures.  Note, however, that
+    as an asynchronous process spawn, other types of failures
+    could occur later that are not trapped at call time.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> file('file:///System/Library')
+
+    >>> try:
+    ...        file('not a file url!')
+    ... except ValueError as e:
+    ...        print(e)
+    not a file URL
+
+    """
+    _open_file(_parse(url, 'file'))
+
+def get_host_cache():
+    """get_host_cache() -> host_cache.HostCache
+
+    Return the cache of host addresses used by open_many(),
+    creating one with default settings if necessary.
+
+    """
+    global _host_cache
+    if _host_cache is None:
+        _host_cache = HostCache()
+    return _host_cache
+
+def install_handlers(register_function=None):
+    """install_handlers(register_function=None) -> int
+
+    Register open() for every URL scheme that it supports, and
+    return the number of schemes.  The registration function is
+    quills.Session.on_urlopen_call by default.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> calls = list()
+    >>> install_handlers(lambda f, scheme: calls.append(scheme))
+    4
+    >>> calls
+    ['file', 'sftp', 'ssh', 'x-man-page']
+
+    """
+    if register_function is None:
+        register_function = quills.Session.on_urlopen_call
+    schemes = sorted(_OPENERS)
+    for scheme in schemes:
+        register_function(open, scheme)
+    return len(schemes)
+
+def open(url):
+    """open(url) -> None
+
+    Asynchronously open a session for a URL of any type that
+    is handled by a function below (such as ssh()), parsing the
+    URL only once.  Raise ValueError if the URL is not
+    supported, or an exception for some other failures.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> open('x-man-page://3/printf')
+
+    >>> try:
+    ...     open('telnet://yourserver.com')
+    ... except ValueError as e:
+    ...     print(e)
+    unsupported URL scheme: telnet
+
+    """
+    url_info = _parse(url)
+    _OPENERS[url_info.scheme](url_info)
+
+def open_many(urls, wait=2.0, use_addresses=False):
+    """open_many(urls, wait=2.0, use_addresses=False) -> None
+
+    Like open(), for each URL in the given sequence, except
+    that the servers of all "ssh://" and "sftp://" URLs are
+    looked up in parallel first (waiting at most "wait"
+    seconds in total).  Every URL is parsed before any session
+    is opened, so that nothing is opened if any URL is not
+    supported (raising ValueError).
+
+    Even if the results are not used, a lookup also makes the
+    system remember the addresses, so that "ssh" finds them
+    quickly.  But if "use_addresses" is true, the first address
+    found for each server is given to "ssh" directly (which may
+    not be right if your SSH configuration has settings for the
+    host name, since they will not apply).
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> from pymacterm import url_open, quills_stub
+    >>> url_open.quills = quills_stub
+    >>> del quills_stub.Session.created[:]
+    >>> set_host_cache(HostCache(resolver={'a.example': ['10.0.0.1'],
+    ...                                    'b.example': ['::1']}.get))
+    >>> open_many(['ssh://a.example', 'sftp://me@b.example',
+    ...            'ssh://c.example', 'x-man-page://ls'],
+    ...           use_addresses=True)
+    >>> for args in quills_stub.Session.created:
+    ...     print(" ".join(args))
+    /usr/bin/ssh -2 -oHostKeyAlias=a.example -- 10.0.0.1
+    /usr/bin/sftp -oHostKeyAlias=b.example -- me@[::1]
+    /usr/bin/ssh -2 -- c.example
+    /usr/bin/man ls
+    >>> get_host_cache().close()
+    >>> set_host_cache(None)
+    >>> del quills_stub.Session.created[:]
+    >>> url_open.quills = quills
+
+    """
+    url_infos = [_parse(x) for x in urls]
+    hosts = [x.host for x in url_infos
+             if x.scheme in ('sftp', 'ssh') and x.host is not None]
+    cache = get_host_cache()
+    if hosts:
+        cache.warm(hosts, wait=wait)
+    for url_info in url_infos:
+        address = None
+        if use_addresses and url_info.host is not None:
+            addresses = cache.addresses(url_info.host)
+            if addresses:
+                address = addresses[0]
+        if address is None:
+            _OPENERS[url_info.scheme](url_info)
+        else:
+            _OPENERS[url_info.scheme](url_info, address=address)
+
+def set_host_cache(cache):
+    """set_host_cache(cache) -> None
+
+    Use the given host_cache.HostCache in open_many() (for
+    instance, to change its time limits or its resolver).  If
+    None, a default cache is created when it is needed.
+
+    """
+    global _host_cache
+    _host_cache = cache
+
 def sftp(url):
     """sftp(url) -> None
 
@@ -103,21 +399,7 @@ def sftp(url):
     not an sftp URL
 
     """
-    url_info = _parse_sftp(url)
-    host = url_info.get('host', None)
-    user = url_info.get('user', None)
-    port = url_info.get('port', None)
-    if host is not None:
-        args = ['/usr/bin/sftp']
-        if port is not None:
-            args.append('-oPort=%s' % str(port))
-        # sftp uses "user@host" form
-        if user is not None:
-            host = "%s@%s" % (user, host)
-        args.append(host)
-        ignored_session = quills.Session(args)
-    else:
-        raise ValueError("unsupported form of sftp URL")
+    _open_sftp(_parse(url, 'sftp'))
 
 def ssh(url):
     """ssh(url) -> None
@@ -148,22 +430,18 @@ def ssh(url):
     ...        print(e)
     not an ssh URL
 
+    >>> for bad in ('ssh://-oProxyCommand=open%20-a%20Calculator',
+    ...             'ssh://x@-oProxyCommand=id', 'ssh://a%00b'):
+    ...     try:
+    ...         ssh(bad)
+    ...     except ValueError as e:
+    ...         print(str(e).split(':')[0])
+    unsafe host in URL
+    unsafe host in URL
+    unsafe host in URL
+
     """
-    url_info = _parse_ssh(url)
-    host = url_info.get('host', None)
-    user = url_info.get('user', None)
-    port = url_info.get('port', None)
-    if host is not None:
-        args = ['/usr/bin/ssh']
-        args.append('-2') # SSH protocol version 2 by default
-        if user is not None:
-            args.extend(['-l', user])
-        if port is not None:
-            args.extend(['-p', str(port)])
-        args.append(host)
-        ignored_session = quills.Session(args)
-    else:
-        raise ValueError("unsupported form of ssh URL")
+    _open_ssh(_parse(url, 'ssh'))
 
 def x_man_page(url):
     """x_man_page(url) -> None
@@ -182,16 +460,15 @@ def x_man_page(url):
     >>> x_man_page('x-man-page://3/printf')
 
     """
-    url_info = _parse_x_man_page(url)
-    cmd = url_info.get('cmd', None)
-    section = url_info.get('section', None)
-    # pull the command name and optional section number out of the URL path
-    if section is not None:
-        ignored_session = quills.Session(['/usr/bin/man', section, cmd])
-    elif cmd is not None:
-        ignored_session = quills.Session(['/usr/bin/man', cmd])
-    else:
-        raise ValueError("unsupported form of x-man-page URL")
+    _open_x_man_page(_parse(url, 'x-man-page'))
+
+# see open(); the function for each scheme returned by url_parse.parse()
+_OPENERS = {
+    'file': _open_file,
+    'sftp': _open_sftp,
+    'ssh': _open_ssh,
+    'x-man-page': _open_x_man_page,
+}
 
 def _test():
     """Runs all of this module's "doctest" test cases.
@@ -3,7 +3,10 @@
 
 """Routines to distill various kinds of URLs into components.
 
-Every function returns a dictionary with one or more of the
+The parse() function returns a URL object for any supported URL,
+finding the parser for its scheme with a single dictionary lookup.
+The other functions each accept one scheme, and return the results of
+parse() as a dictionary (see URL.as_dict()) with one or more of the
 following keys defined (which ones depends on the URL type):
 
     'user': user ID for login to server
@@ -12,12 +15,35 @@ following keys defined (which ones depends on the URL type):
     'section': (man pages) section to look up resource in
     'cmd': (man pages) command to look up
     'path': the remainder after the host name and port
+    'options': (ssh, sftp) sequence of (keyword, value) pairs for
+               SSH options, such as ('Compression', 'yes')
+
+The "ssh://" and "sftp://" URLs may set a few SSH options, either as
+connection parameters after the user name (as in the IETF proposal,
+e.g. "ssh://user;Compression=yes,ProxyJump=gateway@host") or as a
+query (e.g. "ssh://host?IdentityFile=~/.ssh/work&Compression=yes").
+Only the options below are allowed; any other option (especially
+one that runs a command, such as "ProxyCommand" or "LocalCommand")
+makes the URL invalid.  Keywords ignore case, as in "ssh_config".
+Connection sharing ("ControlPath" and related options) is never
+allowed, since a URL could then attach a session to a socket owned
+by another user; see the "ssh_mux" module instead.
+
+    Compression: "yes" or "no"
+    IdentityFile: file name
+    ProxyJump: "[user@]host[:port]" (comma-separated) or "none"
 
 Below, example URLs fully specify all parts, although each type
 has a number of optional parts that may be omitted (e.g. user
 and port, man page section).
 
+URL -- the (unchangeable) components of a URL
+clear_parse_cache -- forget all URLs that parse() has seen recently
 file -- handle URLs of the form "file:///path/to/some/file"
+parse -- return a URL object with the components of any supported URL
+parse_cache_stats -- return hit and miss counts for the parse() cache
+schemes -- return the URL schemes that parse() supports
+set_parse_cache_capacity -- change how many URLs parse() remembers
 sftp -- handle URLs of the form "sftp://user@host:port"
 ssh -- handle URLs of the form "ssh://user@host:port"
 x_man_page -- handle URLs of the form "x-man-page://section/cmd"
@@ -31,95 +57,243 @@ __author__ = 'Kevin Grant <kmg@mac.com>'
 __date__ = '24 August 2006'
 __version__ = '4.0.0'
 
+from collections import namedtuple
+import re
+
+from .url_authority import \
+    parse as _parse_authority
 from .utilities import \
-    slash_free_path as _slash_free_path, \
+    LRUCache, \
     sort_dict as _sort_dict
 import urlparse
 #import urllib.parse as urlparse # for Python 3.0
 
-def _host_port(netloc):
-    """_host_port(netloc) -> (host, port)
+# see parse(); the "//host" part of a URL, which ends at the first "/",
+# "?" or "#" (as in "urlparse")
+_NET_LOCATION = re.compile(r'//([^/?#]*)')
+
+# see _parse_options(); the only SSH options that a URL may set, by
+# lowercase keyword, with the proper keyword and a pattern that the
+# value must match (values never start with "-", and have no spaces or
+# quotes, so they cannot be mistaken for other "ssh" arguments)
+_PATH_VALUE = re.compile(r'(?!-)[\w.~/%+@:,-]+\Z')
+_SSH_OPTIONS = {
+    'compression': ('Compression', re.compile(r'(?:yes|no)\Z', re.I)),
+    'identityfile': ('IdentityFile', _PATH_VALUE),
+    'proxyjump': ('ProxyJump', re.compile(r'(?!-)[-\w.@:\[\]%,]+\Z')),
+}
+
+# see parse(); the same few URLs (such as bookmarks) tend to be opened
+# repeatedly, and results cannot be changed so they are shared
+_parse_cache = LRUCache(capacity=256)
+
+
+def _parse_file(rest):
+    """_parse_file(rest) -> URL
+
+    Parser for parse(), given everything after "file:".
 
-    Return a tuple of the host and port elements of a net
-    location component in a URL.  Either of the elements may be
-    None if it is not present in the original URL.
+    """
+    match = _NET_LOCATION.match(rest)
+    if match is not None:
+        rest = rest[match.end():]
+    path = rest.partition('?')[0]
+    if path == '':
+        path = '/'
+    return URL('file', path=path)
+
+def _parse_options(text, separator):
+    """_parse_options(text, separator) -> list
+
+    Return (keyword, value) pairs for the SSH options in the
+    given part of a URL (a query, or the connection parameters
+    after a user name), where each option has the form
+    "keyword=value" and options are divided by the separator.
+    Raise ValueError for any option that is not allowed (see
+    the module description), or has an invalid value.
 
     (Below are REAL testcases run by doctest!)
 
-    >>> _host_port("nowhere.com")
-    ('nowhere.com', None)
+    >>> _parse_options('compression=yes&IdentityFile=~/.ssh/id%5Fwork',
+    ...                '&')
+    [('Compression', 'yes'), ('IdentityFile', '~/.ssh/id_work')]
+
+    >>> for bad in ('ProxyCommand=nc%20%25h%20%25p', 'Compression',
+    ...             'IdentityFile=-oProxyCommand=x', 'IdentityFile=a b',
+    ...             'ControlPath=/tmp/socket', 'ControlMaster=auto'):
+    ...     try:
+    ...         _parse_options(bad, ',')
+    ...     except ValueError as e:
+    ...         print(e)
+    SSH option is not allowed in URL: ProxyCommand
+    invalid SSH option in URL: Compression
+    invalid value for SSH option IdentityFile in URL: -oProxyCommand=x
+    invalid value for SSH option IdentityFile in URL: a b
+    SSH option is not allowed in URL: ControlPath
+    SSH option is not allowed in URL: ControlMaster
+
+    """
+    result = list()
+    for item in text.split(separator):
+        (keyword, equals, value) = item.partition('=')
+        keyword = urlparse.unquote(keyword)
+        value = urlparse.unquote(value)
+        if not (equals and keyword and value):
+            raise ValueError("invalid SSH option in URL: %s" % keyword)
+        try:
+            (keyword, pattern) = _SSH_OPTIONS[keyword.lower()]
+        except KeyError as _:
+            raise ValueError("SSH option is not allowed in URL: %s" % keyword)
+        if pattern.match(value) is None:
+            raise ValueError("invalid value for SSH option %s in URL: %s" %
+                             (keyword, value))
+        result.append((keyword, value))
+    return result
+
+def _parse_remote_login(rest, scheme):
+    """_parse_remote_login(rest, scheme) -> URL
+
+    Parser for parse(), given everything after "ssh:" or
+    "sftp:" (the two are parsed the same way).
+
+    """
+    match = _NET_LOCATION.match(rest)
+    if match is None:
+        raise ValueError(_NOT_A[scheme])
+    net_location = match.group(1)
+    options = ()
+    if ';' in net_location:
+        # connection parameters end the user information (before "@")
+        (user_info, at, host_port) = net_location.rpartition('@')
+        (user_info, semicolon, parameters) = user_info.partition(';')
+        if semicolon and at:
+            options = _parse_options(parameters, ',')
+            net_location = user_info + at + host_port
+    authority = _parse_authority(net_location)
+    query = rest[match.end():].partition('#')[0].partition('?')[2]
+    if query:
+        options = tuple(options) + tuple(_parse_options(query, '&'))
+    elif options:
+        options = tuple(options)
+    return URL(scheme, user=authority.user, host=authority.host,
+               port=authority.port, options=options)
+
+def _parse_sftp(rest):
+    """_parse_sftp(rest) -> URL
+
+    Parser for parse(), given everything after "sftp:".
+
+    """
+    return _parse_remote_login(rest, 'sftp')
 
-    >>> _host_port("nowhere.com:123")
-    ('nowhere.com', 123)
+def _parse_ssh(rest):
+    """_parse_ssh(rest) -> URL
 
-    >>> _host_port(":")
-    (None, None)
+    Parser for parse(), given everything after "ssh:".
 
     """
-    elements = netloc.split(':')
-    host = None
-    port = None
-    if len(elements) > 2 or len(elements) == 0:
-        print("MacTerm: unexpected number of host:port elements in URL")
+    return _parse_remote_login(rest, 'ssh')
+
+def _parse_uncached(url, scheme=None):
+    """_parse_uncached(url, scheme=None) -> URL
+
+    Implementation of parse(), which does not use the cache.
+
+    """
+    (url_scheme, colon, rest) = url.partition(':')
+    parser = _PARSERS.get(url_scheme, None)
+    if parser is None:
+        url_scheme = url_scheme.lower()
+        parser = _PARSERS.get(url_scheme, None)
+    if scheme is not None and scheme != url_scheme:
+        raise ValueError(_NOT_A.get(scheme, "unsupported URL scheme: %s" %
+                                            scheme))
+    if parser is None:
+        if not colon:
+            raise ValueError("not a URL")
+        raise ValueError("unsupported URL scheme: %s" % url_scheme)
+    return parser(rest)
+
+
+def _parse_x_man_page(rest):
+    """_parse_x_man_page(rest) -> URL
+
+    Parser for parse(), given everything after "x-man-page:".
+
+    """
+    match = _NET_LOCATION.match(rest)
+    if match is None:
+        netloc = ''
     else:
-        host = elements[0]
-        if len(host) == 0:
-            host = None
-        try:
-            port = int(elements[1])
-        except IndexError:
-            pass # no port - fine
-        except ValueError:
-            port = None # e.g. if port = "string"
-    return (host, port)
+        netloc = match.group(1)
+        rest = rest[match.end():]
+    path = rest.partition('?')[0]
+    if len(path) > 0:
+        return URL('x-man-page', section=netloc, cmd=path.strip('/'))
+    return URL('x-man-page', cmd=netloc)
 
-def _user_host_port(netloc):
-    """_user_host_port(netloc) -> (user, host, port)
+class URL(namedtuple('URL',
+                     'scheme user host port path section cmd options')):
+    """The components of a URL, as returned by parse().  Every
+    attribute is None unless it is used by the URL's scheme
+    (see the module description); the attribute "scheme" is
+    always defined.  Objects cannot be changed (since parse()
+    may return the same object many times).
 
-    Return a tuple of the user, host and port elements of a net
-    location component in a URL.  Any of the elements may be None
-    if it is not present in the original URL.
+    as_dict -- return the components for the scheme as a dictionary
 
     (Below are REAL testcases run by doctest!)
 
-    >>> _user_host_port("nowhere.com")
-    (None, 'nowhere.com', None)
+    >>> u = URL('ssh', host='example.com', port=22)
+    >>> u.host, u.port, u.user
+    ('example.com', 22, None)
+    >>> try:
+    ...     u.host = 'elsewhere.com'
+    ... except AttributeError as e:
+    ...     print(e)
+    can't set attribute
+    >>> u
+    URL('ssh', user=None, host='example.com', port=22, options=None)
+
+    """
+    __slots__ = ()
+
+    def __new__(cls, scheme, user=None, host=None, port=None, path=None,
+                section=None, cmd=None, options=None):
+        return tuple.__new__(cls, (scheme, user, host, port, path, section,
+                                   cmd, options))
 
-    >>> _user_host_port("me@nowhere.com")
-    ('me', 'nowhere.com', None)
+    def __repr__(self):
+        return "URL(%r, %s)" % (self.scheme,
+                                ", ".join(["%s=%r" % (x, getattr(self, x))
+                                           for x in _FIELDS[self.scheme]]))
 
-    >>> _user_host_port("me@nowhere.com:123")
-    ('me', 'nowhere.com', 123)
+    def as_dict(self):
+        """as_dict() -> dict
 
-    >>> _user_host_port("@")
-    (None, None, None)
+        Return a dictionary with the components that are used
+        by this URL's scheme (even if they are None), in the
+        same form as the other functions in this module.
 
-    >>> _user_host_port("nowhere.com:123")
-    (None, 'nowhere.com', 123)
+        (Below are REAL testcases run by doctest!)
 
-    >>> _user_host_port(":")
-    (None, None, None)
+        >>> _sort_dict(URL('x-man-page', cmd='ls').as_dict())
+        'cmd:ls section:None'
 
-    >>> _user_host_port("@:")
-    (None, None, None)
+        """
+        result = dict()
+        for name in _FIELDS[self.scheme]:
+            result[name] = getattr(self, name)
+        return result
+
+def clear_parse_cache():
+    """clear_parse_cache() -> None
+
+    Forget every URL that parse() has seen recently, and reset
+    the hit and miss counts.
 
     """
-    elements = netloc.split('@')
-    user = None
-    host = None
-    port = None
-    if len(elements) > 2 or len(elements) == 0:
-        print("MacTerm: unexpected number of @ elements in URL")
-    else:
-        if len(elements) == 2:
-            user = elements[0]
-            if len(user) == 0:
-                user = None
-            remainder = elements[1]
-        else:
-            remainder = elements[0]
-        (host, port) = _host_port(remainder)
-    return (user, host, port)
+    _parse_cache.clear(reset_stats=True)
 
 def file(url):
     """file(url) -> None
@@ -142,22 +316,110 @@ def file(url):
     not a file URL
 
     """
-    result = dict()
-    allow_pound_notation = False
-    (scheme, netloc, path, params, query, fragment) = \
-        urlparse.urlparse(url, 'file', allow_pound_notation)
-    if 'file' != scheme:
-        raise ValueError("not a file URL")
-    if path == '':
-        path = '/'
-    result['path'] = path
+    return parse(url, 'file').as_dict()
+
+def parse(url, scheme=None):
+    """parse(url, scheme=None) -> URL
+
+    Return a URL object with the components of the given URL
+    (see the module description), which must use one of the
+    schemes() (ignoring case).  The results are the same as
+    those of the function for the scheme, such as ssh().  Raise
+    ValueError if the URL is not supported, or if a scheme is
+    given and the URL does not use it.
+
+    Recent results are remembered, so parsing the same URL
+    again returns the same object without any other work.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> parse('ssh://userid@yourserver.com:12345')
+    URL('ssh', user='userid', host='yourserver.com', port=12345, options=())
+
+    >>> parse('ssh://me;ProxyJump=gw@host?Compression=yes').options
+    (('ProxyJump', 'gw'), ('Compression', 'yes'))
+
+    >>> parse('FILE:///Users/kevin/Library')
+    URL('file', path='/Users/kevin/Library')
+
+    >>> parse('x-man-page://3/printf')
+    URL('x-man-page', section='3', cmd='printf')
+
+    >>> try:
+    ...     parse('telnet://userid@yourserver.com')
+    ... except ValueError as e:
+    ...     print(e)
+    unsupported URL scheme: telnet
+
+    >>> parse('ssh://yourserver.com').host
+    'yourserver.com'
+    >>> try:
+    ...     parse('ssh://yourserver.com', scheme='sftp')
+    ... except ValueError as e:
+    ...     print(e)
+    not an sftp URL
+
+    >>> try:
+    ...     parse('no scheme')
+    ... except ValueError as e:
+    ...     print(e)
+    not a URL
+
+    """
+    result = _parse_cache.get(url)
+    if result is None:
+        result = _parse_uncached(url, scheme)
+        _parse_cache.put(url, result)
+    elif scheme is not None and scheme != result.scheme:
+        raise ValueError(_NOT_A.get(scheme, "unsupported URL scheme: %s" %
+                                            scheme))
     return result
 
+def parse_cache_stats():
+    """parse_cache_stats() -> dict
+
+    Return a dictionary describing the cache of URLs used by
+    parse(), with keys 'hits', 'misses', 'size' (number of URLs
+    now remembered) and 'capacity'.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> clear_parse_cache()
+    >>> parse('ssh://host') is parse('ssh://host')
+    True
+    >>> _sort_dict(parse_cache_stats())
+    'capacity:256 hits:1 misses:1 size:1'
+
+    """
+    return _parse_cache.stats()
+
+def schemes():
+    """schemes() -> list
+
+    Return the URL schemes that parse() supports.
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> schemes()
+    ['file', 'sftp', 'ssh', 'x-man-page']
+
+    """
+    return sorted(_PARSERS)
+
+def set_parse_cache_capacity(url_count):
+    """set_parse_cache_capacity(url_count) -> None
+
+    Change the maximum number of URLs that parse() will
+    remember.  Raise ValueError if the count is less than 1.
+
+    """
+    _parse_cache.set_capacity(url_count)
+
 def sftp(url):
     """sftp(url) -> None
 
-    Return dictionary with 'host', 'user' and 'port' components of
-    the given "sftp://" URL (if defined).
+    Return dictionary with 'host', 'user', 'port' and 'options'
+    components of the given "sftp://" URL (if defined).
 
     WARNING: The specification for this URL type is not complete.
     This implementation does not yet provide support for all
@@ -169,10 +431,13 @@ def sftp(url):
     (Below are REAL testcases run by doctest!)
 
     >>> _sort_dict(sftp('sftp://yourserver.com'))
-    'host:yourserver.com port:None user:None'
+    'host:yourserver.com options:() port:None user:None'
 
     >>> _sort_dict(sftp('sftp://userid@yourserver.com:12345'))
-    'host:yourserver.com port:12345 user:userid'
+    'host:yourserver.com options:() port:12345 user:userid'
+
+    >>> _sort_dict(sftp('sftp://me%40work@[2001:db8::1]:22/home'))
+    'host:2001:db8::1 options:() port:22 user:me@work'
 
     >>> try:
     ...    sftp('ftp://userid@yourserver.com:12345')
@@ -181,23 +446,13 @@ def sftp(url):
     not an sftp URL
 
     """
-    result = dict()
-    # the Python parsing module does not support sftp:// because it
-    # is not fully specified; so, parse manually
-    if not url.startswith('sftp://'):
-        raise ValueError("not an sftp URL")
-    netloc = _slash_free_path(url.replace('sftp:', '', 1))
-    (user, host, port) = _user_host_port(netloc)
-    result['user'] = user
-    result['host'] = host
-    result['port'] = port
-    return result
+    return parse(url, 'sftp').as_dict()
 
 def ssh(url):
     """ssh(url) -> None
 
-    Return dictionary with 'host', 'user' and 'port' components of
-    the given "ssh://" URL (if defined).
+    Return dictionary with 'host', 'user', 'port' and 'options'
+    components of the given "ssh://" URL (if defined).
 
     WARNING: The specification for this URL type is not complete.
     This implementation does not yet provide support for all
@@ -209,10 +464,28 @@ def ssh(url):
     (Below are REAL testcases run by doctest!)
 
     >>> _sort_dict(ssh('ssh://yourserver.com'))
-    'host:yourserver.com port:None user:None'
+    'host:yourserver.com options:() port:None user:None'
 
     >>> _sort_dict(ssh('ssh://userid@yourserver.com:12345'))
-    'host:yourserver.com port:12345 user:userid'
+    'host:yourserver.com options:() port:12345 user:userid'
+
+    >>> _sort_dict(ssh('ssh://[::1]:22'))
+    'host:::1 options:() port:22 user:None'
+
+    >>> ssh('ssh://yourserver.com?Compression=no')['options']
+    (('Compression', 'no'),)
+
+    >>> try:
+    ...    ssh('ssh://yourserver.com?LocalCommand=rm')
+    ... except ValueError as e:
+    ...    print(e)
+    SSH option is not allowed in URL: LocalCommand
+
+    >>> try:
+    ...    ssh('ssh://yourserver.com:123456')
+    ... except ValueError as e:
+    ...    print(e)
+    invalid port in URL: 123456
 
     >>> try:
     ...    ssh('telnet://userid@yourserver.com:12345')
@@ -221,17 +494,7 @@ def ssh(url):
     not an ssh URL
 
     """
-    result = dict()
-    # the Python parsing module does not support ssh:// because it
-    # is not fully specified; so, parse manually
-    if not url.startswith('ssh://'):
-        raise ValueError("not an ssh URL")
-    netloc = _slash_free_path(url.replace('ssh:', '', 1))
-    (user, host, port) = _user_host_port(netloc)
-    result['user'] = user
-    result['host'] = host
-    result['port'] = port
-    return result
+    return parse(url, 'ssh').as_dict()
 
 def x_man_page(url):
     """x_man_page(url) -> None
@@ -254,22 +517,28 @@ def x_man_page(url):
     not an x-man-page URL
 
     """
-    result = dict()
-    allow_pound_notation = False
-    (scheme, netloc, path, params, query, fragment) = \
-        urlparse.urlparse(url, 'x-man-page', allow_pound_notation)
-    if 'x-man-page' != scheme:
-        raise ValueError("not an x-man-page URL")
-    # pull the command name and optional section number out of the URL path
-    if len(path) > 0:
-        section = netloc
-        cmd = _slash_free_path(path)
-    else:
-        section = None
-        cmd = netloc
-    result['section'] = section
-    result['cmd'] = cmd
-    return result
+    return parse(url, 'x-man-page').as_dict()
+
+# see parse() and URL; the parser for each scheme, the URL components
+# that each scheme uses and the error for a URL of the wrong scheme
+_PARSERS = {
+    'file': _parse_file,
+    'sftp': _parse_sftp,
+    'ssh': _parse_ssh,
+    'x-man-page': _parse_x_man_page,
+}
+_FIELDS = {
+    'file': ('path',),
+    'sftp': ('user', 'host', 'port', 'options'),
+    'ssh': ('user', 'host', 'port', 'options'),
+    'x-man-page': ('section', 'cmd'),
+}
+_NOT_A = {
+    'file': "not a file URL",
+    'sftp': "not an sftp URL",
+    'ssh': "not an ssh URL",
+    'x-man-page': "not an x-man-page URL",
+}
 
 def _test():
     """Runs all of this module's "doctest" test cases.
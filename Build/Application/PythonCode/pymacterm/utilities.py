@@ -3,6 +3,7 @@
 
 """Utility routines that are highly generic.
 
+LRUCache -- class to hold a bounded number of recently-used values
 bytearray_to_str -- return native "str" (2.x or 3.x) for UTF-8 bytearray
 command_data -- run a program and return its standard output
 mac_os_name -- return a name like Panther, Tiger, Leopard, etc.
@@ -15,6 +16,7 @@ from __future__ import division
 from __future__ import print_function
 
 import sys
+import threading
 
 _sys_version_info = sys.version_info
 
@@ -22,6 +24,207 @@ __author__ = 'Kevin Grant <kmg@mac.com>'
 __date__ = '30 December 2006'
 __version__ = '4.0.0'
 
+class LRUCache(object):
+    """Hold a bounded number of values, discarding the least
+    recently used value when the capacity is exceeded.  All
+    methods are safe to call from multiple threads.
+
+    clear -- remove all values, optionally resetting statistics
+    discard -- remove the value for a key, if any
+    get -- return the value for a key (counting a hit or miss)
+    put -- add or replace the value for a key
+    set_capacity -- change the maximum number of values
+    stats -- return a dictionary of size and hit/miss counts
+
+    (Below are REAL testcases run by doctest!)
+
+    >>> c = LRUCache(capacity=2)
+    >>> c.put('a', 1)
+    >>> c.put('b', 2)
+    >>> c.get('a')
+    1
+    >>> c.put('c', 3)
+    >>> print(c.get('b'))
+    None
+    >>> sorted(c.keys())
+    ['a', 'c']
+    >>> sort_dict(c.stats())
+    'capacity:2 hits:1 misses:1 size:2'
+
+    >>> c.set_capacity(1)
+    >>> c.keys()
+    ['c']
+
+    """
+
+    def __init__(self, capacity=128):
+        """LRUCache(capacity) -> LRUCache
+
+        Create an empty cache that holds at most the given
+        number of values.  Raise ValueError if the capacity
+        is less than 1.
+
+        """
+        if capacity < 1:
+            raise ValueError("cache capacity must be at least 1")
+        self._capacity = capacity
+        self._lock = threading.Lock()
+        # each link is [previous, next, key, value]; the root
+        # link is a sentinel whose "next" is the oldest value
+        self._root = []
+        self._root[:] = [self._root, self._root, None, None]
+        self._links = dict()
+        self._hits = 0
+        self._misses = 0
+
+    def __contains__(self, key):
+        """Return True if the key has a value (without affecting
+        the order of values or the statistics).
+        """
+        return key in self._links
+
+    def __len__(self):
+        """Return the number of values in the cache.
+        """
+        return len(self._links)
+
+    def _unlink(self, link):
+        """Remove a link from the usage order.
+        """
+        (prev_link, next_link) = (link[0], link[1])
+        prev_link[1] = next_link
+        next_link[0] = prev_link
+
+    def _append(self, link):
+        """Insert a link as the most recently used.
+        """
+        last = self._root[0]
+        link[0] = last
+        link[1] = self._root
+        last[1] = link
+        self._root[0] = link
+
+    def _trim(self):
+        """Discard the oldest values until the size is within
+        the capacity.  The lock must be held.
+        """
+        while len(self._links) > self._capacity:
+            oldest = self._root[1]
+            self._unlink(oldest)
+            del self._links[oldest[2]]
+
+    def clear(self, reset_stats=False):
+        """clear(reset_stats=False) -> None
+
+        Remove all values.  The hit and miss counts are kept
+        unless "reset_stats" is True.
+
+        """
+        with self._lock:
+            self._root[:] = [self._root, self._root, None, None]
+            self._links.clear()
+            if reset_stats:
+                self._hits = 0
+                self._misses = 0
+
+    def discard(self, key):
+        """discard(key) -> None
+
+        Remove the value for the given key, if there is one.
+
+        """
+        with self._lock:
+            link = self._links.pop(key, None)
+            if link is not None:
+                self._unlink(link)
+
+    def get(self, key, default=None):
+        """get(key, default=None) -> object
+
+        Return the value for the given key and mark it as the
+        most recently used, or return the default if the key
+        has no value.  Either case updates the statistics.
+
+        """
+        with self._lock:
+            link = self._links.get(key, None)
+            if link is None:
+                self._misses = self._misses + 1
+                return default
+            self._hits = self._hits + 1
+            root = self._root
+            if link is not root[0]:
+                # same as _unlink() and _append(), which are not used
+                # here because this is called very frequently
+                (prev_link, next_link) = (link[0], link[1])
+                prev_link[1] = next_link
+                next_link[0] = prev_link
+                last = root[0]
+                link[0] = last
+                link[1] = root
+                last[1] = link
+                root[0] = link
+            return link[3]
+
+    def keys(self):
+        """keys() -> list
+
+        Return the keys in order from least to most recently
+        used.
+
+        """
+        result = []
+        with self._lock:
+            link = self._root[1]
+            while link is not self._root:
+                result.append(link[2])
+                link = link[1]
+        return result
+
+    def put(self, key, value):
+        """put(key, value) -> None
+
+        Set the value for the given key and mark it as the most
+        recently used, discarding the least recently used value
+        if the cache is full.
+
+        """
+        with self._lock:
+            link = self._links.get(key, None)
+            if link is None:
+                link = [None, None, key, value]
+                self._links[key] = link
+            else:
+                link[3] = value
+                self._unlink(link)
+            self._append(link)
+            self._trim()
+
+    def set_capacity(self, capacity):
+        """set_capacity(capacity) -> None
+
+        Change the maximum number of values, discarding the
+        least recently used values if necessary.  Raise
+        ValueError if the capacity is less than 1.
+
+        """
+        if capacity < 1:
+            raise ValueError("cache capacity must be at least 1")
+        with self._lock:
+            self._capacity = capacity
+            self._trim()
+
+    def stats(self):
+        """stats() -> dict
+
+        Return a dictionary with the keys 'hits', 'misses',
+        'size' and 'capacity'.
+
+        """
+        with self._lock:
+            return dict(hits=self._hits, misses=self._misses,
+                        size=len(self._links), capacity=self._capacity)
+
 def bytearray_to_str(a_bytearray, encoding='UTF-8'):
     """bytearray_to_str(a_bytearray) -> string
 